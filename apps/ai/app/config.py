@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import List, Optional
 import os
 
 
@@ -10,6 +10,75 @@ class Settings(BaseSettings):
     port: int = 8000
     environment: str = "development"
     
+    # Ollama
+    ollama_api_url: str = "http://ollama:11434"
+    ollama_model: str = "deepseek-r1:8b"
+    ollama_script_model: str = "mistral"
+    ollama_embed_model: str = "nomic-embed-text"
+    # El modelo de embeddings cabe cargado junto al principal
+    # (OLLAMA_MAX_LOADED_MODELS >= 2 o nodo dedicado); si no, pasa por el planificador
+    ollama_embed_coloaded: bool = False
+    # Lista separada por comas de nodos Ollama (vacía = solo OLLAMA_API_URL)
+    ollama_endpoints: str = ""
+    ollama_probe_interval: float = 10.0
+    ollama_eject_after_failures: int = 3
+    ollama_readmit_after_probes: int = 2
+    # Cobertura (hedging) en rutas interactivas; 0 = desactivado
+    ollama_hedge_after_ms: int = 0
+    # Enviar `think` a /api/generate (Ollama >= 0.9); si no, solo se parsea <think>.
+    # Solo a los modelos con razonamiento (prefijos separados por comas): Ollama
+    # rechaza `think` en los demás (mistral, llama...)
+    ollama_think_param: bool = True
+    ollama_think_models: str = "deepseek-r1,qwen3,magistral,gpt-oss"
+    # Presupuesto de tokens de razonamiento por defecto; 0 = sin límite
+    reasoning_max_thinking_tokens: int = 0
+    
+    # Gateway LLM (planificación por afinidad de modelo)
+    llm_max_concurrency: int = 2
+    llm_max_batch: int = 8
+    llm_max_wait_seconds: float = 30.0
+    
+    # Stable Diffusion
+    sd_api_url: str = "http://localhost:7860"
+    sd_image_cache_dir: str = "cache/sd_images"
+    sd_image_cache_max_mb: int = 2048
+    sd_upscale_workers: int = 2
+    
+    # FFmpeg: codificaciones simultáneas y límites de tiempo (segundos)
+    ffmpeg_max_concurrent: int = 2
+    ffmpeg_timeout_seconds: float = 1800.0
+    ffmpeg_stall_seconds: float = 60.0
+    
+    # Workers de medios (render, encoding, audio) fuera del proceso de la API
+    media_workers: int = 1
+    media_worker_nice: int = 10
+    media_worker_cpus: str = ""  # p. ej. "2,3" o "2-5"; vacío = todas
+    media_encode_threads: int = 2
+    
+    # Health checks (segundos)
+    health_probe_interval: float = 15.0
+    health_tool_interval: float = 300.0
+    
+    # Circuit breakers por backend: ventana deslizante, umbrales y tiempo abierto
+    breaker_window_seconds: float = 60.0
+    breaker_min_calls: int = 5
+    breaker_error_rate: float = 0.5
+    breaker_slow_rate: float = 0.8
+    breaker_open_seconds: float = 30.0
+    # Llamadas lentas que abren el circuito; 0 = no se tienen en cuenta. En
+    # Ollama desactivado: una generación larga de R1 es normal, no un fallo
+    ollama_slow_call_seconds: float = 0.0
+    sd_slow_call_seconds: float = 180.0
+    piper_slow_call_seconds: float = 60.0
+    
+    # Reintentos con backoff exponencial y jitter (llamadas idempotentes)
+    retry_max_attempts: int = 3
+    retry_base_delay: float = 0.5
+    retry_max_delay: float = 8.0
+    # Presupuesto total por llamada, reintentos incluidos (segundos)
+    sd_deadline_seconds: float = 600.0
+    piper_deadline_seconds: float = 300.0
+    
     # OpenAI (opcional)
     openai_api_key: Optional[str] = None
     openai_model: str = "gpt-3.5-turbo"
@@ -17,6 +86,25 @@ class Settings(BaseSettings):
     # Logging
     log_level: str = "INFO"
     
+    @property
+    def ollama_base(self) -> str:
+        """URL base de Ollama sin el sufijo /api"""
+        if "/api" in self.ollama_api_url:
+            return self.ollama_api_url.split("/api")[0].rstrip("/")
+        return self.ollama_api_url.rstrip("/")
+    
+    @property
+    def ollama_think_model_list(self) -> List[str]:
+        return [m.strip().lower() for m in self.ollama_think_models.split(",") if m.strip()]
+    
+    @property
+    def ollama_endpoint_list(self) -> List[str]:
+        """Nodos Ollama configurados, normalizados sin /api"""
+        urls = [u.strip() for u in self.ollama_endpoints.split(",") if u.strip()]
+        if not urls:
+            return [self.ollama_base]
+        return [u.split("/api")[0].rstrip("/") if "/api" in u else u.rstrip("/") for u in urls]
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
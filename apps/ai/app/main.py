@@ -1,13 +1,60 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import Depends, FastAPI, Header, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, Response, StreamingResponse
 from pydantic import BaseModel
 import requests
 import os
+from pathlib import Path
 from typing import List, Optional
+import asyncio
+import hmac
 import json
+import uuid
+import time
 import logging
 
+from app.models.capsule import (
+    CapsuleReconstruction,
+    DayEvent,
+    CapsuleData,
+    ReconstructionRequest,
+    ReconstructionResponse,
+    BatchReconstructionRequest,
+    IndexCapsulesRequest,
+    CapsuleVideoRequest,
+    RelatedDaysRequest,
+    VideoGenerationRequest,
+    VideoStatus,
+)
+from app.config import settings
+from app.services.llm_gateway import LLMOverloaded, gateway
+from app.services.prompts import get_template, prompt_eval_stats
+from app.services.cache import ReconstructionCache, ReconstructionStore
+from app.services.batch import iter_batch_reconstructions, to_ndjson
+from app.services.hierarchical import HierarchicalReconstructor
+from app.services.incremental import IncrementalStore
+from app.services.structured import StructuredGenerator
+from app.services.reasoning import ReasoningGenerator
+from app.services.reconstruction import ReconstructionService
+from app.services.degraded import DegradedUpgrader
+from app.services.semantic_cache import SemanticCache
+from app.services.vector_index import VectorIndex
+from app.services.related_days import RelatedDaysIndex
+from app.services.video_pipeline import PipelinedSlideVideo, SectionSplitter
+from app.services.video_generator import VideoGenerator
+from app.services.slides import insights_text, previews_dir, render_slides_video, slide_paths, title_text, warm_up
+from app.services.lazy_modules import Warmup, lazy_modules
+from app.services.previews import load_index, preview_files
+from app.services.media_workers import media_workers
+from app.services.loop_monitor import LoopLagMonitor
+from app.services.profiling import ProfilingMiddleware, SamplingProfiler, memory_profiler, spans
+from app.services.compression import CompressionMiddleware, compression_stats
+from app.services.serialization import FastJSONResponse, dumps, etag_for, model_response
+from app.services.model_lifecycle import ModelLifecycleManager
+from app.services.health import HealthMonitor, check_binary, check_ffmpeg, check_http
+from app.services.resilience import CircuitOpen, breakers, ollama_breaker
+from app.utils.ffmpeg_runner import ffmpeg_runner
+
 # Logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -16,7 +63,9 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="RewindDay AI Service",
     description="API para reconstruir un día del pasado usando razonamiento de IA",
-    version="1.0.0"
+    version="1.0.0",
+    # orjson en lugar de json de la stdlib para todas las respuestas dict
+    default_response_class=FastJSONResponse
 )
 
 # Configurar CORS
@@ -26,51 +75,219 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Profile-Id"],
+)
+
+# gzip/brotli según Accept-Encoding para JSON y NDJSON por encima del umbral
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.getenv("COMPRESSION_MIN_BYTES", "1024")),
+    gzip_level=int(os.getenv("COMPRESSION_GZIP_LEVEL", "6")),
+    brotli_quality=int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+)
+
+# Diagnóstico bajo demanda: spans por ruta siempre, perfiles y tracemalloc solo
+# con ADMIN_TOKEN (vacío = endpoints /admin desactivados)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+profiler = SamplingProfiler(
+    interval=float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000,
+    max_seconds=float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+)
+app.add_middleware(ProfilingMiddleware, profiler=profiler, admin_token=ADMIN_TOKEN)
+
+# Configuración de Ollama (centralizada en app.config, compartida con VideoGenerator)
+OLLAMA_BASE = settings.ollama_base
+MODEL_NAME = settings.ollama_model
+
+# Caché de reconstrucciones y concurrencia de lotes
+RECONSTRUCTION_CACHE_SIZE = int(os.getenv("RECONSTRUCTION_CACHE_SIZE", "512"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "2"))
+
+reconstruction_cache = ReconstructionCache(max_entries=RECONSTRUCTION_CACHE_SIZE)
+
+# Reconstrucciones recientes por id (reutilizadas por el endpoint de video)
+reconstruction_store = ReconstructionStore(
+    max_entries=int(os.getenv("RECONSTRUCTION_STORE_SIZE", "256")),
+    ttl_seconds=float(os.getenv("RECONSTRUCTION_STORE_TTL_SECONDS", "3600"))
+)
+
+# Caché semántica: reutiliza días casi idénticos (embeddings + índice NumPy)
+# Solo con el modelo de embeddings cargado junto al principal: con
+# OLLAMA_MAX_LOADED_MODELS=1 cada consulta costaría dos cambios de modelo
+SEMANTIC_CACHE_ENABLED = (
+    os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+    and settings.ollama_embed_coloaded
+)
+
+semantic_cache = SemanticCache(
+    gateway=gateway,
+    model=settings.ollama_embed_model,
+    index=VectorIndex(max_entries=int(os.getenv("SEMANTIC_CACHE_SIZE", "20000"))),
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+)
+
+# Reconstrucción jerárquica (map-reduce) para cápsulas grandes
+HIERARCHICAL_TOKEN_THRESHOLD = int(os.getenv("HIERARCHICAL_TOKEN_THRESHOLD", "3000"))
+HIERARCHICAL_WINDOW_HOURS = int(os.getenv("HIERARCHICAL_WINDOW_HOURS", "3"))
+
+# Los resúmenes por franja no necesitan razonamiento
+hierarchical = HierarchicalReconstructor(
+    generate=lambda rendered, options: _ollama_generate(rendered, options, reasoning=False),
+    cache=ReconstructionCache(max_entries=RECONSTRUCTION_CACHE_SIZE * 8),
+    token_threshold=HIERARCHICAL_TOKEN_THRESHOLD,
+    window_hours=HIERARCHICAL_WINDOW_HOURS,
+    max_workers=BATCH_MAX_CONCURRENCY
+)
+
+# Estado previo por cápsula para reconstrucción incremental
+incremental_store = IncrementalStore(
+    max_entries=int(os.getenv("INCREMENTAL_STORE_SIZE", "256"))
+)
+
+# Salida estructurada (JSON Schema vía `format`)
+structured_generator = StructuredGenerator(
+    gateway=gateway,
+    model=MODEL_NAME,
+    timeout=900,
+    max_repairs=int(os.getenv("STRUCTURED_MAX_REPAIRS", "2"))
+)
+
+# Razonamiento de deepseek-r1 separado de la narrativa (o desactivado)
+reasoning_generator = ReasoningGenerator(
+    gateway=gateway,
+    model=MODEL_NAME,
+    think_param=settings.ollama_think_param,
+    think_models=settings.ollama_think_model_list,
+    max_thinking_tokens=settings.reasoning_max_thinking_tokens
+)
+
+# Índice local de días relacionados (palabras clave + embeddings de memorias)
+RELATED_CONTEXT_DAYS = int(os.getenv("RELATED_CONTEXT_DAYS", "3"))
+RELATED_CONTEXT_CHARS = int(os.getenv("RELATED_CONTEXT_CHARS", "600"))
+
+related_index = RelatedDaysIndex(
+    gateway=gateway,
+    model=settings.ollama_embed_model,
+    max_days=int(os.getenv("RELATED_INDEX_MAX_DAYS", "50000")),
+    # Como la caché semántica: sin el modelo de embeddings co-cargado, solo palabras clave
+    use_embeddings=settings.ollama_embed_coloaded
 )
 
-# Configuración de Ollama
-OLLAMA_API_URL = os.getenv("OLLAMA_API_URL", "http://ollama:11434")
-MODEL_NAME = os.getenv("OLLAMA_MODEL", "deepseek-r1:8b")
+# Modo degradado: reconstrucción determinista si Ollama está saturado o caído
+DEGRADED_MODE_ENABLED = os.getenv("DEGRADED_MODE_ENABLED", "true").lower() == "true"
+DEGRADED_QUEUE_DEADLINE = float(os.getenv("DEGRADED_QUEUE_DEADLINE_SECONDS", "20"))
+DEGRADED_CONFIDENCE = 0.3
 
-# Normalizar URL
-if "/api" in OLLAMA_API_URL:
-    OLLAMA_BASE = OLLAMA_API_URL.split("/api")[0].rstrip("/")
-else:
-    OLLAMA_BASE = OLLAMA_API_URL.rstrip("/")
+reconstruction_service = ReconstructionService()
+def _upgrade_retryable(error: Exception) -> bool:
+    # Ollama caído, circuito abierto (503), timeout (408) o cola llena
+    return isinstance(error, LLMOverloaded) or (
+        isinstance(error, HTTPException) and error.status_code in (408, 503)
+    )
+
+def _upgrade_retry_after(error: Exception) -> Optional[float]:
+    retry_after = (getattr(error, "headers", None) or {}).get("Retry-After")
+    return float(retry_after) if retry_after else None
+
+degraded_upgrader = DegradedUpgrader(
+    cache=reconstruction_cache,
+    store=reconstruction_store,
+    max_workers=1,
+    max_pending=int(os.getenv("DEGRADED_MAX_PENDING_UPGRADES", "64")),
+    max_attempts=int(os.getenv("DEGRADED_UPGRADE_MAX_ATTEMPTS", "6")),
+    base_delay=float(os.getenv("DEGRADED_UPGRADE_BASE_DELAY_SECONDS", "5")),
+    max_delay=float(os.getenv("DEGRADED_UPGRADE_MAX_DELAY_SECONDS", "120")),
+    retryable=_upgrade_retryable,
+    retry_after=_upgrade_retry_after
+)
+
+# Ciclo de vida del modelo: precarga, keep_alive dinámico y pre-calentamiento
+model_lifecycle = ModelLifecycleManager(
+    gateway=gateway,
+    model=MODEL_NAME,
+    min_keep_alive=int(os.getenv("MODEL_KEEP_ALIVE_MIN", "300")),
+    max_keep_alive=int(os.getenv("MODEL_KEEP_ALIVE_MAX", "3600")),
+    prewarm_lead_minutes=int(os.getenv("MODEL_PREWARM_LEAD_MINUTES", "10")),
+    prewarm_min_requests=float(os.getenv("MODEL_PREWARM_MIN_REQUESTS", "3")),
+    interval=int(os.getenv("MODEL_LIFECYCLE_INTERVAL", "60"))
+)
+gateway.set_keep_alive_policy(MODEL_NAME, model_lifecycle.touch)
+MODEL_PRELOAD_ON_STARTUP = os.getenv("MODEL_PRELOAD_ON_STARTUP", "true").lower() == "true"
 
 print(f"[INIT] Conectando a Ollama en: {OLLAMA_BASE}")
 print(f"[INIT] Modelo: {MODEL_NAME}")
+if not SEMANTIC_CACHE_ENABLED and os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true":
+    print("[INIT] Caché semántica desactivada: requiere OLLAMA_EMBED_COLOADED=true")
+
+# Health checks en segundo plano: los endpoints de salud leen estado en caché
+def _check_ollama():
+    healthy = gateway.pool.probed_healthy()
+    # Antes del primer sondeo del pool el estado es desconocido, no caído:
+    # si no, las reconstrucciones de los primeros segundos irían al modo degradado
+    ok = healthy > 0 if healthy or gateway.pool.probed() else None
+    return ok, {
+        "nodes_healthy": healthy,
+        "nodes_total": len(gateway.pool.nodes),
+        "available_models": gateway.pool.available_models()
+    }
+
+health_monitor = HealthMonitor()
+health_monitor.register("ollama", _check_ollama, interval=settings.ollama_probe_interval, critical=True)
+health_monitor.register(
+    "stable_diffusion",
+    lambda: check_http(settings.sd_api_url),
+    interval=settings.health_probe_interval
+)
+health_monitor.register("ffmpeg", check_ffmpeg, interval=settings.health_tool_interval)
+health_monitor.register("piper", lambda: check_binary("piper"), interval=settings.health_tool_interval)
+
+# Retraso del event loop (trabajo bloqueante dentro del proceso de la API)
+loop_monitor = LoopLagMonitor(threshold_ms=float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")))
+
+# Circuito abierto: 503 inmediato con Retry-After en lugar de esperar el timeout
+def _circuit_open_error(error: CircuitOpen) -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail=str(error),
+        headers={"Retry-After": str(int(error.retry_after + 0.999))}
+    )
+
+@app.exception_handler(CircuitOpen)
+async def circuit_open_handler(request, error: CircuitOpen):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(error), "backend": error.name},
+        headers={"Retry-After": str(int(error.retry_after + 0.999))}
+    )
+
+# Warm-up tras el arranque: stacks de medios y workers listos antes de /readyz
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+WARMUP_REQUIRED_FOR_READY = os.getenv("WARMUP_REQUIRED_FOR_READY", "true").lower() == "true"
+WARMUP_MODULE_GROUPS = tuple(g.strip() for g in os.getenv("WARMUP_MODULE_GROUPS", "media").split(",") if g.strip())
+
+warmup = Warmup()
+warmup.add("modules", lambda: lazy_modules.preload(WARMUP_MODULE_GROUPS))
+warmup.add("media_workers", lambda: [round(ms, 1) for ms in media_workers.warm(warm_up)])
 
-# ==================== MODELOS PYDANTIC ====================
-
-class DayEvent(BaseModel):
-    """Evento individual del día"""
-    time: str
-    description: str
-    location: Optional[str] = None
-    emotional_intensity: Optional[int] = None
-
-class CapsuleData(BaseModel):
-    """Datos de la cápsula digital del día"""
-    date: str
-    events: List[DayEvent]
-    mood_notes: str
-    key_memories: List[str]
-
-class ReconstructionRequest(BaseModel):
-    """Request para reconstruir un día"""
-    capsule_data: CapsuleData
-    focus_areas: Optional[List[str]] = None
-    reasoning_enabled: bool = True
-    language: Optional[str] = "es"
-
-class ReconstructionResponse(BaseModel):
-    """Response con la reconstrucción del día"""
-    date: str
-    reconstructed_narrative: str
-    thinking_process: str
-    key_insights: List[str]
-    confidence_score: float
+# ==================== CICLO DE VIDA ====================
+
+@app.on_event("startup")
+async def on_startup():
+    """Sondeo de nodos y precarga del modelo en segundo plano sin retrasar el arranque"""
+    gateway.pool.start()
+    health_monitor.start()
+    model_lifecycle.start(preload=MODEL_PRELOAD_ON_STARTUP)
+    loop_monitor.start()
+    if WARMUP_ENABLED:
+        warmup.start()
+
+@app.on_event("shutdown")
+def on_shutdown():
+    loop_monitor.stop()
+    model_lifecycle.stop()
+    health_monitor.stop()
+    gateway.pool.stop()
+    media_workers.shutdown()
 
 # ==================== ENDPOINTS ====================
 
@@ -83,131 +300,458 @@ def read_root():
         "status": "running",
         "endpoints": {
             "health": "/health",
+            "livez": "/livez",
+            "readyz": "/readyz",
+            "prompt_eval_metrics": "/metrics/prompt-eval",
+            "llm_metrics": "/metrics/llm",
+            "cache_metrics": "/metrics/cache",
+            "ffmpeg_metrics": "/metrics/ffmpeg",
+            "runtime_metrics": "/metrics/runtime",
+            "breaker_metrics": "/metrics/breakers",
             "reconstruct": "/capsule/reconstruct",
+            "reconstruct_batch": "/capsule/reconstruct/batch",
+            "reconstruction": "/capsule/reconstruction/{reconstruction_id}",
+            "index_days": "/capsule/index",
+            "related_days": "/capsule/related",
             "generate_video": "/capsule/generate-video",
-            "download_video": "/capsule/download-video/{date}"
+            "download_video": "/capsule/download-video/{date}",
+            "video_previews": "/capsule/previews/{date}"
         }
     }
 
 @app.get("/health")
-def health_check():
-    """Verifica que Ollama está disponible"""
-    try:
-        response = requests.get(
-            f"{OLLAMA_BASE}/api/tags",
-            timeout=15
-        )
-        
-        available = response.status_code == 200
-        data = response.json() if available else {}
-        models = data.get("models", [])
-        
-        return {
-            "status": "healthy" if available else "degraded",
-            "ollama_available": available,
-            "model": MODEL_NAME,
-            "ollama_url": OLLAMA_BASE,
-            "available_models": [m.get("name") for m in models] if models else [],
-            "models_count": len(models)
-        }
-    except Exception as e:
-        return {
-            "status": "unhealthy",
-            "error": str(e),
-            "model": MODEL_NAME,
-            "ollama_url": OLLAMA_BASE
+async def health_check():
+    """Estado del servicio desde el último sondeo en segundo plano (sin E/S)"""
+    ollama = health_monitor.get("ollama")
+    models = ollama.get("available_models", [])
+    
+    return {
+        "status": health_monitor.status(),
+        "ollama_available": bool(ollama.get("ok")),
+        "model": MODEL_NAME,
+        "ollama_url": OLLAMA_BASE,
+        "available_models": models,
+        "models_count": len(models),
+        "model_state": model_lifecycle.status(),
+        "ollama_nodes": gateway.pool.status(),
+        "event_loop": loop_monitor.snapshot(),
+        "dependencies": health_monitor.results(),
+        "circuit_breakers": breakers.snapshot(),
+        "open_circuits": breakers.open_names()
+    }
+
+@app.get("/livez")
+async def liveness():
+    """El proceso está vivo y el event loop responde"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness():
+    """
+    Listo si las dependencias críticas (Ollama) están disponibles y el
+    warm-up terminó (con WARMUP_REQUIRED_FOR_READY)
+    """
+    warmed = warmup.done or not (WARMUP_ENABLED and WARMUP_REQUIRED_FOR_READY)
+    ready = health_monitor.ready() and warmed
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "not_ready",
+            "warmup": warmup.snapshot(),
+            "dependencies": health_monitor.results()
         }
+    )
+
+@app.get("/metrics/llm")
+def llm_metrics():
+    """Estado del gateway LLM: cola por modelo, cambios de modelo y razonamiento"""
+    return {
+        **gateway.stats(),
+        "reasoning": dict(reasoning_generator.stats),
+        "degraded": degraded_upgrader.snapshot()
+    }
+
+@app.get("/metrics/cache")
+def cache_metrics():
+    """Aciertos de la caché exacta y de la semántica"""
+    return {
+        "exact": reconstruction_cache.stats(),
+        "store": reconstruction_store.stats(),
+        "semantic": semantic_cache.snapshot() if SEMANTIC_CACHE_ENABLED else None
+    }
+
+@app.get("/metrics/ffmpeg")
+def ffmpeg_metrics():
+    """Codificaciones de FFmpeg en cola o en curso, con su progreso"""
+    return ffmpeg_runner.stats()
+
+@app.get("/metrics/runtime")
+def runtime_metrics():
+    """Retraso del event loop y carga de los workers de medios"""
+    return {
+        "event_loop": loop_monitor.snapshot(),
+        "media_workers": media_workers.snapshot(),
+        "compression": compression_stats.snapshot(),
+        "warmup": warmup.snapshot(),
+        "lazy_modules": lazy_modules.snapshot()
+    }
+
+# ==================== DIAGNÓSTICO (ADMIN) ====================
+
+def require_admin(x_admin_token: str = Header("")):
+    """Sin ADMIN_TOKEN configurado los endpoints no existen (404)"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(404, "Not Found")
+    # En bytes: compare_digest lanza TypeError con str no ASCII (cabeceras en latin-1)
+    if not hmac.compare_digest(x_admin_token.encode("latin-1"), ADMIN_TOKEN.encode("utf-8")):
+        raise HTTPException(403, "Token de administración inválido")
+
+@app.get("/admin/spans", dependencies=[Depends(require_admin)])
+def admin_spans(format: str = "json"):
+    """Tiempo por span; `format=folded` para flamegraph.pl / speedscope (µs de tiempo propio)"""
+    if format == "folded":
+        return PlainTextResponse(spans.folded())
+    return {"spans": spans.stats()}
+
+@app.delete("/admin/spans", dependencies=[Depends(require_admin)])
+def admin_reset_spans():
+    spans.reset()
+    return {"status": "reset"}
+
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+def admin_profiles():
+    """Perfiles recientes (peticiones con `X-Profile: 1` o `?profile=1`)"""
+    return {"profiles": profiler.list()}
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+def admin_profile(profile_id: str, format: str = "top", limit: int = 30):
+    """`format=folded` exporta las pilas muestreadas; `top` resume por función"""
+    session = profiler.get(profile_id)
+    if session is None:
+        raise HTTPException(404, f"Perfil no encontrado: {profile_id}")
+    if format == "folded":
+        return PlainTextResponse(profiler.folded(session))
+    return {"id": session.id, "label": session.label, **profiler.top(session, limit)}
+
+@app.post("/admin/tracemalloc/start", dependencies=[Depends(require_admin)])
+def admin_tracemalloc_start(frames: int = 10):
+    return memory_profiler.start(frames)
+
+@app.post("/admin/tracemalloc/stop", dependencies=[Depends(require_admin)])
+def admin_tracemalloc_stop():
+    return memory_profiler.stop()
+
+@app.get("/admin/tracemalloc", dependencies=[Depends(require_admin)])
+def admin_tracemalloc_status():
+    return memory_profiler.status()
+
+@app.post("/admin/tracemalloc/snapshot", dependencies=[Depends(require_admin)])
+def admin_tracemalloc_snapshot():
+    """Guarda una línea base para comparar después con `/diff`"""
+    try:
+        return {"snapshot": memory_profiler.snapshot(), **memory_profiler.status()}
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+
+@app.get("/admin/tracemalloc/diff/{snapshot_id}", dependencies=[Depends(require_admin)])
+def admin_tracemalloc_diff(snapshot_id: str, limit: int = 25, key: str = "lineno"):
+    """Crecimiento de memoria por línea (o `key=filename`) desde la línea base"""
+    if key not in ("lineno", "filename", "traceback"):
+        raise HTTPException(400, "key debe ser lineno, filename o traceback")
+    try:
+        return memory_profiler.diff(snapshot_id, limit, key)
+    except KeyError:
+        raise HTTPException(404, f"Snapshot no encontrado: {snapshot_id}")
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
+
+@app.get("/metrics/breakers")
+def breaker_metrics():
+    """Estado de los circuit breakers por backend (ventana, errores, latencia)"""
+    return breakers.snapshot()
+
+@app.get("/metrics/prompt-eval")
+def prompt_eval_metrics():
+    """Tiempo de evaluación de prompt y ahorro estimado por plantilla"""
+    return prompt_eval_stats.snapshot()
 
 @app.post("/capsule/reconstruct", response_model=ReconstructionResponse)
 def reconstruct_capsule(request: ReconstructionRequest):
     """
     Reconstruye un día del pasado usando razonamiento de IA con Ollama.
+    
+    La respuesta incluye un `reconstruction_id` reutilizable en
+    /capsule/generate-video y un ETag para revalidarla con
+    GET /capsule/reconstruction/{reconstruction_id}.
+    """
+    return model_response(reconstruction_store.register(_reconstruct_capsule(request)))
+
+@app.get("/capsule/reconstruction/{reconstruction_id}", response_model=ReconstructionResponse)
+def get_reconstruction(reconstruction_id: str, if_none_match: Optional[str] = Header(None)):
     """
+    Reconstrucción reciente por id. Con `If-None-Match` igual a su ETag
+    responde 304 sin cuerpo (p. ej. al reabrir la app con la narrativa ya
+    descargada, o tras la mejora de un resultado degradado).
+    """
+    reconstruction = reconstruction_store.get(reconstruction_id)
+    if reconstruction is None:
+        raise HTTPException(404, f"Reconstrucción no encontrada o expirada: {reconstruction_id}")
+    return model_response(reconstruction, if_none_match)
+
+def _reconstruct_capsule(request: ReconstructionRequest) -> ReconstructionResponse:
+    """Caché exacta, caché semántica, Ollama y modo degradado, en ese orden"""
+    
+    cache_key = reconstruction_cache.make_key(request)
+    cached = reconstruction_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"[CACHE] Reconstrucción en caché: {request.capsule_data.date}")
+        return cached
+    
+    # Mejora aún en curso: no volver a esperar en la cola
+    pending = degraded_upgrader.pending(cache_key)
+    if pending is not None:
+        return pending
+    
+    # Con Ollama caído (o su circuito abierto) tampoco hay embeddings:
+    # directamente al modo degradado
+    ollama_down = health_monitor.get("ollama").get("ok") is False or ollama_breaker.rejecting
+    
+    vector = None
+    if SEMANTIC_CACHE_ENABLED and not ollama_down:
+        similar, vector = semantic_cache.lookup(request)
+        if similar is not None:
+            reconstruction_cache.put(cache_key, similar)
+            return similar
+    
+    if not DEGRADED_MODE_ENABLED:
+        reconstruction = _reconstruct_with_ollama(request, interactive=True)
+        _remember(request, cache_key, reconstruction, vector)
+        return reconstruction
+    
+    if ollama_down:
+        return _degrade(request, cache_key, "Ollama no disponible")
     
     try:
-        capsule = request.capsule_data
-        
-        # Formatear eventos
-        events_text = "\n".join([
-            f"- {e.time}: {e.description} "
-            f"(Ubicación: {e.location if e.location else 'N/A'}, "
-            f"Intensidad: {e.emotional_intensity if e.emotional_intensity else 'N/A'}/10)"
-            for e in capsule.events
-        ])
-        
-        # Formatear áreas de enfoque
-        focus_text = ""
-        if request.focus_areas:
-            focus_text = f"\n\nÁreas de enfoque:\n" + "\n".join(
-                [f"- {area}" for area in request.focus_areas]
-            )
-        
-        # Construir el prompt
-        system_prompt = """Eres un experto en análisis psicológico y narrativa. 
-Tu tarea es reconstruir una narrativa coherente de un día específico basándote en eventos, 
-emociones y memorias fragmentadas.
+        reconstruction = _reconstruct_with_ollama(
+            request,
+            interactive=True,
+            queue_deadline=DEGRADED_QUEUE_DEADLINE
+        )
+    except LLMOverloaded as e:
+        return _degrade(request, cache_key, str(e))
+    except HTTPException as e:
+        if e.status_code != 503:
+            raise
+        return _degrade(request, cache_key, e.detail)
+    
+    _remember(request, cache_key, reconstruction, vector)
+    return reconstruction
 
-INSTRUCCIONES:
-1. Analiza patrones y conexiones entre eventos
-2. Identifica el flujo emocional del día
-3. Encuentra momentos pivotes
-4. Proporciona insights profundos
-5. Responde en español
+def _remember(request: ReconstructionRequest, cache_key: str,
+              reconstruction: ReconstructionResponse, vector=None):
+    """Guarda la reconstrucción en la caché exacta y en la semántica"""
+    reconstruction_cache.put(cache_key, reconstruction)
+    if SEMANTIC_CACHE_ENABLED:
+        semantic_cache.add(request, reconstruction, vector)
+    related_index.add_async(request.capsule_data, request.user_id)
 
-Sé empático pero analítico."""
-        
-        user_prompt = f"""INFORMACIÓN DEL DÍA:
+def _degrade(request: ReconstructionRequest, cache_key: str, reason: str) -> ReconstructionResponse:
+    """Respuesta determinista inmediata y mejora con Ollama en segundo plano"""
+    logger.warning(f"[DEGRADED] {request.capsule_data.date}: {reason}")
+    
+    structured = reconstruction_service.reconstruct_capsule(request.capsule_data, request.language)
+    narrative = "\n\n".join([
+        structured.summary,
+        "\n".join(f"- {h}" for h in structured.highlights),
+        structured.ai_insights
+    ])
+    response = ReconstructionResponse(
+        date=request.capsule_data.date,
+        reconstructed_narrative=narrative,
+        thinking_process="",
+        key_insights=structured.highlights[:5] or ["Análisis completado"],
+        confidence_score=DEGRADED_CONFIDENCE,
+        reconstruction_mode="degraded",
+        structured=structured,
+        degraded=True,
+        upgrade_pending=True
+    )
+    
+    def upgrade():
+        reconstruction = _reconstruct_with_ollama(request)
+        if SEMANTIC_CACHE_ENABLED:
+            semantic_cache.add(request, reconstruction, semantic_cache.embed(request.capsule_data))
+        return reconstruction
+    
+    # Registrada antes de programar la mejora: la mejora reutiliza su id
+    reconstruction_store.register(response)
+    scheduled = degraded_upgrader.schedule(cache_key, response, upgrade)
+    if not scheduled:
+        response = reconstruction_store.register(response.model_copy(update={"upgrade_pending": False}))
+    return response
 
-Fecha: {capsule.date}
+@app.post("/capsule/reconstruct/batch")
+def reconstruct_batch(request: BatchReconstructionRequest):
+    """
+    Reconstruye varios días en una sola llamada.
+    
+    Devuelve NDJSON: una línea por día en cuanto termina (con su error si
+    falla) y una línea final de resumen.
+    """
+    
+    def item_requests():
+        for capsule in request.items:
+            yield ReconstructionRequest(
+                capsule_data=capsule,
+                focus_areas=request.focus_areas,
+                reasoning_enabled=request.reasoning_enabled,
+                language=request.language
+            )
+    
+    logger.info(f"[BATCH] {len(request.items)} cápsulas, concurrencia {BATCH_MAX_CONCURRENCY}")
+    
+    items = iter_batch_reconstructions(
+        item_requests(),
+        lambda item: reconstruction_store.register(_reconstruct_with_ollama(item)),
+        reconstruction_cache,
+        max_concurrency=BATCH_MAX_CONCURRENCY
+    )
+    return StreamingResponse(to_ndjson(items), media_type="application/x-ndjson")
 
-EVENTOS:
-{events_text}
+@app.post("/capsule/index")
+def index_capsules(request: IndexCapsulesRequest):
+    """Añade (o actualiza) días pasados en el índice de días relacionados"""
+    start = time.perf_counter()
+    indexed = related_index.add_many(request.items, request.user_id)
+    return {
+        "indexed": indexed,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "index": related_index.stats()
+    }
 
-NOTAS DE HUMOR:
-{capsule.mood_notes}
+@app.post("/capsule/related")
+def related_days(request: RelatedDaysRequest):
+    """Días pasados relacionados: mismo día de otros años y días parecidos"""
+    start = time.perf_counter()
+    results = related_index.query(request.capsule_data, request.user_id, k=request.k)
+    return {
+        "date": request.capsule_data.date,
+        "results": results,
+        "context": RelatedDaysIndex.snippets(results, RELATED_CONTEXT_CHARS),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)
+    }
 
-MEMORIAS CLAVE:
-{', '.join(capsule.key_memories)}
-{focus_text}
+def _ollama_generate(rendered: dict, options: Optional[dict] = None, timeout: int = 900,
+                     context: Optional[list] = None, interactive: bool = False,
+                     reasoning: bool = True, max_thinking_tokens: Optional[int] = None,
+                     queue_deadline: Optional[float] = None) -> dict:
+    """
+    Llamada a /api/generate con `system` y `prompt` separados.
+    
+    `response` llega sin el bloque <think>; el razonamiento va en `thinking`.
+    """
+    payload = {
+        "model": MODEL_NAME,
+        "prompt": rendered["prompt"],
+        "stream": False,
+        "options": options or {},
+    }
+    if rendered.get("system"):
+        payload["system"] = rendered["system"]
+    if context:
+        payload["context"] = context
+    
+    # Las rutas interactivas pueden cubrir peticiones lentas en otro nodo
+    return reasoning_generator.generate(
+        payload,
+        reasoning=reasoning,
+        max_thinking_tokens=max_thinking_tokens,
+        timeout=timeout,
+        hedge=interactive,
+        queue_deadline=queue_deadline
+    )
 
-Por favor reconstruye y analiza este día. Proporciona:
-1. Narrativa coherente
-2. Patrones identificados
-3. Momentos pivotes
-4. Reflexión emocional
-5. Conclusión"""
-        
-        # Llamar a Ollama
-        full_text = f"{system_prompt}\n\nUser: {user_prompt}\n\nAssistant:"
+def _reconstruct_with_ollama(request: ReconstructionRequest, interactive: bool = False,
+                             queue_deadline: Optional[float] = None) -> ReconstructionResponse:
+    """
+    Reconstrucción sin caché: siempre llama a Ollama.
+    
+    Con `queue_deadline`, lanza `LLMOverloaded` si la petición no obtiene
+    turno en el gateway a tiempo.
+    """
+    
+    try:
+        capsule = request.capsule_data
         
-        logger.info(f"[REQUEST] Enviando a Ollama: {capsule.date}")
+        # Plantilla precompilada: prefijo estático en `system`, datos en `prompt`
+        template = get_template("reconstruct", request.language)
+        rendered = template.render(capsule, request.focus_areas)
+        options = {"temperature": 0.7}
+        reasoning = {
+            "reasoning": request.reasoning_enabled,
+            "max_thinking_tokens": request.max_thinking_tokens,
+            "queue_deadline": queue_deadline,
+        }
         
-        response = requests.post(
-            f"{OLLAMA_BASE}/api/generate",
-            json={
-                "model": MODEL_NAME,
-                "prompt": full_text,
-                "stream": False,
-                "temperature": 0.7,
-            },
-            timeout=900
-        )
+        # Solo eventos nuevos al final: continuar desde el `context` previo
+        result = None
+        structured = None
+        mode = "full"
+        if request.reconstruction_mode == "incremental":
+            plan = incremental_store.plan(request, template)
+            if plan is not None:
+                continuation, context = plan
+                logger.info(f"[REQUEST] Continuación incremental: {capsule.date}")
+                result = _ollama_generate(continuation, options, context=context,
+                                          interactive=interactive, **reasoning)
+                mode = "incremental"
         
-        response.raise_for_status()
-        result = response.json()
+        if result is None:
+            # Cápsulas muy grandes: resumir por franjas antes de la pasada final
+            if hierarchical.should_use(request.reconstruction_mode, template, rendered):
+                rendered, _ = hierarchical.prepare(request, template, options)
+                mode = "hierarchical"
+            
+            # Contexto compacto de días pasados en lugar del historial completo
+            if request.include_related:
+                related = related_index.query(capsule, request.user_id, k=RELATED_CONTEXT_DAYS)
+                rendered = template.append_related(
+                    rendered,
+                    RelatedDaysIndex.snippets(related, RELATED_CONTEXT_CHARS)
+                )
+            
+            logger.info(f"[REQUEST] Enviando a Ollama: {capsule.date} ({template.key})")
+            
+            if request.structured_output:
+                # JSON validado contra CapsuleReconstruction en lugar de regex
+                structured = structured_generator.generate(
+                    CapsuleReconstruction,
+                    f"{rendered['prompt']}\n\n{template.labels['json']}",
+                    system=rendered["system"],
+                    options=options,
+                    list_field="events",
+                    language=request.language
+                )
+                result = {"response": f"{structured.summary}\n\n{structured.ai_insights}"}
+            else:
+                result = _ollama_generate(rendered, options, interactive=interactive, **reasoning)
         
         full_response = result.get("response", "")
         
         if not full_response:
             raise Exception("Respuesta vacía de Ollama")
         
+        incremental_store.save(request, template, full_response, result.get("context"))
+        
+        prompt_eval = None
+        if mode != "incremental" and structured is None:
+            prompt_eval = prompt_eval_stats.record(template, rendered, result)
+        
         # Procesar insights
-        lines = full_response.split("\n")
-        key_insights = [
-            line.strip("- ").strip() 
-            for line in lines 
-            if line.strip().startswith("-") and len(line.strip()) > 5
-        ]
+        if structured is not None:
+            key_insights = structured.highlights[:5]
+        else:
+            key_insights = _extract_insights(full_response)
         key_insights = key_insights[:5] if key_insights else ["Análisis completado"]
         
         # Calcular confidence
@@ -218,11 +762,18 @@ Por favor reconstruye y analiza este día. Proporciona:
         return ReconstructionResponse(
             date=capsule.date,
             reconstructed_narrative=full_response,
-            thinking_process=full_response[:500],
+            thinking_process=result.get("thinking", "") if request.reasoning_enabled else "",
             key_insights=key_insights,
-            confidence_score=confidence_score
+            confidence_score=confidence_score,
+            prompt_eval=prompt_eval if request.measure_prompt_eval else None,
+            reconstruction_mode=mode,
+            structured=structured
         )
         
+    except LLMOverloaded:
+        raise
+    except CircuitOpen as e:
+        raise _circuit_open_error(e)
     except requests.exceptions.Timeout:
         raise HTTPException(
             status_code=408,
@@ -240,37 +791,28 @@ Por favor reconstruye y analiza este día. Proporciona:
             detail=f"Error: {str(e)}"
         )
 
+def _extract_insights(text: str) -> List[str]:
+    """Líneas de viñeta de la respuesta (insights clave)"""
+    return [
+        line.strip("- ").strip()
+        for line in text.split("\n")
+        if line.strip().startswith("-") and len(line.strip()) > 5
+    ]
+
 @app.post("/capsule/reconstruct/simple")
 def simple_reconstruct(capsule_data: CapsuleData):
     """Versión simplificada"""
     
     try:
+        template = get_template("simple")
         events_text = "\n".join([
             f"- {e.time}: {e.description}"
             for e in capsule_data.events
         ])
+        rendered = template.render(capsule_data, events_text=events_text)
         
-        prompt = f"""Analiza brevemente este día ({capsule_data.date}):
-
-Eventos: 
-{events_text}
-
-Notas: {capsule_data.mood_notes}
-
-Proporciona un resumen de 3-4 párrafos."""
-        
-        response = requests.post(
-            f"{OLLAMA_BASE}/api/generate",
-            json={
-                "model": MODEL_NAME,
-                "prompt": prompt,
-                "stream": False,
-            },
-            timeout=900
-        )
-        
-        response.raise_for_status()
-        result = response.json()
+        # El resumen simple no devuelve razonamiento: no se genera
+        result = _ollama_generate(rendered, interactive=True, reasoning=False)
         
         return {
             "date": capsule_data.date,
@@ -278,38 +820,75 @@ Proporciona un resumen de 3-4 párrafos."""
             "mode": "simple"
         }
         
+    except CircuitOpen:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _resolve_video_source(request: CapsuleVideoRequest):
+    """
+    Narrativa de partida del video, sin llamar a Ollama si ya existe.
+    
+    Returns:
+        (date, narrative, insights, reconstruction_id, reused)
+    """
+    if request.reconstruction_id:
+        reconstruction = reconstruction_store.get(request.reconstruction_id)
+        if reconstruction is not None:
+            logger.info(f"[VIDEO] Reutilizando reconstrucción {request.reconstruction_id}")
+            return (reconstruction.date, reconstruction.reconstructed_narrative,
+                    reconstruction.key_insights, reconstruction.reconstruction_id, True)
+        if not request.narrative and request.capsule_data is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Reconstrucción no encontrada o expirada: {request.reconstruction_id}"
+            )
+    
+    if request.narrative:
+        date = request.date or (request.capsule_data.date if request.capsule_data else None)
+        if not date:
+            raise HTTPException(status_code=422, detail="Falta `date` para la narrativa enviada")
+        return date, request.narrative, request.key_insights or [], None, True
+    
+    if request.capsule_data is None:
+        raise HTTPException(
+            status_code=422,
+            detail="Envía `reconstruction_id`, `narrative` o `capsule_data`"
+        )
+    
+    logger.info("[VIDEO] Reconstruyendo narrativa...")
+    reconstruction = reconstruction_store.register(_reconstruct_capsule(ReconstructionRequest(
+        **request.model_dump(include=set(ReconstructionRequest.model_fields))
+    )))
+    return (reconstruction.date, reconstruction.reconstructed_narrative,
+            reconstruction.key_insights, reconstruction.reconstruction_id, False)
+
 @app.post("/capsule/generate-video")
-def generate_video_from_capsule(request: ReconstructionRequest):
+def generate_video_from_capsule(request: CapsuleVideoRequest):
     """
     Genera un video MP4 a partir de la narrativa reconstruida.
-    VERSIÓN SIMPLIFICADA Y ROBUSTA
+    
+    Con `reconstruction_id` (o `narrative`) se pasa directamente a las
+    slides; solo con `capsule_data` se reconstruye primero (con caché).
     """
     
     try:
         logger.info("[VIDEO] Iniciando generación de video...")
         
-        # Importar aquí para evitar dependencias si no se usan
-        try:
-            from PIL import Image, ImageDraw, ImageFont
-            import numpy as np
-            from pathlib import Path
-        except ImportError as e:
+        # El render corre en los workers; aquí solo se comprueba (una vez, sin importar)
+        missing = lazy_modules.missing("PIL", "numpy")
+        if missing:
             raise HTTPException(
                 status_code=500,
-                detail=f"Falta dependencia: {str(e)}. Instala Pillow: pip install Pillow"
+                detail=f"Falta dependencia: {', '.join(missing)}. Instala Pillow: pip install Pillow"
             )
         
-        # 1. Primero reconstruir la narrativa
-        logger.info("[VIDEO] Reconstruyendo narrativa...")
-        reconstruction = reconstruct_capsule(request)
+        # Sin narrativa previa: slides y encoder a la vez que llegan los tokens
+        if request.pipelined and _needs_reconstruction(request):
+            return _generate_video_pipelined(request)
         
-        # 2. Extraer datos
-        narrative = reconstruction.reconstructed_narrative
-        insights = reconstruction.key_insights
-        date = reconstruction.date
+        # 1. Narrativa previa o reconstrucción
+        date, narrative, insights, reconstruction_id, reused = _resolve_video_source(request)
         
         logger.info("[VIDEO] Narrativa obtenida. Creando slides...")
         
@@ -317,107 +896,67 @@ def generate_video_from_capsule(request: ReconstructionRequest):
         sections = narrative.split("###")
         sections = [s.strip() for s in sections if s.strip()][:5]  # Máximo 5 secciones
         
-        # 4. Crear imágenes (en lugar de video complejo)
+        # 4. Slides y video en un worker de medios (fuera del proceso de la API)
         output_dir = Path("/tmp")
         output_dir.mkdir(exist_ok=True)
         
-        slides = []
-        
-        # Slide 1: Título
-        img = create_simple_text_image(
-            f"Tu Día: {date}",
-            width=1280,
-            height=720,
-            fontsize=80,
-            bg_color=(26, 26, 46),
-            text_color=(255, 255, 255)
+        texts = (
+            [("title", title_text(date))]
+            + [("section", section) for section in sections]
+            + [("insights", insights_text(insights))]
         )
-        slide_path = output_dir / f"slide_0_{date}.png"
-        img.save(str(slide_path))
-        slides.append(str(slide_path))
-        logger.info(f"[VIDEO] Slide 1 creada: {slide_path}")
-        
-        # Slides de narrativa
-        for i, section in enumerate(sections):
-            text = section[:250]  # Limitar caracteres
-            img = create_simple_text_image(
-                text,
-                width=1280,
-                height=720,
-                fontsize=35,
-                bg_color=(22, 33, 62),
-                text_color=(255, 255, 255)
-            )
-            slide_path = output_dir / f"slide_{i+1}_{date}.png"
-            img.save(str(slide_path))
-            slides.append(str(slide_path))
-            logger.info(f"[VIDEO] Slide {i+2} creada")
-        
-        # Slide final: Insights
-        insights_text = "\n".join([f"• {ins[:100]}" for ins in insights[:3]])
-        img = create_simple_text_image(
-            f"Insights Clave:\n\n{insights_text}",
-            width=1280,
-            height=720,
-            fontsize=30,
-            bg_color=(15, 52, 96),
-            text_color=(255, 255, 0)
-        )
-        slide_path = output_dir / f"slide_final_{date}.png"
-        img.save(str(slide_path))
-        slides.append(str(slide_path))
-        logger.info("[VIDEO] Slide final creada")
-        
-        # 5. Crear video con ImageIO (más confiable que MoviePy)
-        logger.info("[VIDEO] Compilando video...")
+        slides = [
+            (kind, text, path)
+            for (kind, text), path in zip(texts, slide_paths(output_dir, date, len(sections)))
+        ]
+        output_video = str(output_dir / f"rewindday_{date}.mp4")
         
-        try:
-            import imageio
-            
-            output_video = str(output_dir / f"rewindday_{date}.mp4")
-            
-            # Usar imageio-ffmpeg
-            writer = imageio.get_writer(output_video, fps=0.2)  # 1 imagen cada 5 segundos
-            
-            # Agregar cada slide múltiples veces para duración
-            for slide_path in slides:
-                img_array = imageio.imread(slide_path)
-                for _ in range(1):  # 5 segundos por slide a 0.2 fps
-                    writer.append_data(img_array)
-            
-            writer.close()
-            
-            logger.info(f"[VIDEO] Video creado: {output_video}")
-            
-            # 6. Verificar que el archivo existe
-            if not os.path.exists(output_video):
-                raise Exception("El archivo de video no se creó")
-            
-            file_size = os.path.getsize(output_video)
-            
-            return {
-                "date": date,
-                "video_path": output_video,
-                "file_size_mb": round(file_size / (1024*1024), 2),
-                "slides_count": len(slides),
-                "message": "Video generado exitosamente",
-                "download_url": f"/capsule/download-video/{date}"
-            }
+        logger.info(f"[VIDEO] Renderizando {len(slides)} slides y compilando video...")
+        result = media_workers.run(
+            render_slides_video, slides, output_video, 0.2, media_workers.encode_threads,
+            previews_dir(output_dir, date)
+        )
+        # El render corre en otro proceso: sus tiempos se añaden a los spans aquí
+        spans.record("slides.render", result["render_ms"] / 1000, count=len(slides))
+        if result["video_path"] is not None:
+            spans.record("slides.encode", result["encode_ms"] / 1000)
         
-        except ImportError:
+        if result["video_path"] is None:
             logger.warning("[VIDEO] ImageIO no disponible, usando alternativa...")
             
             # Alternativa: retornar las imágenes
             return {
                 "date": date,
+                "reconstruction_id": reconstruction_id,
+                "reused_reconstruction": reused,
                 "video_path": None,
-                "slides": slides,
+                "slides": result["slides"],
                 "slides_count": len(slides),
                 "message": "Slides generadas (video no disponible - instala imageio-ffmpeg)",
                 "instruction": "Instala: pip install imageio-ffmpeg"
             }
         
-    except HTTPException:
+        logger.info(f"[VIDEO] Video creado: {output_video}")
+        
+        # 5. Verificar que el archivo existe
+        if not os.path.exists(output_video):
+            raise Exception("El archivo de video no se creó")
+        
+        file_size = os.path.getsize(output_video)
+        
+        return {
+            "date": date,
+            "reconstruction_id": reconstruction_id,
+            "reused_reconstruction": reused,
+            "video_path": output_video,
+            "file_size_mb": round(file_size / (1024*1024), 2),
+            "slides_count": len(slides),
+            "message": "Video generado exitosamente",
+            "download_url": f"/capsule/download-video/{date}",
+            "previews_url": f"/capsule/previews/{date}" if result["previews"] else None
+        }
+        
+    except (HTTPException, CircuitOpen):
         raise
     except Exception as e:
         logger.error(f"[ERROR] Error generando video: {str(e)}", exc_info=True)
@@ -426,62 +965,160 @@ def generate_video_from_capsule(request: ReconstructionRequest):
             detail=f"Error generando video: {str(e)}"
         )
 
-def create_simple_text_image(text, width=1280, height=720, fontsize=40, 
-                             bg_color=(0, 0, 0), text_color=(255, 255, 255)):
+def _needs_reconstruction(request: CapsuleVideoRequest) -> bool:
+    """Solo hay que generar narrativa si no hay id válido, narrativa ni caché"""
+    if request.narrative or request.capsule_data is None:
+        return False
+    if request.reconstruction_id and reconstruction_store.get(request.reconstruction_id):
+        return False
+    base = ReconstructionRequest(**request.model_dump(include=set(ReconstructionRequest.model_fields)))
+    return reconstruction_cache.get(reconstruction_cache.make_key(base)) is None
+
+def _generate_video_pipelined(request: CapsuleVideoRequest) -> dict:
     """
-    Crea una imagen simple con texto centrado.
-    VERSIÓN ROBUSTA SIN ERRORES DE TUPLA
+    Reconstrucción en streaming con el video construyéndose en paralelo.
+    
+    Cada sección (`###`) se renderiza y se escribe en el encoder en cuanto
+    se cierra en el stream; al final solo quedan la última sección, la slide
+    de insights y cerrar el archivo.
     """
-    from PIL import Image, ImageDraw, ImageFont
+    base = ReconstructionRequest(**request.model_dump(include=set(ReconstructionRequest.model_fields)))
+    capsule = base.capsule_data
+    date = capsule.date
+    
+    template = get_template("reconstruct", base.language)
+    rendered = template.render(capsule, base.focus_areas)
+    if base.include_related:
+        related = related_index.query(capsule, base.user_id, k=RELATED_CONTEXT_DAYS)
+        rendered = template.append_related(rendered, RelatedDaysIndex.snippets(related, RELATED_CONTEXT_CHARS))
+    payload = {
+        "model": MODEL_NAME,
+        "system": rendered["system"],
+        "prompt": rendered["prompt"],
+        "options": {"temperature": 0.7},
+    }
     
-    # Crear imagen
-    img = Image.new('RGB', (width, height), bg_color)
-    draw = ImageDraw.Draw(img)
+    output_video = f"/tmp/rewindday_{date}.mp4"
+    video = PipelinedSlideVideo(
+        output_video, workers=media_workers, previews_dir=previews_dir(Path("/tmp"), date)
+    )
+    # El título espera en la cola: el worker se ocupa con la primera sección
+    video.add("title", title_text(date))
     
-    # Cargar fuente
+    splitter = SectionSplitter()
+    answer, thinking = [], []
+    start = time.perf_counter()
+    first_token = None
     try:
-        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", fontsize)
-    except:
-        try:
-            font = ImageFont.truetype("C:\\Windows\\Fonts\\arial.ttf", fontsize)
-        except:
-            font = ImageFont.load_default()
-    
-    # Dividir texto en líneas
-    words = text.split()
-    lines = []
-    current_line = []
-    
-    for word in words:
-        test_line = " ".join(current_line + [word])
-        # Usar textbbox correctamente
-        bbox = draw.textbbox((0, 0), test_line, font=font)
-        text_width = bbox[2] - bbox[0]
-        
-        if text_width < width - 100:
-            current_line.append(word)
-        else:
-            if current_line:
-                lines.append(" ".join(current_line))
-            current_line = [word]
+        for data in reasoning_generator.stream(payload, reasoning=base.reasoning_enabled):
+            if data["response"] and first_token is None:
+                first_token = time.perf_counter()
+            answer.append(data["response"])
+            thinking.append(data["thinking"])
+            for section in splitter.feed(data["response"]):
+                video.start()
+                video.add("section", section)
+        last_token = time.perf_counter()
+        
+        for section in splitter.finish():
+            video.add("section", section)
+        full_response = "".join(answer).strip()
+        if not full_response:
+            raise Exception("Respuesta vacía de Ollama")
+        insights = _extract_insights(full_response)[:5] or ["Análisis completado"]
+        video.add("insights", insights_text(insights))
+        slides_count = video.finish()
+        spans.record("slides.render", video.render_ms / 1000, count=max(1, slides_count))
+    except Exception:
+        video.abort()
+        if os.path.exists(output_video):
+            os.remove(output_video)
+        raise
+    ready = time.perf_counter()
     
-    if current_line:
-        lines.append(" ".join(current_line))
+    reconstruction = reconstruction_store.register(ReconstructionResponse(
+        date=date,
+        reconstructed_narrative=full_response,
+        thinking_process="".join(thinking).strip(),
+        key_insights=insights,
+        confidence_score=min(1.0, len(full_response) / 2000)
+    ))
+    reconstruction_cache.put(reconstruction_cache.make_key(base), reconstruction)
+    logger.info(f"[VIDEO] Video en pipeline listo {(ready - last_token) * 1000:.0f} ms tras el último token")
     
-    # Dibujar líneas centradas
-    line_height = fontsize + 10
-    total_height = len(lines) * line_height
-    y_start = (height - total_height) // 2
+    return {
+        "date": date,
+        "reconstruction_id": reconstruction.reconstruction_id,
+        "reused_reconstruction": False,
+        "video_path": output_video,
+        "file_size_mb": round(os.path.getsize(output_video) / (1024*1024), 2),
+        "slides_count": slides_count,
+        "message": "Video generado exitosamente",
+        "download_url": f"/capsule/download-video/{date}",
+        "previews_url": f"/capsule/previews/{date}" if video.previews else None,
+        "pipeline": {
+            "first_token_ms": round((first_token - start) * 1000, 1) if first_token else None,
+            "last_token_ms": round((last_token - start) * 1000, 1),
+            "ready_ms": round((ready - start) * 1000, 1),
+            "after_last_token_ms": round((ready - last_token) * 1000, 1),
+            "slide_render_ms": round(video.render_ms, 1),
+        }
+    }
+
+# Videos con escenas de Stable Diffusion (rutas /api/videos que usa apps/api)
+video_generator = VideoGenerator(videos_dir=os.getenv("VIDEOS_DIR", "videos"))
+# Referencias a los trabajos en segundo plano (asyncio solo guarda referencias débiles)
+_background_videos: set = set()
+
+@app.post("/api/videos/generate")
+async def generate_scene_video(request: VideoGenerationRequest, background: bool = False):
+    """
+    Video con guion, escenas de SD, narración y música.
     
-    for i, line in enumerate(lines):
-        bbox = draw.textbbox((0, 0), line, font=font)
-        line_width = bbox[2] - bbox[0]
-        x = (width - line_width) // 2
-        y = y_start + i * line_height
-        
-        draw.text((x, y), line, fill=text_color, font=font)
+    Con `quality` draft/mobile responde en cuanto el borrador está listo y el
+    render completo lo reemplaza en segundo plano (`upgrade_pending` en
+    /api/videos/{id}/status). Con `background=true` responde al instante con
+    el id para seguir el progreso por el endpoint de estado.
+    """
+    video_id = uuid.uuid4().hex
+    job = video_generator.generate_full_video(
+        video_id, request.context, title=request.title, quality=request.quality
+    )
+    if background:
+        video_generator.enqueue(video_id, request.title, request.quality)
+        task = asyncio.create_task(job)
+        _background_videos.add(task)
+        task.add_done_callback(_background_videos.discard)
+        return JSONResponse(
+            status_code=202,
+            content={"id": video_id, "title": request.title, "status": "queued",
+                     "quality": request.quality, "status_url": f"/api/videos/{video_id}/status"}
+        )
     
-    return img
+    result = await job
+    if result.get("status") == "failed":
+        raise HTTPException(500, f"Error generando video: {result.get('error')}")
+    return {
+        **{k: v for k, v in result.items() if k != "video_url"},
+        "video_url": f"/api/videos/{video_id}/download",
+        "status_url": f"/api/videos/{video_id}/status"
+    }
+
+@app.get("/api/videos/{video_id}/status", response_model=VideoStatus)
+def scene_video_status(video_id: str):
+    """Progreso, calidad y si el borrador aún espera su render completo"""
+    status = video_generator.get_status(video_id)
+    if status is None:
+        raise HTTPException(404, f"Video no encontrado: {video_id}")
+    return status
+
+@app.get("/api/videos/{video_id}/download")
+def download_scene_video(video_id: str):
+    """MP4 generado (el borrador hasta que lo reemplaza el render completo)"""
+    path = video_generator.video_path(video_id)
+    if not video_id.isalnum() or not path.exists():
+        raise HTTPException(404, f"Video no encontrado: {video_id}")
+    return FileResponse(path, media_type="video/mp4", filename=f"{video_id}.mp4")
 
 @app.get("/capsule/download-video/{date}")
 def download_video(date: str):
@@ -505,6 +1142,69 @@ def download_video(date: str):
             detail=f"Error descargando video: {str(e)}"
         )
 
+# Las previews de una fecha cambian si se regenera su video: las URLs llevan
+# `?v=` con la versión y solo esas se cachean como inmutables
+PREVIEW_MEDIA_TYPES = {".jpg": "image/jpeg", ".vtt": "text/vtt"}
+
+def _preview_source(date: str):
+    directory = previews_dir(Path("/tmp"), date)
+    index = load_index(directory)
+    if index is None:
+        raise HTTPException(404, f"Previews no encontradas para la fecha: {date}")
+    version = format(os.stat(os.path.join(directory, "index.json")).st_mtime_ns, "x")
+    return directory, index, version
+
+@app.get("/capsule/previews/{date}")
+def video_previews(date: str, if_none_match: Optional[str] = Header(None)):
+    """
+    Póster, miniaturas y sprite de búsqueda (con su WebVTT) del video de
+    una fecha, para mostrar la vista previa sin descargar el MP4.
+    """
+    directory, index, version = _preview_source(date)
+    
+    def url(name: str) -> str:
+        return f"/capsule/previews/{date}/{name}?v={version}"
+    
+    body = {
+        "date": date,
+        "version": version,
+        "duration_seconds": index["duration_seconds"],
+        "poster": {**index["poster"], "url": url(index["poster"]["file"])},
+        "thumbnails": [{**t, "url": url(t["file"])} for t in index["thumbnails"]],
+        "sprite": {
+            **index["sprite"],
+            "url": url(index["sprite"]["file"]),
+            "vtt_url": url(index["sprite"]["vtt"]),
+        },
+        "video_url": f"/capsule/download-video/{date}",
+    }
+    etag = etag_for(dumps(body))
+    headers = {"ETag": etag, "Cache-Control": "public, no-cache"}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return FastJSONResponse(body, headers=headers)
+
+@app.get("/capsule/previews/{date}/{name}")
+def video_preview_file(date: str, name: str, v: Optional[str] = None):
+    """Archivo de previews; inmutable en caché si `v` es la versión actual"""
+    directory, index, version = _preview_source(date)
+    if name not in preview_files(index):
+        raise HTTPException(404, f"Preview no encontrada: {name}")
+    cache_control = "public, max-age=31536000, immutable" if v == version else "public, no-cache"
+    path = os.path.join(directory, name)
+    
+    if name.endswith(".vtt"):
+        # Las teselas del WebVTT apuntan al sprite de esta misma versión
+        vtt = Path(path).read_text(encoding="utf-8").replace(
+            f"{index['sprite']['file']}#", f"{index['sprite']['file']}?v={version}#"
+        )
+        return Response(vtt, media_type="text/vtt", headers={"Cache-Control": cache_control})
+    return FileResponse(
+        path,
+        media_type=PREVIEW_MEDIA_TYPES[os.path.splitext(name)[1]],
+        headers={"Cache-Control": cache_control}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 
 class ReconstructedEvent(BaseModel):
@@ -45,6 +45,9 @@ class VideoGenerationRequest(BaseModel):
     title: str = Field(..., min_length=5, max_length=255)
     context: str = Field(..., min_length=20, max_length=2000)
     style: Optional[str] = "cinematic"  # professional, cinematic, documentary
+    # draft/mobile: SD a menor resolución + escalado en CPU; el render
+    # completo reemplaza después al borrador
+    quality: Literal["draft", "mobile", "full"] = "full"
 
 class VideoGenerationResponse(BaseModel):
     """Response de generación"""
@@ -62,3 +65,88 @@ class VideoStatus(BaseModel):
     status: str
     progress: int
     message: str
+    title: Optional[str] = None
+    quality: Optional[str] = None
+    # Borrador ya descargable; el render completo lo reemplazará
+    upgrade_pending: bool = False
+
+
+class DayEvent(BaseModel):
+    """Evento individual del día"""
+    time: str
+    description: str
+    location: Optional[str] = None
+    emotional_intensity: Optional[int] = None
+
+class CapsuleData(BaseModel):
+    """Datos de la cápsula digital del día"""
+    date: str
+    events: List[DayEvent]
+    mood_notes: str
+    key_memories: List[str]
+
+class ReconstructionRequest(BaseModel):
+    """Request para reconstruir un día"""
+    capsule_data: CapsuleData
+    focus_areas: Optional[List[str]] = None
+    reasoning_enabled: bool = True
+    language: Optional[str] = "es"
+    measure_prompt_eval: bool = False
+    reconstruction_mode: Literal["auto", "full", "hierarchical", "incremental"] = "auto"
+    capsule_id: Optional[str] = None
+    # Ámbito de la caché semántica (solo se reutilizan días del mismo usuario)
+    user_id: Optional[str] = None
+    # Añade al prompt fragmentos de días pasados relacionados
+    include_related: bool = False
+    structured_output: bool = False
+    # Tope de tokens de razonamiento (None = valor del servidor, 0 = sin límite)
+    max_thinking_tokens: Optional[int] = Field(None, ge=0)
+
+class BatchReconstructionRequest(BaseModel):
+    """Request para reconstruir varios días en una sola llamada"""
+    items: List[CapsuleData] = Field(..., min_length=1, max_length=366)
+    focus_areas: Optional[List[str]] = None
+    reasoning_enabled: bool = True
+    language: Optional[str] = "es"
+
+class CapsuleVideoRequest(ReconstructionRequest):
+    """
+    Request de video: parte de una reconstrucción previa (`reconstruction_id`),
+    de una narrativa ya generada o, si no hay ninguna, de la cápsula.
+    """
+    capsule_data: Optional[CapsuleData] = None
+    reconstruction_id: Optional[str] = None
+    narrative: Optional[str] = None
+    key_insights: Optional[List[str]] = None
+    date: Optional[str] = None
+    # Renderiza y codifica las slides mientras la narrativa llega en streaming
+    pipelined: bool = False
+
+class IndexCapsulesRequest(BaseModel):
+    """Request para añadir días pasados al índice de días relacionados"""
+    items: List[CapsuleData] = Field(..., min_length=1, max_length=5000)
+    user_id: Optional[str] = None
+
+class RelatedDaysRequest(BaseModel):
+    """Request para buscar días relacionados con una cápsula"""
+    capsule_data: CapsuleData
+    user_id: Optional[str] = None
+    k: int = Field(5, ge=1, le=50)
+
+class ReconstructionResponse(BaseModel):
+    """Response con la reconstrucción del día"""
+    # Permite reutilizar la reconstrucción (p. ej. en /capsule/generate-video)
+    reconstruction_id: Optional[str] = None
+    date: str
+    reconstructed_narrative: str
+    thinking_process: str
+    key_insights: List[str]
+    confidence_score: float
+    prompt_eval: Optional[dict] = None
+    reconstruction_mode: str = "full"
+    structured: Optional[CapsuleReconstruction] = None
+    # Respuesta determinista sin IA (Ollama saturado o caído)
+    degraded: bool = False
+    upgrade_pending: bool = False
+    # Reutilizada de un día casi idéntico: {"source_date", "similarity"}
+    semantic_match: Optional[dict] = None
@@ -0,0 +1,116 @@
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Iterable, Iterator, List
+import logging
+
+from app.models.capsule import ReconstructionRequest
+from app.services.cache import ReconstructionCache
+from app.services.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+
+def iter_batch_reconstructions(
+    requests: Iterable[ReconstructionRequest],
+    reconstruct: Callable[[ReconstructionRequest], object],
+    cache: ReconstructionCache,
+    max_concurrency: int = 2
+) -> Iterator[Dict]:
+    """
+    Ejecuta un lote de reconstrucciones y produce cada resultado al terminar.
+
+    - Las peticiones ya cacheadas se emiten de inmediato.
+    - Las peticiones repetidas dentro del lote se calculan una sola vez.
+    - Como mucho `max_concurrency` llamadas a Ollama están en vuelo; el resto
+      de la entrada no se consume hasta que hay hueco, así un backfill de un
+      año no acumula peticiones ni resultados en memoria.
+
+    Args:
+        requests: Iterable de peticiones (se consume de forma perezosa)
+        reconstruct: Función que reconstruye una petición (puede lanzar)
+        cache: Caché de reconstrucciones
+        max_concurrency: Máximo de reconstrucciones simultáneas
+
+    Yields:
+        Dict por elemento con `index`, `date`, `status` y `result` o `error`
+    """
+    executor = ThreadPoolExecutor(
+        max_workers=max(1, max_concurrency),
+        thread_name_prefix="batch"
+    )
+    in_flight: Dict[Future, str] = {}
+    # clave -> [(index, date), ...] esperando el mismo resultado
+    waiting: Dict[str, List] = {}
+    source = enumerate(requests)
+    exhausted = False
+
+    def item(index, date, status, **extra):
+        return {"index": index, "date": date, "status": status, **extra}
+
+    try:
+        while True:
+            # Rellenar la ventana de concurrencia
+            while not exhausted and len(in_flight) < max_concurrency:
+                try:
+                    index, request = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+
+                date = request.capsule_data.date
+                key = cache.make_key(request)
+
+                cached = cache.get(key)
+                if cached is not None:
+                    yield item(index, date, "ok", cached=True, result=_dump(cached))
+                    continue
+
+                if key in waiting:
+                    waiting[key].append((index, date))
+                    continue
+
+                waiting[key] = [(index, date)]
+                in_flight[executor.submit(reconstruct, request)] = key
+
+            if not in_flight:
+                break
+
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                key = in_flight.pop(future)
+                targets = waiting.pop(key)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    logger.warning(f"[BATCH] Error en {targets[0][1]}: {e}")
+                    error = getattr(e, "detail", None) or str(e)
+                    for index, date in targets:
+                        yield item(index, date, "error", error=error)
+                    continue
+
+                cache.put(key, result)
+                payload = _dump(result)
+                for position, (index, date) in enumerate(targets):
+                    yield item(index, date, "ok", cached=position > 0, result=payload)
+    finally:
+        # Si el cliente se desconecta no seguimos lanzando trabajo
+        for future in in_flight:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def to_ndjson(items: Iterator[Dict]) -> Iterator[bytes]:
+    """Serializa cada elemento como una línea NDJSON y añade un resumen final"""
+    summary = {"status": "done", "total": 0, "ok": 0, "errors": 0, "cached": 0}
+    for entry in items:
+        summary["total"] += 1
+        if entry["status"] == "ok":
+            summary["ok"] += 1
+            summary["cached"] += int(entry.get("cached", False))
+        else:
+            summary["errors"] += 1
+        yield dumps(entry) + b"\n"
+    yield dumps(summary) + b"\n"
+
+
+def _dump(result) -> Dict:
+    return result.model_dump() if hasattr(result, "model_dump") else result
@@ -0,0 +1,128 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def hash_key(*parts: str) -> str:
+    """Hash estable de varias partes de texto"""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class ReconstructionCache:
+    """
+    Caché LRU en memoria de reconstrucciones.
+
+    La clave es un hash de la cápsula y las opciones que afectan al resultado,
+    de modo que la misma petición (individual o dentro de un lote) no vuelve
+    a pasar por Ollama mientras siga en caché.
+    """
+
+    # Campos de la petición que no cambian la reconstrucción
+    IGNORED_FIELDS = {"measure_prompt_eval"}
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def make_key(cls, request) -> str:
+        """Hash estable de una petición de reconstrucción"""
+        data = request.model_dump(exclude=cls.IGNORED_FIELDS)
+        payload = json.dumps(data, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class ReconstructionStore:
+    """
+    Reconstrucciones recientes por id.
+
+    Cada respuesta de /capsule/reconstruct recibe un `reconstruction_id`; el
+    endpoint de video lo usa para partir de esa narrativa sin volver a pasar
+    por Ollama. La retención está acotada por número de entradas y por edad.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _purge(self, now: float):
+        while self._entries:
+            key, (expires, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+
+    def register(self, reconstruction):
+        """Asigna un id a la reconstrucción (si no lo tiene) y la guarda"""
+        if reconstruction.reconstruction_id is None:
+            reconstruction.reconstruction_id = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            self._entries[reconstruction.reconstruction_id] = (now + self.ttl_seconds, reconstruction)
+            self._entries.move_to_end(reconstruction.reconstruction_id)
+            self._purge(now)
+        return reconstruction
+
+    def get(self, reconstruction_id: str) -> Optional[Any]:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(reconstruction_id)
+            if entry is None or entry[0] <= now:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            self._purge(time.monotonic())
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
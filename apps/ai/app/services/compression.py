@@ -0,0 +1,209 @@
+from typing import Dict, Optional, Tuple
+import zlib
+
+try:
+    import brotli
+except ImportError:  # opcional: sin brotli solo se negocia gzip
+    brotli = None
+
+# Tipos que merece la pena comprimir (MP4, PNG y WAV ya van comprimidos o son enormes)
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+
+def negotiate(accept_encoding: str, brotli_available: bool = brotli is not None) -> Optional[str]:
+    """
+    Elige `br` o `gzip` según `Accept-Encoding` (con sus pesos q).
+
+    A igual peso se prefiere brotli: con texto en español comprime en
+    torno a un 15-20 % más que gzip con coste de CPU parecido.
+    """
+    weights: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding] = q
+
+    wildcard = weights.get("*", 0.0)
+    candidates = (["br"] if brotli_available else []) + ["gzip"]
+    best, best_q = None, 0.0
+    for coding in candidates:
+        q = weights.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class _Encoder:
+    """Compresor incremental: cada `compress` devuelve bytes decodificables ya"""
+
+    def __init__(self, coding: str, gzip_level: int, brotli_quality: int):
+        if coding == "br":
+            self._br = brotli.Compressor(quality=brotli_quality)
+            self._gz = None
+        else:
+            self._br = None
+            # wbits 31 = cabecera y cola gzip
+            self._gz = zlib.compressobj(gzip_level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        if self._br is not None:
+            out = self._br.process(data)
+            return out + (self._br.flush() if flush else b"")
+        out = self._gz.compress(data)
+        return out + (self._gz.flush(zlib.Z_SYNC_FLUSH) if flush else b"")
+
+    def finish(self) -> bytes:
+        if self._br is not None:
+            return self._br.finish()
+        return self._gz.flush(zlib.Z_FINISH)
+
+
+class CompressionStats:
+    """Contadores compartidos por el middleware y el endpoint de métricas"""
+
+    def __init__(self):
+        self.compressed = 0
+        self.skipped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.by_coding: Dict[str, int] = {}
+
+    def snapshot(self) -> Dict:
+        return {
+            "compressed": self.compressed,
+            "skipped": self.skipped,
+            "by_coding": dict(self.by_coding),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 3) if self.bytes_in else None,
+            "brotli_available": brotli is not None,
+        }
+
+
+compression_stats = CompressionStats()
+
+
+class CompressionMiddleware:
+    """
+    Compresión gzip/brotli negociada por `Accept-Encoding`.
+
+    - Respuestas completas: solo si superan `minimum_size` bytes (por debajo
+      las cabeceras y el coste de CPU no compensan).
+    - Respuestas en streaming (NDJSON de lotes): cada trozo se vacía al
+      cliente en cuanto llega, sin esperar a llenar el buffer del compresor.
+    - Solo tipos de texto/JSON; no toca respuestas que ya traen
+      `Content-Encoding` ni los 304 de los ETags.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5,
+                 stats: CompressionStats = compression_stats):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope.get("headers") or ())
+        coding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if coding is None:
+            await self.app(scope, receive, send)
+            return
+        await _CompressedResponse(self, coding, send).run(scope, receive)
+
+
+class _CompressedResponse:
+    def __init__(self, middleware: CompressionMiddleware, coding: str, send):
+        self.mw = middleware
+        self.coding = coding
+        self.send = send
+        self.start: Optional[dict] = None
+        self.encoder: Optional[_Encoder] = None
+        self.passthrough = False
+
+    async def run(self, scope, receive):
+        await self.mw.app(scope, receive, self.on_message)
+
+    @staticmethod
+    def _header(headers, name: bytes) -> Optional[bytes]:
+        for key, value in headers:
+            if key.lower() == name:
+                return value
+        return None
+
+    def _eligible(self) -> bool:
+        headers = self.start.get("headers", [])
+        content_type = (self._header(headers, b"content-type") or b"").decode("latin-1")
+        return (
+            self.start["status"] not in (204, 304)
+            and self._header(headers, b"content-encoding") is None
+            and content_type.startswith(COMPRESSIBLE_TYPES)
+        )
+
+    def _start_headers(self, compressed: bool) -> Tuple:
+        headers = [(k, v) for k, v in self.start.get("headers", []) if k.lower() != b"vary"]
+        vary = self._header(self.start.get("headers", []), b"vary")
+        headers.append((b"vary", vary + b", Accept-Encoding" if vary else b"Accept-Encoding"))
+        if compressed:
+            headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+            headers.append((b"content-encoding", self.coding.encode()))
+        return headers
+
+    async def on_message(self, message):
+        if message["type"] == "http.response.start":
+            self.start = message
+            return
+        if self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+
+        if self.encoder is None:
+            # Otros mensajes (p. ej. `http.response.pathsend` de FileResponse) van sin comprimir
+            if (
+                message["type"] != "http.response.body"
+                or not self._eligible()
+                or (not more and len(body) < self.mw.minimum_size)
+            ):
+                self.passthrough = True
+                self.mw.stats.skipped += 1
+                await self.send({**self.start, "headers": self._start_headers(False)})
+                await self.send(message)
+                return
+            self.encoder = _Encoder(self.coding, self.mw.gzip_level, self.mw.brotli_quality)
+            self.mw.stats.compressed += 1
+            self.mw.stats.by_coding[self.coding] = self.mw.stats.by_coding.get(self.coding, 0) + 1
+            headers = self._start_headers(True)
+            if not more:
+                # Cuerpo completo: se comprime de una vez y se fija su longitud
+                data = self.encoder.compress(body, flush=False) + self.encoder.finish()
+                headers.append((b"content-length", str(len(data)).encode()))
+                self._count(body, data)
+                await self.send({**self.start, "headers": headers})
+                await self.send({"type": "http.response.body", "body": data})
+                return
+            await self.send({**self.start, "headers": headers})
+
+        data = self.encoder.compress(body, flush=more)
+        if not more:
+            data += self.encoder.finish()
+        self._count(body, data)
+        await self.send({"type": "http.response.body", "body": data, "more_body": more})
+
+    def _count(self, raw: bytes, data: bytes):
+        self.mw.stats.bytes_in += len(raw)
+        self.mw.stats.bytes_out += len(data)
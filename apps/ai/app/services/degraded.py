@@ -0,0 +1,131 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import random
+import threading
+import logging
+
+from app.services.cache import ReconstructionCache, ReconstructionStore
+
+logger = logging.getLogger(__name__)
+
+
+class DegradedUpgrader:
+    """
+    Mejora en segundo plano las respuestas del modo degradado.
+
+    Mientras la reconstrucción con Ollama de una petición está pendiente se
+    sigue sirviendo la respuesta degradada (sin volver a esperar en la cola);
+    cuando termina, el resultado se guarda en la caché de reconstrucciones
+    con la misma clave y sustituye a la degradada en el `store` con el mismo
+    `reconstruction_id`, así que quien revalide por id recibe la mejora.
+
+    Si la mejora falla con un error pasajero (`retryable`: Ollama caído,
+    circuito abierto, cola llena) se reintenta con backoff exponencial y
+    jitter, respetando el `retry_after` del error si lo trae. Tras
+    `max_attempts`, o con un error definitivo, la respuesta guardada pasa a
+    `upgrade_pending=False` y la siguiente petición vuelve a intentarlo.
+    """
+
+    def __init__(
+        self,
+        cache: ReconstructionCache,
+        store: Optional[ReconstructionStore] = None,
+        max_workers: int = 1,
+        max_pending: int = 64,
+        max_attempts: int = 6,
+        base_delay: float = 5.0,
+        max_delay: float = 120.0,
+        retryable: Callable[[Exception], bool] = lambda e: False,
+        retry_after: Callable[[Exception], Optional[float]] = lambda e: None
+    ):
+        self.cache = cache
+        self.store = store
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+        self.retry_after = retry_after
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._pending: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.stats = {
+            "degraded": 0, "upgraded": 0, "upgrade_retries": 0,
+            "upgrade_failures": 0, "dropped": 0
+        }
+
+    def pending(self, key: str) -> Optional[Any]:
+        """Respuesta degradada ya servida cuya mejora sigue en curso"""
+        with self._lock:
+            return self._pending.get(key)
+
+    def schedule(self, key: str, degraded: Any, upgrade: Callable[[], Any]) -> bool:
+        """
+        Programa la mejora de una respuesta degradada (ya registrada en el
+        `store`, para conocer su `reconstruction_id`).
+
+        Returns:
+            False si ya hay demasiadas mejoras pendientes
+        """
+        with self._lock:
+            self.stats["degraded"] += 1
+            if key in self._pending:
+                return True
+            if len(self._pending) >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+            self._pending[key] = degraded
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="degraded-upgrade"
+                )
+        self._executor.submit(self._run, key, upgrade, 1)
+        return True
+
+    def _delay(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        return max(delay, self.retry_after(error) or 0.0)
+
+    def _run(self, key: str, upgrade: Callable[[], Any], attempt: int):
+        with self._lock:
+            degraded = self._pending.get(key)
+        try:
+            upgraded = upgrade()
+        except Exception as e:
+            if attempt < self.max_attempts and self.retryable(e):
+                delay = self._delay(attempt, e)
+                with self._lock:
+                    self.stats["upgrade_retries"] += 1
+                logger.info(
+                    f"[DEGRADED] Mejora fallida ({getattr(e, 'detail', e)}); "
+                    f"intento {attempt + 1}/{self.max_attempts} en {delay:.0f}s"
+                )
+                # Sin ocupar el worker durante la espera
+                timer = threading.Timer(delay, self._executor.submit, (self._run, key, upgrade, attempt + 1))
+                timer.daemon = True
+                timer.start()
+                return
+            with self._lock:
+                self.stats["upgrade_failures"] += 1
+                self._pending.pop(key, None)
+            logger.warning(f"[DEGRADED] No se pudo mejorar la respuesta: {getattr(e, 'detail', e)}")
+            if self.store is not None and degraded is not None and degraded.reconstruction_id:
+                self.store.register(degraded.model_copy(update={"upgrade_pending": False}))
+            return
+
+        if self.store is not None and degraded is not None and degraded.reconstruction_id:
+            # Mismo id, nuevo cuerpo y nuevo ETag para quien revalide por id
+            upgraded = self.store.register(
+                upgraded.model_copy(update={"reconstruction_id": degraded.reconstruction_id})
+            )
+        self.cache.put(key, upgraded)
+        with self._lock:
+            self.stats["upgraded"] += 1
+            self._pending.pop(key, None)
+        logger.info("[DEGRADED] Respuesta degradada mejorada en segundo plano")
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {**self.stats, "pending": len(self._pending)}
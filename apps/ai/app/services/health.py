@@ -0,0 +1,151 @@
+from datetime import datetime
+from typing import Callable, Dict, Optional, Tuple
+import shutil
+import threading
+import time
+import logging
+
+import requests
+
+from app.utils.ffmpeg_handler import FFmpegHandler
+
+logger = logging.getLogger(__name__)
+
+CheckResult = Tuple[bool, Dict]
+
+
+class _Check:
+    def __init__(self, name: str, fn: Callable[[], CheckResult], interval: float, critical: bool):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.critical = critical
+        self.next_run = 0.0
+        self.result: Dict = {"ok": None, "checked_at": None}
+
+
+class HealthMonitor:
+    """
+    Sondeo en segundo plano de las dependencias del servicio.
+
+    Cada comprobación corre en su propio intervalo en un hilo aparte y deja
+    el resultado en memoria; /health, /livez y /readyz responden desde ese
+    estado sin hacer E/S, de modo que los healthchecks frecuentes no ocupan
+    workers aunque Ollama esté saturado.
+
+    Una comprobación puede devolver `ok=None` (aún sin datos, p. ej. antes
+    del primer sondeo del pool): cuenta como desconocida, no como caída, y
+    se repite en el siguiente tick en lugar de esperar a su intervalo.
+    """
+
+    def __init__(self, tick: float = 1.0):
+        self.tick = tick
+        self._checks: Dict[str, _Check] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.started_at = time.time()
+
+    def register(
+        self,
+        name: str,
+        fn: Callable[[], CheckResult],
+        interval: float = 15.0,
+        critical: bool = False
+    ):
+        """
+        Registra una comprobación.
+
+        Args:
+            name: Nombre de la dependencia
+            fn: Función que retorna (ok, detalles)
+            interval: Segundos entre comprobaciones
+            critical: Si su caída hace que el servicio no esté listo
+        """
+        self._checks[name] = _Check(name, fn, interval, critical)
+
+    def run_check(self, check: _Check):
+        start = time.perf_counter()
+        try:
+            ok, details = check.fn()
+        except Exception as e:
+            ok, details = False, {"error": str(e)}
+        result = {
+            "ok": ok,
+            "critical": check.critical,
+            "checked_at": datetime.now().isoformat(),
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            **details,
+        }
+        with self._lock:
+            check.result = result
+
+    def _run(self):
+        while not self._stop.is_set():
+            now = time.monotonic()
+            for check in list(self._checks.values()):
+                if now >= check.next_run:
+                    check.next_run = now + check.interval
+                    self.run_check(check)
+                    if check.result.get("ok") is None:
+                        check.next_run = now + self.tick
+            self._stop.wait(self.tick)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="health-monitor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    # ==================== ESTADO EN CACHÉ ====================
+
+    def results(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {name: dict(check.result) for name, check in self._checks.items()}
+
+    def get(self, name: str) -> Dict:
+        with self._lock:
+            check = self._checks.get(name)
+            return dict(check.result) if check else {}
+
+    def ready(self) -> bool:
+        """Listo si todas las dependencias críticas respondieron bien"""
+        with self._lock:
+            return all(
+                check.result.get("ok") is True
+                for check in self._checks.values() if check.critical
+            )
+
+    def status(self) -> str:
+        results = self.results()
+        if not self.ready():
+            critical = [r for r in results.values() if r.get("critical")]
+            if all(r.get("ok") is not False for r in critical):
+                return "starting"
+            return "unhealthy"
+        if any(r.get("ok") is False for r in results.values()):
+            return "degraded"
+        return "healthy"
+
+
+# ==================== COMPROBACIONES ====================
+
+def check_http(url: str, timeout: float = 3.0) -> CheckResult:
+    """Cualquier respuesta HTTP por debajo de 500 cuenta como disponible"""
+    response = requests.get(url, timeout=timeout)
+    return response.status_code < 500, {"url": url, "status_code": response.status_code}
+
+
+def check_binary(name: str) -> CheckResult:
+    path = shutil.which(name)
+    return path is not None, {"path": path}
+
+
+def check_ffmpeg() -> CheckResult:
+    ok = FFmpegHandler.check_ffmpeg_installed()
+    return ok, {"path": shutil.which("ffmpeg")}
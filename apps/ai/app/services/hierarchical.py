@@ -0,0 +1,184 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+import re
+import logging
+
+from app.models.capsule import DayEvent, ReconstructionRequest
+from app.services.cache import ReconstructionCache, hash_key
+from app.services.prompts import PromptTemplate, get_template
+from app.utils.helpers import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+_TIME_RE = re.compile(r"(\d{1,2})(?:[:h.](\d{2}))?\s*([ap]\.?m\.?)?", re.IGNORECASE)
+
+
+def parse_minutes(value: str) -> Optional[int]:
+    """Convierte '08:30', '8h', '7:15 pm'... a minutos desde medianoche"""
+    match = _TIME_RE.search(value or "")
+    if not match:
+        return None
+    hour = int(match.group(1))
+    minute = int(match.group(2) or 0)
+    suffix = (match.group(3) or "").lower()
+    if suffix.startswith("p") and hour < 12:
+        hour += 12
+    elif suffix.startswith("a") and hour == 12:
+        hour = 0
+    if hour > 23 or minute > 59:
+        return None
+    return hour * 60 + minute
+
+
+class EventChunk:
+    """Grupo de eventos de una misma franja horaria"""
+
+    def __init__(self, window: str, events: List[DayEvent]):
+        self.window = window
+        self.events = events
+
+
+class HierarchicalReconstructor:
+    """
+    Reconstrucción map-reduce para cápsulas con muchos eventos.
+
+    1. Agrupa los eventos en franjas horarias (y parte las franjas que
+       superan el presupuesto de tokens).
+    2. Resume cada franja en paralelo (map). Los resúmenes se cachean por el
+       contenido de la franja, así añadir un evento solo recalcula la suya.
+    3. Devuelve un prompt final con los resúmenes en lugar de los eventos
+       crudos; el paso reduce es la reconstrucción normal.
+    """
+
+    def __init__(
+        self,
+        generate: Callable[[Dict[str, str], Dict], Dict],
+        cache: ReconstructionCache,
+        token_threshold: int = 3000,
+        window_hours: int = 3,
+        chunk_token_budget: int = 1500,
+        max_workers: int = 2
+    ):
+        self.generate = generate
+        self.cache = cache
+        self.token_threshold = token_threshold
+        self.window_minutes = max(1, window_hours) * 60
+        self.chunk_token_budget = chunk_token_budget
+        self.max_workers = max(1, max_workers)
+
+    def should_use(self, mode: str, template: PromptTemplate, rendered: Dict[str, str]) -> bool:
+        """Decide si la petición necesita el modo jerárquico"""
+        if mode == "hierarchical":
+            return True
+        if mode == "full":
+            return False
+        estimated = template.system_tokens + estimate_tokens(rendered["prompt"])
+        return estimated > self.token_threshold
+
+    def chunk_events(self, events: List[DayEvent], template: PromptTemplate) -> List[EventChunk]:
+        """Agrupa eventos por franja horaria respetando el presupuesto de tokens"""
+        timed: List[Tuple[int, int, DayEvent]] = []
+        last_minute = 0
+        for position, event in enumerate(events):
+            minute = parse_minutes(event.time)
+            # Sin hora legible: se queda junto al evento anterior
+            if minute is None:
+                minute = last_minute
+            last_minute = minute
+            timed.append((minute, position, event))
+        timed.sort(key=lambda item: (item[0], item[1]))
+
+        windows: Dict[int, List[DayEvent]] = {}
+        for minute, _, event in timed:
+            windows.setdefault(minute // self.window_minutes, []).append(event)
+
+        chunks = []
+        for index in sorted(windows):
+            start = index * self.window_minutes
+            end = min(start + self.window_minutes, 24 * 60)
+            label = f"{start // 60:02d}:{start % 60:02d}-{end // 60:02d}:{end % 60:02d}"
+
+            current: List[DayEvent] = []
+            tokens = 0
+            for event in windows[index]:
+                event_tokens = estimate_tokens(template.format_event(event))
+                if current and tokens + event_tokens > self.chunk_token_budget:
+                    chunks.append(EventChunk(label, current))
+                    current, tokens = [], 0
+                current.append(event)
+                tokens += event_tokens
+            if current:
+                chunks.append(EventChunk(label, current))
+
+        return chunks
+
+    def prepare(
+        self,
+        request: ReconstructionRequest,
+        template: PromptTemplate,
+        options: Optional[Dict] = None
+    ) -> Tuple[Dict[str, str], Dict]:
+        """
+        Ejecuta el paso map y construye el prompt del paso reduce.
+
+        Returns:
+            (prompt renderizado para la pasada final, estadísticas del map)
+        """
+        capsule = request.capsule_data
+        chunk_template = get_template("chunk", template.language)
+        chunks = self.chunk_events(capsule.events, chunk_template)
+
+        prompts = []
+        for chunk in chunks:
+            rendered = chunk_template.render_chunk(
+                capsule.date,
+                chunk.window,
+                chunk_template.format_events(chunk.events)
+            )
+            key = hash_key(chunk_template.key, rendered["prompt"])
+            prompts.append((key, rendered))
+
+        summaries: Dict[str, str] = {}
+        pending = []
+        for key, rendered in prompts:
+            cached = self.cache.get(key)
+            if cached is not None:
+                summaries[key] = cached
+            elif key not in {k for k, _ in pending}:
+                pending.append((key, rendered))
+
+        logger.info(
+            f"[HIERARCHICAL] {capsule.date}: {len(chunks)} franjas, "
+            f"{len(pending)} por resumir, {len(prompts) - len(pending)} en caché"
+        )
+
+        def summarize(item):
+            key, rendered = item
+            result = self.generate(rendered, options or {})
+            summary = result.get("response", "").strip()
+            if not summary:
+                raise Exception("Resumen vacío de Ollama")
+            return key, summary
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                for key, summary in executor.map(summarize, pending):
+                    self.cache.put(key, summary)
+                    summaries[key] = summary
+
+        partials = "\n\n".join(
+            f"[{chunk.window}] {summaries[key]}"
+            for chunk, (key, _) in zip(chunks, prompts)
+        )
+        rendered = template.render(
+            capsule,
+            request.focus_areas,
+            events_text=partials,
+            events_label=template.labels["partials"]
+        )
+
+        return rendered, {
+            "chunks": len(chunks),
+            "summarized": len(pending),
+            "cached": len(prompts) - len(pending),
+        }
@@ -0,0 +1,128 @@
+from pathlib import Path
+from typing import Dict
+import json
+import os
+import shutil
+import threading
+import time
+import logging
+
+from app.services.cache import hash_key
+
+logger = logging.getLogger(__name__)
+
+# Parámetros de txt2img que determinan la imagen (con semilla fija)
+KEY_FIELDS = ("prompt", "negative_prompt", "sampler_name", "steps", "width", "height", "cfg_scale", "seed")
+
+
+class SDImageCache:
+    """
+    Caché en disco de imágenes de Stable Diffusion.
+
+    La clave es un hash de los parámetros que determinan la imagen; solo
+    tiene sentido con semilla fija (`seed != -1`). Los archivos se expulsan
+    por LRU (fecha de último acceso guardada en memoria y en el mtime del
+    archivo) cuando el total supera `max_bytes`.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 2 * 1024 ** 3):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict] = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load()
+
+    def _load(self):
+        """Reconstruye el índice LRU a partir de los archivos existentes"""
+        for path in self.directory.glob("*.png"):
+            stat = path.stat()
+            self._entries[path.stem] = {"size": stat.st_size, "used": stat.st_mtime}
+            self.total_bytes += stat.st_size
+
+    @staticmethod
+    def cacheable(params: Dict) -> bool:
+        return params.get("seed", -1) != -1
+
+    @staticmethod
+    def key(params: Dict) -> str:
+        return hash_key(json.dumps({k: params.get(k) for k in KEY_FIELDS}, sort_keys=True))
+
+    def path_for(self, key: str) -> Path:
+        return self.directory / f"{key}.png"
+
+    def get(self, params: Dict, destination: Path) -> bool:
+        """
+        Copia la imagen cacheada a `destination`.
+
+        Returns:
+            True si había acierto
+        """
+        if not self.cacheable(params):
+            return False
+        key = self.key(params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False
+            self.hits += 1
+            entry["used"] = time.time()
+        path = self.path_for(key)
+        try:
+            shutil.copyfile(path, destination)
+            os.utime(path)
+        except FileNotFoundError:
+            # Borrado por fuera del proceso
+            with self._lock:
+                self._forget(key)
+                self.hits -= 1
+                self.misses += 1
+            return False
+        return True
+
+    def put(self, params: Dict, source: Path):
+        """Guarda una copia de la imagen generada"""
+        if not self.cacheable(params):
+            return
+        key = self.key(params)
+        path = self.path_for(key)
+        tmp = path.with_suffix(".tmp")
+        shutil.copyfile(source, tmp)
+        os.replace(tmp, path)
+        size = path.stat().st_size
+        with self._lock:
+            self._forget(key)
+            self._entries[key] = {"size": size, "used": time.time()}
+            self.total_bytes += size
+            self._evict()
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry["size"]
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            key = min(self._entries, key=lambda k: self._entries[k]["used"])
+            self._forget(key)
+            self.evictions += 1
+            try:
+                self.path_for(key).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,122 @@
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import threading
+import logging
+
+from app.models.capsule import ReconstructionRequest
+from app.services.cache import hash_key
+from app.services.prompts import PromptTemplate
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalState:
+    """Última reconstrucción conocida de una cápsula"""
+
+    def __init__(
+        self,
+        base_hash: str,
+        event_hashes: List[str],
+        narrative: str,
+        context: Optional[List[int]]
+    ):
+        self.base_hash = base_hash
+        self.event_hashes = event_hashes
+        self.narrative = narrative
+        self.context = context
+        self.updated_at = datetime.now().isoformat()
+
+
+class IncrementalStore:
+    """
+    Guarda por cápsula la reconstrucción previa, el hash de cada evento y el
+    `context` que devuelve Ollama.
+
+    Si una petición nueva solo añade eventos al final, `plan` construye un
+    prompt de continuación con el delta y el `context` previo, de modo que
+    Ollama no vuelve a evaluar el día completo. Cualquier otro cambio
+    (eventos editados, notas, memorias, idioma...) obliga a regenerar.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._states: "OrderedDict[Tuple[str, str], IncrementalState]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def capsule_key(request: ReconstructionRequest) -> Tuple[str, str]:
+        """Por usuario: el `context` previo de otro usuario nunca se reutiliza"""
+        return request.user_id or "", request.capsule_id or request.capsule_data.date
+
+    @staticmethod
+    def base_hash(request: ReconstructionRequest, template: PromptTemplate) -> str:
+        """Hash de todo lo que no son eventos"""
+        capsule = request.capsule_data
+        return hash_key(
+            template.key,
+            capsule.date,
+            capsule.mood_notes,
+            "\n".join(capsule.key_memories),
+            "\n".join(request.focus_areas or []),
+        )
+
+    @staticmethod
+    def event_hashes(request: ReconstructionRequest, template: PromptTemplate) -> List[str]:
+        return [hash_key(template.format_event(e)) for e in request.capsule_data.events]
+
+    def plan(
+        self,
+        request: ReconstructionRequest,
+        template: PromptTemplate
+    ) -> Optional[Tuple[Dict[str, str], List[int]]]:
+        """
+        Prepara una continuación si solo hay eventos nuevos al final.
+
+        Returns:
+            (prompt de continuación, context de Ollama) o None si hay que
+            regenerar todo
+        """
+        key = self.capsule_key(request)
+        with self._lock:
+            state = self._states.get(key)
+        capsule = key[1]
+
+        if state is None or not state.context:
+            return None
+
+        if state.base_hash != self.base_hash(request, template):
+            logger.info(f"[INCREMENTAL] {capsule}: datos base cambiados, regeneración completa")
+            return None
+
+        hashes = self.event_hashes(request, template)
+        previous = state.event_hashes
+        if len(hashes) <= len(previous) or hashes[:len(previous)] != previous:
+            logger.info(f"[INCREMENTAL] {capsule}: eventos previos cambiados, regeneración completa")
+            return None
+
+        new_events = request.capsule_data.events[len(previous):]
+        logger.info(f"[INCREMENTAL] {capsule}: continuación con {len(new_events)} eventos nuevos")
+        rendered = template.render_continuation(template.format_events(new_events))
+        return rendered, state.context
+
+    def save(
+        self,
+        request: ReconstructionRequest,
+        template: PromptTemplate,
+        narrative: str,
+        context: Optional[List[int]]
+    ):
+        """Registra la reconstrucción más reciente de la cápsula"""
+        key = self.capsule_key(request)
+        state = IncrementalState(
+            base_hash=self.base_hash(request, template),
+            event_hashes=self.event_hashes(request, template),
+            narrative=narrative,
+            context=context
+        )
+        with self._lock:
+            self._states[key] = state
+            self._states.move_to_end(key)
+            while len(self._states) > self.max_entries:
+                self._states.popitem(last=False)
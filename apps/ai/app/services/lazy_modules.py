@@ -0,0 +1,151 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import importlib
+import importlib.util
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LazyModules:
+    """
+    Registro de módulos pesados que se importan en el primer uso.
+
+    Los stacks de medios (PIL, imageio) y de ML (audiocraft, torchaudio)
+    no hacen falta para servir la primera petición: importarlos en el
+    arranque solo retrasa el momento en que el contenedor acepta tráfico.
+    `get` importa una vez (con lock) y guarda cuánto tardó; `preload`
+    los importa en segundo plano por grupos cuando la app ya responde.
+    `available` comprueba si están instalados sin importarlos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._specs: Dict[str, Tuple[str, str]] = {}
+        self._loaded: Dict[str, object] = {}
+        self._load_ms: Dict[str, float] = {}
+        self._errors: Dict[str, str] = {}
+        self._available: Dict[str, bool] = {}
+
+    def register(self, name: str, module: Optional[str] = None, group: str = "media"):
+        self._specs[name] = (module or name, group)
+
+    def available(self, name: str) -> bool:
+        """Instalado (sin importarlo); el resultado se cachea"""
+        if name not in self._available:
+            module = self._specs.get(name, (name, ""))[0]
+            try:
+                self._available[name] = importlib.util.find_spec(module) is not None
+            except (ImportError, ValueError):
+                self._available[name] = False
+        return self._available[name]
+
+    def get(self, name: str):
+        """El módulo, importándolo si es la primera vez (ImportError si falta)"""
+        module = self._loaded.get(name)
+        if module is not None:
+            return module
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+            target = self._specs.get(name, (name, ""))[0]
+            start = time.perf_counter()
+            try:
+                module = importlib.import_module(target)
+            except ImportError as e:
+                self._errors[name] = str(e)
+                self._available[name] = False
+                raise
+            self._load_ms[name] = (time.perf_counter() - start) * 1000
+            self._loaded[name] = module
+            self._available[name] = True
+            logger.info(f"[LAZY] {target} importado en {self._load_ms[name]:.0f} ms")
+            return module
+
+    def missing(self, *names: str) -> List[str]:
+        return [name for name in names if not self.available(name)]
+
+    def preload(self, groups: Tuple[str, ...] = ("media",)) -> Dict[str, float]:
+        """Importa los módulos instalados de `groups`; retorna ms por módulo"""
+        for name, (_, group) in list(self._specs.items()):
+            if group in groups and self.available(name):
+                try:
+                    self.get(name)
+                except Exception as e:  # un módulo roto no debe tumbar el warm-up
+                    self._errors[name] = str(e)
+                    logger.warning(f"[LAZY] No se pudo precargar {name}: {e}")
+        return {name: round(ms, 1) for name, ms in self._load_ms.items()}
+
+    def snapshot(self) -> Dict:
+        return {
+            name: {
+                "group": group,
+                "loaded": name in self._loaded,
+                "load_ms": round(self._load_ms[name], 1) if name in self._load_ms else None,
+                "available": self._available.get(name),
+                "error": self._errors.get(name),
+            }
+            for name, (_, group) in self._specs.items()
+        }
+
+
+lazy_modules = LazyModules()
+lazy_modules.register("numpy")
+lazy_modules.register("PIL", "PIL.Image")
+lazy_modules.register("imageio")
+lazy_modules.register("imageio_ffmpeg")
+lazy_modules.register("pydub")
+# ML: cientos de MB y segundos de import; solo se precargan si se pide
+lazy_modules.register("torchaudio", group="ml")
+lazy_modules.register("audiocraft", "audiocraft.models", group="ml")
+
+
+class Warmup:
+    """
+    Pasos de calentamiento tras el arranque, en un hilo de fondo.
+
+    La app empieza a responder (/livez) en cuanto termina el import de
+    main; /readyz espera a `done` para que el balanceador no envíe tráfico
+    que pagaría imports, el arranque de los workers o la carga de fuentes.
+    """
+
+    def __init__(self):
+        self._steps: List[Tuple[str, Callable[[], object]]] = []
+        self._thread: Optional[threading.Thread] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.results: Dict[str, Dict] = {}
+
+    def add(self, name: str, step: Callable[[], object]):
+        self._steps.append((name, step))
+
+    def start(self):
+        if self._thread is None:
+            self.started_at = time.monotonic()
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        for name, step in self._steps:
+            start = time.perf_counter()
+            try:
+                detail = step()
+                self.results[name] = {"ok": True, "ms": round((time.perf_counter() - start) * 1000, 1)}
+                if detail is not None:
+                    self.results[name]["detail"] = detail
+            except Exception as e:  # el servicio funciona sin warm-up, solo más lento
+                self.results[name] = {"ok": False, "error": str(e)}
+                logger.warning(f"[WARMUP] {name} falló: {e}")
+        self.finished_at = time.monotonic()
+        logger.info(f"[WARMUP] Completado en {(self.finished_at - self.started_at) * 1000:.0f} ms")
+
+    @property
+    def done(self) -> bool:
+        return self.finished_at is not None
+
+    def snapshot(self) -> Dict:
+        elapsed = None
+        if self.started_at is not None:
+            elapsed = round(((self.finished_at or time.monotonic()) - self.started_at) * 1000, 1)
+        return {"done": self.done, "elapsed_ms": elapsed, "steps": dict(self.results)}
@@ -0,0 +1,407 @@
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional
+import json
+import threading
+import time
+import logging
+
+import requests
+
+from app.config import settings
+from app.services.ollama_pool import HedgeCancelled, OllamaNode, OllamaPool
+from app.services.profiling import spans
+from app.services.resilience import is_transient, ollama_breaker, retry_call
+
+logger = logging.getLogger(__name__)
+
+
+class LLMOverloaded(Exception):
+    """La petición no se despachó antes de su plazo máximo de espera en cola"""
+
+
+class _Ticket:
+    """Petición en cola para un modelo"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.enqueued = time.monotonic()
+        self.swapped = False
+
+
+class LLMGateway:
+    """
+    Punto único de acceso a Ollama para todos los modelos del servicio.
+
+    Con OLLAMA_MAX_LOADED_MODELS=1, intercalar peticiones de distintos
+    modelos obliga a Ollama a descargar y recargar continuamente. El
+    planificador agrupa la cola por modelo: mientras el modelo activo tenga
+    peticiones pendientes se siguen despachando, y solo se cambia de modelo
+    cuando su cola se vacía, cuando ya despachó `max_batch` seguidas con
+    otros esperando, o cuando la petición más antigua de otro modelo supera
+    `max_wait` segundos (cota de inanición). El cambio espera a que terminen
+    las peticiones en vuelo del modelo anterior.
+
+    Cada petición despachada se envía al nodo que elija el `OllamaPool`; la
+    concurrencia máxima escala con el número de nodos sanos.
+
+    Los embeddings también pasan por el planificador, salvo con
+    `embed_coloaded` (el modelo de embeddings cabe cargado junto al
+    principal y llamarlo no provoca un cambio de modelo).
+    """
+
+    def __init__(
+        self,
+        pool: OllamaPool,
+        max_concurrency: int = 2,
+        max_batch: int = 8,
+        max_wait: float = 30.0,
+        embed_coloaded: bool = False
+    ):
+        self.pool = pool
+        self.embed_coloaded = embed_coloaded
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[_Ticket]] = {}
+        self._active: Optional[str] = None
+        self._in_flight = 0
+        self._batch_count = 0
+        self._keep_alive: Dict[str, Callable[[], str]] = {}
+
+        self.swaps = 0
+        self.queue_timeouts = 0
+        self.embedded = 0
+        self.swap_latency_ms: Deque[float] = deque(maxlen=50)
+        self.dispatched: Dict[str, int] = {}
+
+    @property
+    def base_url(self) -> str:
+        return self.pool.base_url
+
+    def set_keep_alive_policy(self, model: str, policy: Callable[[], str]):
+        """Registra la función que calcula el `keep_alive` de un modelo"""
+        self._keep_alive[model] = policy
+
+    # ==================== PLANIFICADOR ====================
+
+    def _oldest_other(self, model: str) -> Optional[_Ticket]:
+        heads = [q[0] for m, q in self._queues.items() if q and m != model]
+        return min(heads, key=lambda t: t.enqueued) if heads else None
+
+    def _must_yield(self) -> bool:
+        """El modelo activo debe ceder el turno a otro"""
+        other = self._oldest_other(self._active)
+        if other is None:
+            return False
+        waited = time.monotonic() - other.enqueued
+        return waited >= self.max_wait or self._batch_count >= self.max_batch
+
+    def _can_dispatch(self, ticket: _Ticket) -> bool:
+        queue = self._queues[ticket.model]
+        limit = self.max_concurrency * max(1, len(self.pool.healthy_nodes()))
+        if queue[0] is not ticket or self._in_flight >= limit:
+            return False
+
+        if self._active is None or ticket.model == self._active:
+            return self._active is None or not self._must_yield()
+
+        # Cambio de modelo: solo con el anterior drenado y en orden de llegada
+        if self._in_flight > 0:
+            return False
+        if self._queues.get(self._active) and not self._must_yield():
+            return False
+        return self._oldest_other(self._active) is ticket
+
+    def _acquire(self, model: str, queue_deadline: Optional[float] = None) -> _Ticket:
+        ticket = _Ticket(model)
+        with self._cond:
+            self._queues.setdefault(model, deque()).append(ticket)
+            # Timeout para reevaluar la cota de inanición aunque nadie notifique
+            while not self._can_dispatch(ticket):
+                wait = 0.5
+                if queue_deadline is not None:
+                    remaining = queue_deadline - (time.monotonic() - ticket.enqueued)
+                    if remaining <= 0:
+                        self._queues[model].remove(ticket)
+                        self.queue_timeouts += 1
+                        self._cond.notify_all()
+                        raise LLMOverloaded(
+                            f"Sin turno para {model} tras {queue_deadline:.1f}s en cola"
+                        )
+                    wait = min(wait, remaining)
+                self._cond.wait(timeout=wait)
+
+            self._queues[model].popleft()
+            if self._active != model:
+                if self._active is not None:
+                    self.swaps += 1
+                    ticket.swapped = True
+                    logger.info(f"[LLM] Cambio de modelo: {self._active} -> {model}")
+                self._active = model
+                self._batch_count = 0
+            self._batch_count += 1
+            self._in_flight += 1
+            self.dispatched[model] = self.dispatched.get(model, 0) + 1
+            self._cond.notify_all()
+        return ticket
+
+    def _release(self, ticket: _Ticket, load_duration_ns: Optional[int] = None):
+        with self._cond:
+            self._in_flight -= 1
+            self._note_swap(ticket, load_duration_ns)
+            self._cond.notify_all()
+
+    def _note_swap(self, ticket: _Ticket, load_duration_ns: Optional[int]):
+        if ticket.swapped and load_duration_ns:
+            self.swap_latency_ms.append(load_duration_ns / 1e6)
+
+    def _prepare(self, payload: Dict) -> Dict:
+        policy = self._keep_alive.get(payload["model"])
+        if policy and "keep_alive" not in payload:
+            payload = {**payload, "keep_alive": policy()}
+        return payload
+
+    # ==================== LLAMADAS ====================
+
+    def generate(self, payload: Dict, timeout: int = 900, hedge: bool = False,
+                 node_url: Optional[str] = None,
+                 queue_deadline: Optional[float] = None) -> Dict:
+        """
+        /api/generate sin streaming; retorna el JSON completo de Ollama.
+
+        Args:
+            payload: Cuerpo de la petición (debe incluir `model`)
+            timeout: Timeout de la petición HTTP
+            hedge: Permite una petición de cobertura en otro nodo (rutas interactivas)
+            node_url: Fuerza un nodo concreto (p. ej. para precargar cada nodo)
+            queue_deadline: Segundos máximos en cola antes de lanzar `LLMOverloaded`
+        """
+        payload = self._prepare({**payload, "stream": False})
+        # Errores de conexión y 5xx se reintentan con jitter dentro del timeout total
+        return retry_call(
+            lambda remaining: self._generate_once(payload, remaining, hedge, node_url, queue_deadline),
+            deadline=timeout,
+            attempts=settings.retry_max_attempts,
+            base_delay=settings.retry_base_delay,
+            max_delay=settings.retry_max_delay,
+            label=f"ollama {payload['model']}"
+        )
+
+    def _generate_once(self, payload: Dict, timeout: float, hedge: bool,
+                       node_url: Optional[str], queue_deadline: Optional[float]) -> Dict:
+        """
+        Un intento con `timeout` segundos de presupuesto total: la espera en
+        cola se descuenta del timeout de la petición HTTP.
+        """
+        # Con el circuito abierto se falla antes de ocupar un hueco en la cola
+        ollama_breaker.allow()
+        queued = time.monotonic()
+        try:
+            with spans.span("ollama.queue"):
+                ticket = self._acquire(
+                    payload["model"],
+                    timeout if queue_deadline is None else min(queue_deadline, timeout)
+                )
+        except LLMOverloaded:
+            ollama_breaker.release()
+            if queue_deadline is None or timeout < queue_deadline:
+                # Se agotó el presupuesto de la llamada, no la cota de cola pedida
+                raise requests.exceptions.Timeout(f"Sin turno para {payload['model']} en {timeout:.0f}s")
+            raise
+        except BaseException:
+            ollama_breaker.release()
+            raise
+        timeout -= time.monotonic() - queued
+        if timeout < 1.0:
+            ollama_breaker.release()
+            self._release(ticket)
+            raise requests.exceptions.Timeout(f"Presupuesto agotado en cola para {payload['model']}")
+        load_duration = None
+        # Con cobertura el hueco se libera cuando termina (o se cancela) la perdedora
+        settled_by_pool = False
+
+        def post(url: str) -> Dict:
+            response = requests.post(f"{url}/api/generate", json=payload, timeout=timeout)
+            response.raise_for_status()
+            return response.json()
+
+        def settled():
+            self._release(ticket)
+
+        try:
+            # El circuito mide solo la llamada, no la espera en cola
+            with spans.span("ollama.generate"), ollama_breaker.protect(check=False):
+                if node_url:
+                    result = post(node_url)
+                elif hedge:
+                    settled_by_pool = True
+                    result = self.pool.call_hedged(
+                        payload["model"],
+                        lambda node, cancel: self._post_cancellable(node, payload, timeout, cancel),
+                        on_settled=settled
+                    )
+                else:
+                    result = self.pool.call(payload["model"], lambda node: post(node.url))
+            load_duration = result.get("load_duration")
+            return result
+        finally:
+            if settled_by_pool:
+                with self._cond:
+                    self._note_swap(ticket, load_duration)
+            else:
+                self._release(ticket, load_duration)
+
+    @staticmethod
+    def _post_cancellable(node: OllamaNode, payload: Dict, timeout: float,
+                          cancel: threading.Event) -> Dict:
+        """
+        /api/generate en streaming, reensamblado como la respuesta sin
+        streaming. Permite abandonar la petición entre fragmentos: al cerrar
+        la conexión Ollama deja de generar.
+        """
+        parts: Dict[str, List[str]] = {"response": [], "thinking": []}
+        with requests.post(
+            f"{node.url}/api/generate",
+            json={**payload, "stream": True},
+            stream=True,
+            timeout=timeout
+        ) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if cancel.is_set():
+                    raise HedgeCancelled(node.url)
+                if not line:
+                    continue
+                data = json.loads(line)
+                if data.get("error"):
+                    raise Exception(data["error"])
+                for key, chunks in parts.items():
+                    if data.get(key):
+                        chunks.append(data[key])
+                if data.get("done"):
+                    result = {**data, "response": "".join(parts["response"])}
+                    if parts["thinking"]:
+                        result["thinking"] = "".join(parts["thinking"])
+                    return result
+        raise requests.exceptions.ConnectionError(f"{node.url} cerró el stream sin respuesta final")
+
+    def stream(self, payload: Dict, timeout: int = 900,
+               queue_deadline: Optional[float] = None) -> Iterator[Dict]:
+        """/api/generate en streaming; itera los objetos JSON de cada línea"""
+        payload = self._prepare({**payload, "stream": True})
+        ollama_breaker.allow()
+        queued = time.perf_counter()
+        try:
+            ticket = self._acquire(payload["model"], queue_deadline)
+        except BaseException:
+            ollama_breaker.release()
+            raise
+        spans.record("ollama.queue", time.perf_counter() - queued)
+        node = self.pool.choose(payload["model"])
+        load_duration = None
+        ok = False
+        error: Optional[BaseException] = None
+        start = time.time()
+        try:
+            with requests.post(
+                f"{node.url}/api/generate",
+                json=payload,
+                stream=True,
+                timeout=timeout
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    data = json.loads(line)
+                    if data.get("error"):
+                        raise Exception(data["error"])
+                    if data.get("done"):
+                        load_duration = data.get("load_duration")
+                    yield data
+                    if data.get("done"):
+                        break
+            ok = True
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            error = e
+            raise
+        except BaseException:
+            # Errores de contenido o cierre anticipado del consumidor no
+            # cuentan contra la salud del nodo
+            ok = True
+            raise
+        finally:
+            # Un span no puede abarcar los `yield`: el tiempo se registra al cerrar
+            spans.record("ollama.stream", time.time() - start)
+            ollama_breaker.record(error is not None and is_transient(error), time.time() - start, error)
+            self.pool.release(node, ok, (time.time() - start) * 1000 if ok else None)
+            self._release(ticket, load_duration)
+
+    def embed(self, model: str, inputs: List[str], timeout: int = 30,
+              queue_deadline: Optional[float] = None) -> List[List[float]]:
+        """
+        /api/embed; retorna un vector por texto.
+
+        Con OLLAMA_MAX_LOADED_MODELS=1 cargar el modelo de embeddings descarga
+        el principal, así que el embedding espera su turno en el planificador
+        como cualquier otra petición (y el cambio cuenta en `model_swaps`).
+        Sin `queue_deadline` espera en cola como mucho `timeout` segundos.
+        Con `embed_coloaded` ambos modelos caben a la vez y se llama directo.
+        """
+        def post(url: str) -> List[List[float]]:
+            response = requests.post(
+                f"{url}/api/embed",
+                json={"model": model, "input": inputs},
+                timeout=timeout
+            )
+            response.raise_for_status()
+            return response.json().get("embeddings", [])
+
+        ticket = None
+        if not self.embed_coloaded:
+            with spans.span("ollama.queue"):
+                ticket = self._acquire(model, queue_deadline if queue_deadline is not None else timeout)
+        try:
+            with spans.span("ollama.embed"), ollama_breaker.protect():
+                embeddings = self.pool.call(model, lambda node: post(node.url))
+        finally:
+            if ticket is not None:
+                self._release(ticket)
+        with self._cond:
+            self.embedded += len(inputs)
+        return embeddings
+
+    def stats(self) -> Dict:
+        with self._cond:
+            latencies = list(self.swap_latency_ms)
+            return {
+                "active_model": self._active,
+                "in_flight": self._in_flight,
+                "queued": {m: len(q) for m, q in self._queues.items() if q},
+                "dispatched": dict(self.dispatched),
+                "model_swaps": self.swaps,
+                "queue_timeouts": self.queue_timeouts,
+                "embedded_texts": self.embedded,
+                "swap_latency_ms_avg": round(sum(latencies) / len(latencies), 1) if latencies else None,
+                "swap_latency_ms_last": round(latencies[-1], 1) if latencies else None,
+                "pool": self.pool.status(),
+            }
+
+
+pool = OllamaPool(
+    urls=settings.ollama_endpoint_list,
+    probe_interval=settings.ollama_probe_interval,
+    eject_after=settings.ollama_eject_after_failures,
+    readmit_after=settings.ollama_readmit_after_probes,
+    hedge_after=settings.ollama_hedge_after_ms / 1000
+)
+
+gateway = LLMGateway(
+    pool=pool,
+    max_concurrency=settings.llm_max_concurrency,
+    max_batch=settings.llm_max_batch,
+    max_wait=settings.llm_max_wait_seconds,
+    embed_coloaded=settings.ollama_embed_coloaded
+)
@@ -0,0 +1,81 @@
+from collections import deque
+from typing import Deque, Dict, Optional
+import asyncio
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Mide el retraso del event loop de la API.
+
+    Una tarea duerme `interval` segundos y compara con lo que tardó en
+    despertar: la diferencia es el tiempo que el loop estuvo ocupado con
+    otra cosa (trabajo síncrono en una corrutina, GIL retenido por un hilo
+    con CPU). Por encima de `threshold_ms` se registra como bloqueo.
+    """
+
+    def __init__(self, interval: float = 0.25, threshold_ms: float = 100.0,
+                 window: int = 1200, log_every: float = 10.0):
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self.log_every = log_every
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._task: Optional[asyncio.Task] = None
+        self.blocked = 0
+        self.max_lag_ms = 0.0
+        self.last_blocked_ms: Optional[float] = None
+        self.last_blocked_at: Optional[float] = None
+        self._last_log = 0.0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - start - self.interval) * 1000)
+            self.record(lag_ms)
+
+    def record(self, lag_ms: float):
+        self._samples.append(lag_ms)
+        self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+        if lag_ms < self.threshold_ms:
+            return
+        self.blocked += 1
+        self.last_blocked_ms = lag_ms
+        self.last_blocked_at = time.time()
+        now = time.monotonic()
+        # Un aviso cada `log_every` segundos como máximo
+        if now - self._last_log >= self.log_every:
+            self._last_log = now
+            logger.warning(f"[LOOP] Event loop bloqueado {lag_ms:.0f} ms ({self.blocked} bloqueos)")
+
+    def snapshot(self) -> Dict:
+        samples = sorted(self._samples)
+
+        def pct(p: float) -> Optional[float]:
+            if not samples:
+                return None
+            return round(samples[min(len(samples) - 1, int(p * len(samples)))], 2)
+
+        return {
+            "running": self._task is not None,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold_ms,
+            "p50_ms": pct(0.50),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max_lag_ms, 2),
+            "blocked_events": self.blocked,
+            "last_blocked_ms": round(self.last_blocked_ms, 2) if self.last_blocked_ms else None,
+            "last_blocked_at": self.last_blocked_at,
+        }
@@ -0,0 +1,167 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+import asyncio
+import multiprocessing
+import os
+import threading
+import logging
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Variables que limitan los hilos de las librerías nativas en los workers
+_THREAD_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+
+
+def parse_cpus(spec: str) -> Optional[List[int]]:
+    """"2,3" o "2-5" → lista de CPUs; vacío = sin afinidad"""
+    cpus: List[int] = []
+    for part in (spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            low, high = part.split("-", 1)
+            cpus.extend(range(int(low), int(high) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus or None
+
+
+def apply_worker_limits(nice: int = 0, cpus: Optional[List[int]] = None, threads: int = 0):
+    """
+    Baja la prioridad y fija la afinidad del proceso actual.
+
+    Se usa como initializer de los workers y como preexec de FFmpeg; los
+    procesos hijos (p. ej. el ffmpeg de imageio) heredan ambos.
+    """
+    if nice > 0:
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+    if cpus and hasattr(os, "sched_setaffinity"):
+        try:
+            os.sched_setaffinity(0, cpus)
+        except OSError:
+            pass
+    if threads > 0:
+        for name in _THREAD_ENV:
+            os.environ[name] = str(threads)
+
+
+class MediaWorkers:
+    """
+    Capa de procesos para el trabajo de medios (render de slides, encoding,
+    audio) fuera del proceso de la API.
+
+    El render con PIL y la codificación retienen el GIL y el CPU; en el
+    proceso de FastAPI eso retrasa el event loop y a todos los endpoints.
+    Aquí el trabajo viaja por la cola del `ProcessPoolExecutor` a procesos
+    `spawn` (sin heredar hilos ni estado de la API) con prioridad baja,
+    afinidad de CPU opcional y un número de hilos fijo por codificación.
+    """
+
+    def __init__(
+        self,
+        workers: int = 1,
+        nice: int = 10,
+        cpus: Optional[List[int]] = None,
+        encode_threads: int = 2
+    ):
+        self.workers = max(1, workers)
+        self.nice = nice
+        self.cpus = cpus
+        self.encode_threads = encode_threads
+        self._ctx = multiprocessing.get_context("spawn")
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._manager = None
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0}
+        self._pending = 0
+
+    @property
+    def limits(self) -> tuple:
+        return (self.nice, self.cpus, self.encode_threads)
+
+    def executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=self._ctx,
+                    initializer=apply_worker_limits,
+                    initargs=self.limits
+                )
+                logger.info(
+                    f"[MEDIA] {self.workers} worker(s), nice={self.nice}, "
+                    f"cpus={self.cpus or 'todas'}, hilos por encode={self.encode_threads}"
+                )
+            return self._executor
+
+    def queue(self):
+        """Cola compartible con una tarea del pool (p. ej. slides en streaming)"""
+        with self._lock:
+            if self._manager is None:
+                self._manager = self._ctx.Manager()
+            return self._manager.Queue()
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        future = self.executor().submit(fn, *args, **kwargs)
+        with self._lock:
+            self.stats["submitted"] += 1
+            self._pending += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._pending -= 1
+            key = "failed" if future.cancelled() or future.exception() else "completed"
+            self.stats[key] += 1
+
+    def run(self, fn: Callable, *args, **kwargs):
+        """Ejecuta en un worker y espera el resultado (endpoints síncronos)"""
+        return self.submit(fn, *args, **kwargs).result()
+
+    async def run_async(self, fn: Callable, *args, **kwargs):
+        """Ejecuta en un worker sin bloquear el event loop"""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    def warm(self, fn: Callable) -> List:
+        """
+        Arranca los procesos del pool y ejecuta `fn` en ellos (imports,
+        fuentes) antes de que llegue trabajo real.
+        """
+        futures = [self.submit(fn) for _ in range(self.workers)]
+        return [future.result() for future in futures]
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                **self.stats,
+                "pending": self._pending,
+                "workers": self.workers,
+                "nice": self.nice,
+                "cpus": self.cpus,
+                "encode_threads": self.encode_threads,
+                "started": self._executor is not None,
+            }
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            manager, self._manager = self._manager, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if manager is not None:
+            manager.shutdown()
+
+
+media_workers = MediaWorkers(
+    workers=settings.media_workers,
+    nice=settings.media_worker_nice,
+    cpus=parse_cpus(settings.media_worker_cpus),
+    encode_threads=settings.media_encode_threads
+)
@@ -0,0 +1,186 @@
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+import threading
+import time
+import logging
+
+from app.services.llm_gateway import LLMGateway
+
+logger = logging.getLogger(__name__)
+
+
+class ModelLifecycleManager:
+    """
+    Mantiene caliente el modelo de Ollama.
+
+    - Precarga el modelo al arrancar el servicio.
+    - Calcula un `keep_alive` por petición según el tráfico reciente: con
+      tráfico frecuente el modelo se queda cargado más tiempo.
+    - Aprende un histograma de peticiones por hora del día y precarga el
+      modelo antes de las horas pico previstas.
+    - Expone si está cargado o frío según el sondeo /api/ps del pool.
+    """
+
+    def __init__(
+        self,
+        gateway: LLMGateway,
+        model: str,
+        min_keep_alive: int = 300,
+        max_keep_alive: int = 3600,
+        prewarm_lead_minutes: int = 10,
+        prewarm_min_requests: float = 3.0,
+        interval: int = 60,
+        daily_decay: float = 0.7
+    ):
+        self.gateway = gateway
+        self.model = model
+        self.min_keep_alive = min_keep_alive
+        self.max_keep_alive = max_keep_alive
+        self.prewarm_lead_minutes = prewarm_lead_minutes
+        self.prewarm_min_requests = prewarm_min_requests
+        self.interval = interval
+        self.daily_decay = daily_decay
+
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=256)
+        self._hourly = [0.0] * 24
+        self._day = datetime.now().date()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.loaded = False
+        self.expires_at: Optional[str] = None
+        self.last_checked: Optional[str] = None
+        self.last_preload_ms: Optional[float] = None
+        self.preloads = 0
+        self.cold_requests = 0
+
+    # ==================== TRÁFICO ====================
+
+    def touch(self) -> str:
+        """
+        Registra una petición al modelo y devuelve su `keep_alive`.
+
+        El keep_alive es el doble del intervalo medio entre las últimas
+        peticiones (acotado), y el máximo durante una hora pico prevista.
+        """
+        now = time.time()
+        today = datetime.now()
+        with self._lock:
+            if today.date() != self._day:
+                days = (today.date() - self._day).days
+                self._hourly = [count * self.daily_decay ** days for count in self._hourly]
+                self._day = today.date()
+            self._hourly[today.hour] += 1
+            if not self.loaded:
+                self.cold_requests += 1
+            self._recent.append(now)
+            recent = list(self._recent)
+
+        if self._is_peak(today.hour):
+            seconds = self.max_keep_alive
+        elif len(recent) < 2:
+            seconds = self.min_keep_alive
+        else:
+            gaps = [b - a for a, b in zip(recent, recent[1:])]
+            seconds = 2 * sum(gaps) / len(gaps)
+
+        seconds = int(min(self.max_keep_alive, max(self.min_keep_alive, seconds)))
+        return f"{seconds}s"
+
+    def _is_peak(self, hour: int) -> bool:
+        with self._lock:
+            return self._hourly[hour % 24] >= self.prewarm_min_requests
+
+    # ==================== CICLO DE VIDA ====================
+
+    def preload(self) -> bool:
+        """Carga el modelo en memoria de cada nodo sano sin generar tokens"""
+        start = time.time()
+        loaded_any = False
+        for node in self.gateway.pool.healthy_nodes():
+            try:
+                # Pasa por el gateway para no interrumpir un lote de otro modelo
+                self.gateway.generate(
+                    {
+                        "model": self.model,
+                        "prompt": "",
+                        "keep_alive": f"{self.max_keep_alive}s",
+                    },
+                    timeout=900,
+                    node_url=node.url
+                )
+                loaded_any = True
+            except Exception as e:
+                logger.warning(f"[MODEL] No se pudo precargar {self.model} en {node.url}: {e}")
+        if not loaded_any:
+            return False
+
+        with self._lock:
+            self.last_preload_ms = round((time.time() - start) * 1000, 1)
+            self.preloads += 1
+            self.loaded = True
+        logger.info(f"[MODEL] {self.model} precargado en {self.last_preload_ms} ms")
+        return True
+
+    def refresh(self) -> bool:
+        """Actualiza el estado cargado/frío con el último sondeo /api/ps del pool"""
+        entry = self.gateway.pool.model_loaded(self.model)
+        with self._lock:
+            self.loaded = entry is not None
+            self.expires_at = entry.get("expires_at") if entry else None
+            self.last_checked = datetime.now().isoformat()
+        return self.loaded
+
+    def _tick(self):
+        """Precarga si se acerca (o ya es) una hora pico y el modelo está frío"""
+        if self.refresh():
+            return
+        now = datetime.now()
+        upcoming = now + timedelta(minutes=self.prewarm_lead_minutes)
+        if self._is_peak(now.hour) or self._is_peak(upcoming.hour):
+            logger.info(f"[MODEL] Hora pico prevista, precargando {self.model}")
+            self.preload()
+
+    def _run(self, preload_on_start: bool):
+        if preload_on_start:
+            self.preload()
+        while not self._stop.wait(self.interval):
+            try:
+                self._tick()
+            except Exception as e:
+                logger.warning(f"[MODEL] Error en el ciclo de calentamiento: {e}")
+
+    def start(self, preload: bool = True):
+        """Arranca el hilo de calentamiento (la precarga no bloquea el arranque)"""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            args=(preload,),
+            name="model-lifecycle",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def status(self) -> Dict:
+        """Estado en caché, sin llamar a Ollama"""
+        with self._lock:
+            peak_hours = [h for h, count in enumerate(self._hourly)
+                          if count >= self.prewarm_min_requests]
+            return {
+                "model": self.model,
+                "state": "loaded" if self.loaded else "cold",
+                "expires_at": self.expires_at,
+                "last_checked": self.last_checked,
+                "last_preload_ms": self.last_preload_ms,
+                "preloads": self.preloads,
+                "cold_requests": self.cold_requests,
+                "peak_hours": peak_hours,
+            }
@@ -0,0 +1,342 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Set
+import threading
+import time
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeCancelled(Exception):
+    """La otra petición de una pareja con cobertura ya respondió"""
+
+
+def _normalize_model(name: str) -> str:
+    return name if ":" in name else f"{name}:latest"
+
+
+class OllamaNode:
+    """Estado de un servidor Ollama del pool"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+        self.probe_successes = 0
+        self.available_models: Optional[Set[str]] = None
+        self.loaded_models: Dict[str, Optional[str]] = {}
+        self.latency_ms: Optional[float] = None
+        self.last_probe: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.requests = 0
+
+    def has_model(self, model: str) -> bool:
+        # Sin información de /api/tags todavía: se asume que sí
+        return self.available_models is None or _normalize_model(model) in self.available_models
+
+    def is_loaded(self, model: str) -> bool:
+        return _normalize_model(model) in self.loaded_models
+
+    def status(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "failures": self.failures,
+            "loaded_models": sorted(self.loaded_models),
+            "latency_ms": round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            "last_probe": self.last_probe,
+            "last_error": self.last_error,
+        }
+
+
+class OllamaPool:
+    """
+    Pool de servidores Ollama con balanceo por menor número de peticiones
+    pendientes y afinidad al nodo que ya tiene el modelo cargado.
+
+    - Sondeo en segundo plano de /api/tags y /api/ps en cada nodo.
+    - Un nodo se expulsa tras `eject_after` fallos seguidos (sondeos o
+      peticiones) y se readmite tras `readmit_after` sondeos correctos.
+    - `call_hedged` lanza una segunda petición a otro nodo si la primera no
+      respondió en `hedge_after` segundos, se queda con la primera que
+      termine y cancela la otra; pensado para rutas interactivas.
+    """
+
+    # Peticiones pendientes equivalentes a tener que cargar el modelo
+    LOAD_PENALTY = 2
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        probe_interval: float = 10.0,
+        eject_after: int = 3,
+        readmit_after: int = 2,
+        hedge_after: float = 0.0
+    ):
+        self.nodes = [OllamaNode(url) for url in urls]
+        if not self.nodes:
+            raise ValueError("Se necesita al menos un endpoint de Ollama")
+        self.probe_interval = probe_interval
+        self.eject_after = eject_after
+        self.readmit_after = readmit_after
+        self.hedge_after = hedge_after
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        self.hedged = 0
+        self.hedge_wins = 0
+
+    @property
+    def base_url(self) -> str:
+        return self.nodes[0].url
+
+    # ==================== SELECCIÓN ====================
+
+    def healthy_nodes(self) -> List[OllamaNode]:
+        with self._lock:
+            healthy = [n for n in self.nodes if n.healthy]
+        return healthy
+
+    def choose(self, model: str, exclude: Iterable[OllamaNode] = ()) -> OllamaNode:
+        """Nodo sano con menos carga, priorizando los que tienen el modelo cargado"""
+        excluded = set(id(n) for n in exclude)
+        with self._lock:
+            candidates = [n for n in self.nodes if n.healthy and id(n) not in excluded]
+            with_model = [n for n in candidates if n.has_model(model)]
+            candidates = with_model or candidates
+            if not candidates:
+                # Todos expulsados: mejor intentar que fallar sin más
+                candidates = [n for n in self.nodes if id(n) not in excluded] or self.nodes
+
+            def score(node):
+                penalty = 0 if node.is_loaded(model) else self.LOAD_PENALTY
+                return (node.outstanding + penalty, node.latency_ms or 0)
+
+            node = min(candidates, key=score)
+            node.outstanding += 1
+            node.requests += 1
+            # El modelo quedará cargado en este nodo
+            node.loaded_models.setdefault(_normalize_model(model), None)
+        return node
+
+    def release(self, node: OllamaNode, ok: bool, latency_ms: Optional[float] = None):
+        with self._lock:
+            node.outstanding = max(0, node.outstanding - 1)
+            if ok:
+                node.failures = 0
+                if latency_ms is not None:
+                    node.latency_ms = latency_ms if node.latency_ms is None \
+                        else 0.8 * node.latency_ms + 0.2 * latency_ms
+            else:
+                self._record_failure(node, "error en petición")
+
+    def _record_failure(self, node: OllamaNode, error: str):
+        node.failures += 1
+        node.probe_successes = 0
+        node.last_error = error
+        if node.healthy and node.failures >= self.eject_after:
+            node.healthy = False
+            logger.warning(f"[POOL] Nodo expulsado: {node.url} ({error})")
+
+    def call(self, model: str, fn: Callable[[OllamaNode], object], retries: int = 1):
+        """
+        Ejecuta `fn(node)` en el mejor nodo. Los errores de conexión se
+        reintentan en otro nodo.
+        """
+        tried: List[OllamaNode] = []
+        while True:
+            node = self.choose(model, exclude=tried)
+            start = time.time()
+            try:
+                result = fn(node)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                self.release(node, ok=False)
+                tried.append(node)
+                if len(tried) > retries or len(tried) >= len(self.nodes):
+                    raise
+                logger.warning(f"[POOL] Reintentando en otro nodo tras fallo en {node.url}")
+                continue
+            except Exception:
+                self.release(node, ok=True)
+                raise
+            self.release(node, ok=True, latency_ms=(time.time() - start) * 1000)
+            return result
+
+    def _attempt(self, node: OllamaNode, fn: Callable[[OllamaNode, threading.Event], object],
+                 cancel: threading.Event):
+        start = time.time()
+        try:
+            result = fn(node, cancel)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            self.release(node, ok=False)
+            raise
+        except Exception:
+            self.release(node, ok=True)
+            raise
+        self.release(node, ok=True, latency_ms=(time.time() - start) * 1000)
+        return result
+
+    def call_hedged(
+        self,
+        model: str,
+        fn: Callable[[OllamaNode, threading.Event], object],
+        on_settled: Optional[Callable[[], None]] = None
+    ):
+        """
+        Como `call`, pero con una petición de cobertura en otro nodo si la
+        primera tarda.
+
+        `fn(node, cancel)` debe abandonar la petición (cerrando la conexión,
+        lo que detiene la generación en Ollama) y lanzar `HedgeCancelled`
+        cuando se active `cancel`: se activa en la que pierde. `on_settled`
+        se llama una vez, cuando ya no queda ninguna petición en curso, para
+        que el llamante libere su hueco de concurrencia solo entonces.
+        """
+        settle = on_settled or (lambda: None)
+        if self.hedge_after <= 0 or len(self.healthy_nodes()) < 2:
+            try:
+                return self.call(model, lambda node: fn(node, threading.Event()))
+            finally:
+                settle()
+
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="hedge")
+
+        primary_node = self.choose(model)
+        attempts = {}
+        cancel = threading.Event()
+        attempts[self._hedge_executor.submit(self._attempt, primary_node, fn, cancel)] = cancel
+        done, _ = wait(list(attempts), timeout=self.hedge_after)
+        if not done:
+            # La cobertura va a otro nodo: el lento es justo el que ya tiene el modelo
+            backup_node = self.choose(model, exclude=[primary_node])
+            if backup_node is primary_node:
+                self.release(backup_node, ok=True)
+            else:
+                with self._lock:
+                    self.hedged += 1
+                logger.info(f"[POOL] Petición lenta en {primary_node.url}, cobertura en {backup_node.url}")
+                cancel = threading.Event()
+                backup = self._hedge_executor.submit(self._attempt, backup_node, fn, cancel)
+                attempts[backup] = cancel
+
+        pending = set(attempts)
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if len(attempts) > 1 and future is not next(iter(attempts)):
+                    with self._lock:
+                        self.hedge_wins += 1
+                for loser in pending:
+                    attempts[loser].set()
+                    loser.add_done_callback(lambda _: settle())
+                if not pending:
+                    settle()
+                return result
+        settle()
+        raise error
+
+    # ==================== SONDEO ====================
+
+    def probe(self, node: OllamaNode):
+        """Consulta /api/tags y /api/ps de un nodo y actualiza su estado"""
+        try:
+            tags = requests.get(f"{node.url}/api/tags", timeout=3)
+            tags.raise_for_status()
+            ps = requests.get(f"{node.url}/api/ps", timeout=3)
+            ps.raise_for_status()
+        except Exception as e:
+            with self._lock:
+                self._record_failure(node, str(e))
+                node.last_probe = datetime.now().isoformat()
+            return
+
+        available = {m.get("name") for m in tags.json().get("models", []) if m.get("name")}
+        loaded = {
+            (m.get("name") or m.get("model")): m.get("expires_at")
+            for m in ps.json().get("models", [])
+        }
+        with self._lock:
+            node.available_models = available
+            node.loaded_models = loaded
+            node.failures = 0
+            node.last_error = None
+            node.last_probe = datetime.now().isoformat()
+            if not node.healthy:
+                node.probe_successes += 1
+                if node.probe_successes >= self.readmit_after:
+                    node.healthy = True
+                    node.probe_successes = 0
+                    logger.info(f"[POOL] Nodo readmitido: {node.url}")
+
+    def probe_all(self):
+        for node in self.nodes:
+            self.probe(node)
+
+    def _run(self):
+        while True:
+            self.probe_all()
+            if self._stop.wait(self.probe_interval):
+                break
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ollama-probe", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    # ==================== ESTADO ====================
+
+    def model_loaded(self, model: str) -> Optional[Dict]:
+        """Primer nodo sano con el modelo cargado según el último sondeo"""
+        with self._lock:
+            for node in self.nodes:
+                if node.healthy and node.is_loaded(model):
+                    return {"url": node.url, "expires_at": node.loaded_models.get(_normalize_model(model))}
+        return None
+
+    def probed(self) -> bool:
+        """Todos los nodos se han sondeado al menos una vez (con éxito o no)"""
+        with self._lock:
+            return all(n.last_probe is not None for n in self.nodes)
+
+    def probed_healthy(self) -> int:
+        """Nodos sanos que ya respondieron al menos a un sondeo"""
+        with self._lock:
+            return sum(1 for n in self.nodes if n.healthy and n.available_models is not None)
+
+    def available_models(self) -> List[str]:
+        with self._lock:
+            models = set()
+            for node in self.nodes:
+                if node.healthy and node.available_models:
+                    models |= node.available_models
+        return sorted(models)
+
+    def status(self) -> Dict:
+        with self._lock:
+            return {
+                "nodes": [n.status() for n in self.nodes],
+                "healthy": sum(1 for n in self.nodes if n.healthy),
+                "hedged_requests": self.hedged,
+                "hedge_wins": self.hedge_wins,
+            }
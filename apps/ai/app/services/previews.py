@@ -0,0 +1,157 @@
+from pathlib import Path
+from typing import Dict, List, Optional
+import json
+import os
+import shutil
+import uuid
+
+# Como slides.py, se importa en los workers de medios: solo PIL
+
+# Anchos de las miniaturas (16:9); la app elige la más cercana a su densidad
+THUMBNAIL_WIDTHS = (160, 320, 640)
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+POSTER_QUALITY = 82
+TILE_QUALITY = 70
+
+INDEX_FILE = "index.json"
+
+
+def _vtt_time(seconds: float) -> str:
+    ms = int(round(seconds * 1000))
+    hours, ms = divmod(ms, 3_600_000)
+    minutes, ms = divmod(ms, 60_000)
+    secs, ms = divmod(ms, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{ms:03d}"
+
+
+class PreviewBuilder:
+    """
+    Póster, miniaturas y sprite de búsqueda a partir de las imágenes que el
+    pipeline ya tiene en memoria, sin decodificar el MP4.
+
+    Cada `add` recibe un fotograma (slide o escena) y cuánto dura en el
+    video; solo se guarda una tesela pequeña por fotograma, así que el coste
+    de memoria no depende de la resolución. `finish` escribe el sprite, su
+    índice WebVTT (`sprite.jpg#xywh=...` por tramo) e `index.json`, y
+    sustituye de golpe el directorio anterior.
+    """
+
+    def __init__(self, output_dir: str):
+        self.output_dir = Path(output_dir)
+        self._build_dir = self.output_dir.with_name(f"{self.output_dir.name}.{uuid.uuid4().hex[:8]}")
+        self._build_dir.mkdir(parents=True)
+        self._tiles = []
+        self._cues = []
+        self._elapsed = 0.0
+        self._poster = None
+
+    def add(self, image, duration: float):
+        """`image` es un PIL.Image; `duration` en segundos de video"""
+        from PIL import Image
+
+        if self._poster is None:
+            self._write_poster(image)
+        height = round(SPRITE_TILE_WIDTH * image.height / image.width)
+        self._tiles.append(image.convert("RGB").resize((SPRITE_TILE_WIDTH, height), Image.LANCZOS))
+        self._cues.append((self._elapsed, self._elapsed + duration))
+        self._elapsed += duration
+
+    def _write_poster(self, image):
+        from PIL import Image
+
+        image = image.convert("RGB")
+        image.save(self._build_dir / "poster.jpg", quality=POSTER_QUALITY, optimize=True)
+        self._poster = {"width": image.width, "height": image.height}
+        for width in THUMBNAIL_WIDTHS:
+            if width >= image.width:
+                continue
+            thumb = image.resize((width, round(width * image.height / image.width)), Image.LANCZOS)
+            thumb.save(self._build_dir / f"thumb_{width}.jpg", quality=POSTER_QUALITY, optimize=True)
+
+    def finish(self) -> Optional[Dict]:
+        """Escribe sprite, WebVTT e índice; retorna el índice (None sin fotogramas)"""
+        from PIL import Image
+
+        if not self._tiles:
+            self.abort()
+            return None
+
+        tile_w, tile_h = self._tiles[0].size
+        columns = min(SPRITE_COLUMNS, len(self._tiles))
+        rows = -(-len(self._tiles) // columns)
+        sprite = Image.new("RGB", (columns * tile_w, rows * tile_h))
+        lines = ["WEBVTT", ""]
+        for i, (tile, (start, end)) in enumerate(zip(self._tiles, self._cues)):
+            x, y = (i % columns) * tile_w, (i // columns) * tile_h
+            sprite.paste(tile, (x, y))
+            lines += [f"{_vtt_time(start)} --> {_vtt_time(end)}", f"sprite.jpg#xywh={x},{y},{tile_w},{tile_h}", ""]
+        sprite.save(self._build_dir / "sprite.jpg", quality=TILE_QUALITY, optimize=True)
+        (self._build_dir / "sprite.vtt").write_text("\n".join(lines), encoding="utf-8")
+
+        index = {
+            "poster": {"file": "poster.jpg", **self._poster},
+            "thumbnails": sorted(
+                (
+                    {"file": f"thumb_{w}.jpg", "width": w}
+                    for w in THUMBNAIL_WIDTHS if (self._build_dir / f"thumb_{w}.jpg").exists()
+                ),
+                key=lambda t: t["width"]
+            ),
+            "sprite": {
+                "file": "sprite.jpg",
+                "vtt": "sprite.vtt",
+                "tile_width": tile_w,
+                "tile_height": tile_h,
+                "columns": columns,
+                "tiles": len(self._tiles),
+            },
+            "duration_seconds": self._elapsed,
+        }
+        (self._build_dir / INDEX_FILE).write_text(json.dumps(index), encoding="utf-8")
+        self._swap()
+        return index
+
+    def _swap(self):
+        # Los clientes nunca ven un directorio a medio escribir
+        old = None
+        if self.output_dir.exists():
+            old = self.output_dir.with_name(f"{self.output_dir.name}.old-{uuid.uuid4().hex[:8]}")
+            os.replace(self.output_dir, old)
+        os.replace(self._build_dir, self.output_dir)
+        if old is not None:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def abort(self):
+        shutil.rmtree(self._build_dir, ignore_errors=True)
+
+
+def build_previews(image_paths: List[str], durations: List[float], output_dir: str) -> Optional[Dict]:
+    """Previews de imágenes en disco (escenas de SD), para ejecutar en un worker"""
+    from PIL import Image
+
+    builder = PreviewBuilder(output_dir)
+    try:
+        for path, duration in zip(image_paths, durations):
+            with Image.open(path) as image:
+                builder.add(image, duration)
+        return builder.finish()
+    except BaseException:
+        builder.abort()
+        raise
+
+
+def load_index(output_dir: str) -> Optional[Dict]:
+    """Índice de previews de un directorio, o None si no existen"""
+    try:
+        return json.loads((Path(output_dir) / INDEX_FILE).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def preview_files(index: Dict) -> List[str]:
+    """Nombres servibles de un índice (lista blanca para el endpoint)"""
+    return (
+        [index["poster"]["file"], index["sprite"]["file"], index["sprite"]["vtt"]]
+        + [t["file"] for t in index["thumbnails"]]
+    )
@@ -0,0 +1,390 @@
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+import hmac
+import itertools
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# ==================== SPANS ====================
+
+class _ActiveSpan:
+    __slots__ = ("name", "children_us")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.children_us = 0.0
+
+
+# Pila de spans activos del contexto actual (tarea asyncio o hilo con contexto copiado)
+_stack: ContextVar[Tuple[_ActiveSpan, ...]] = ContextVar("profiling_spans", default=())
+
+
+class SpanRecorder:
+    """
+    Tiempos agregados por ruta de spans anidados.
+
+    Cada span acumula su tiempo propio (descontando el de sus hijos) bajo
+    la ruta completa `padre;hijo`, que es el formato "folded stacks" de
+    flamegraph.pl, speedscope e inferno. Las rutas distintas están acotadas
+    por `max_paths`; las que no caben se cuentan como `(otras)`.
+    """
+
+    def __init__(self, max_paths: int = 2000):
+        self.max_paths = max_paths
+        self._lock = threading.Lock()
+        self._self_us: Dict[str, float] = {}
+        self._stats: Dict[str, Dict] = {}
+
+    def _add(self, path: str, total_us: float, self_us: float, count: int = 1):
+        with self._lock:
+            if path not in self._stats and len(self._stats) >= self.max_paths:
+                path = "(otras)"
+            self._self_us[path] = self._self_us.get(path, 0.0) + self_us
+            stats = self._stats.setdefault(path, {"count": 0, "total_us": 0.0, "max_us": 0.0})
+            stats["count"] += count
+            stats["total_us"] += total_us
+            stats["max_us"] = max(stats["max_us"], total_us / count)
+
+    @staticmethod
+    def _path(stack: Tuple[_ActiveSpan, ...], name: str) -> str:
+        return ";".join([*(s.name for s in stack), name])
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        parent = _stack.get()
+        active = _ActiveSpan(name)
+        token = _stack.set(parent + (active,))
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            total_us = (time.perf_counter() - start) * 1e6
+            _stack.reset(token)
+            if parent:
+                parent[-1].children_us += total_us
+            self._add(self._path(parent, name), total_us, max(0.0, total_us - active.children_us))
+
+    def record(self, name: str, seconds: float, count: int = 1):
+        """
+        Añade un tiempo medido fuera de `span` (otro proceso, generadores)
+        como hijo del span activo.
+        """
+        parent = _stack.get()
+        total_us = seconds * 1e6
+        if parent:
+            parent[-1].children_us += total_us
+        self._add(self._path(parent, name), total_us, total_us, count)
+
+    def folded(self) -> str:
+        """Una línea `ruta;de;spans microsegundos` por ruta (tiempo propio)"""
+        with self._lock:
+            items = sorted(self._self_us.items())
+        return "\n".join(f"{path} {int(us)}" for path, us in items if us >= 1) + "\n"
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            items = [(path, dict(s)) for path, s in self._stats.items()]
+        return sorted(
+            (
+                {
+                    "path": path,
+                    "count": s["count"],
+                    "total_ms": round(s["total_us"] / 1000, 2),
+                    "avg_ms": round(s["total_us"] / s["count"] / 1000, 2),
+                    "max_ms": round(s["max_us"] / 1000, 2),
+                }
+                for path, s in items
+            ),
+            key=lambda s: -s["total_ms"]
+        )
+
+    def reset(self):
+        with self._lock:
+            self._self_us.clear()
+            self._stats.clear()
+
+
+spans = SpanRecorder()
+
+
+# ==================== PERFILES POR PETICIÓN ====================
+
+def _frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _SamplingSession:
+    def __init__(self, session_id: str, label: str, interval: float, max_seconds: float):
+        self.id = session_id
+        self.label = label
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self.started = time.time()
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{session_id}", daemon=True)
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        start = time.perf_counter()
+        while not self._stop.is_set() and time.perf_counter() - start < self.max_seconds:
+            if len(names) != threading.active_count():
+                names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(f"thread:{names.get(thread_id, thread_id)}")
+                self.samples[";".join(reversed(stack))] += 1
+            self._stop.wait(self.interval)
+        self.duration = time.perf_counter() - start
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+class SamplingProfiler:
+    """
+    Perfil estadístico de una petición concreta.
+
+    Mientras dura la petición un hilo toma muestras de la pila de todos los
+    hilos (`sys._current_frames`) cada `interval` segundos; así se cubren
+    tanto endpoints async como los síncronos que corren en el threadpool.
+    La raíz de cada pila es el hilo, para separar la petición del resto.
+    Solo se activa bajo demanda y se guardan los últimos `keep` perfiles.
+    """
+
+    def __init__(self, interval: float = 0.005, max_seconds: float = 60.0, keep: int = 20):
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self.keep = keep
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._profiles: "OrderedDict[str, _SamplingSession]" = OrderedDict()
+
+    def start(self, label: str) -> _SamplingSession:
+        session = _SamplingSession(
+            f"p{int(time.time())}-{next(self._ids)}", label, self.interval, self.max_seconds
+        )
+        session.start()
+        return session
+
+    def stop(self, session: _SamplingSession) -> str:
+        session.stop()
+        with self._lock:
+            self._profiles[session.id] = session
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        logger.info(
+            f"[PROFILE] {session.id} {session.label}: {sum(session.samples.values())} muestras "
+            f"en {session.duration * 1000:.0f} ms"
+        )
+        return session.id
+
+    def list(self) -> List[Dict]:
+        with self._lock:
+            sessions = list(self._profiles.values())
+        return [
+            {
+                "id": s.id,
+                "label": s.label,
+                "started": s.started,
+                "duration_ms": round(s.duration * 1000, 1),
+                "samples": sum(s.samples.values()),
+            }
+            for s in reversed(sessions)
+        ]
+
+    def get(self, profile_id: str) -> Optional[_SamplingSession]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    @staticmethod
+    def folded(session: _SamplingSession) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in sorted(session.samples.items())) + "\n"
+
+    @staticmethod
+    def top(session: _SamplingSession, limit: int = 30) -> Dict:
+        """Funciones con más muestras propias (hoja) y totales (en la pila)"""
+        own: Counter = Counter()
+        total: Counter = Counter()
+        for stack, count in session.samples.items():
+            frames = stack.split(";")
+            own[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total[frame] += count
+        samples = sum(session.samples.values()) or 1
+        return {
+            "samples": samples,
+            "interval_ms": session.interval * 1000,
+            "self": [{"frame": f, "pct": round(100 * c / samples, 1)} for f, c in own.most_common(limit)],
+            "cumulative": [{"frame": f, "pct": round(100 * c / samples, 1)} for f, c in total.most_common(limit)],
+        }
+
+
+# ==================== MEMORIA ====================
+
+class MemoryProfiler:
+    """
+    Snapshots de `tracemalloc` para localizar crecimiento de memoria.
+
+    `snapshot()` guarda una línea base; `diff()` compara el estado actual
+    con ella agrupando por línea de código. El trazado tiene coste, así que
+    solo está activo entre `start()` y `stop()`.
+    """
+
+    _IGNORE = (
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+        tracemalloc.Filter(False, "<unknown>"),
+    )
+
+    def __init__(self, keep: int = 10):
+        self.keep = keep
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._snapshots: "OrderedDict[str, Tuple[float, tracemalloc.Snapshot]]" = OrderedDict()
+
+    def start(self, frames: int = 10) -> Dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+        return self.status()
+
+    def stop(self) -> Dict:
+        tracemalloc.stop()
+        with self._lock:
+            self._snapshots.clear()
+        return self.status()
+
+    def _take(self) -> tracemalloc.Snapshot:
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc no está activo")
+        return tracemalloc.take_snapshot().filter_traces(self._IGNORE)
+
+    def snapshot(self) -> str:
+        snapshot = self._take()
+        snapshot_id = f"m{next(self._ids)}"
+        with self._lock:
+            self._snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self._snapshots) > self.keep:
+                self._snapshots.popitem(last=False)
+        return snapshot_id
+
+    def diff(self, base_id: str, limit: int = 25, key: str = "lineno") -> Dict:
+        with self._lock:
+            base = self._snapshots.get(base_id)
+        if base is None:
+            raise KeyError(base_id)
+        taken, base_snapshot = base
+        stats = self._take().compare_to(base_snapshot, key)
+        return {
+            "base": base_id,
+            "seconds_since_base": round(time.time() - taken, 1),
+            "size_diff_kb": round(sum(s.size_diff for s in stats) / 1024, 1),
+            "top": [
+                {
+                    "location": str(s.traceback[0]),
+                    "size_diff_kb": round(s.size_diff / 1024, 1),
+                    "size_kb": round(s.size / 1024, 1),
+                    "count_diff": s.count_diff,
+                }
+                for s in stats[:limit]
+            ],
+        }
+
+    def status(self) -> Dict:
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        with self._lock:
+            snapshots = list(self._snapshots)
+        return {
+            "tracing": tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "traced_mb": round(current / 1024 ** 2, 2),
+            "peak_mb": round(peak / 1024 ** 2, 2),
+            "snapshots": snapshots,
+        }
+
+
+memory_profiler = MemoryProfiler()
+
+
+# ==================== MIDDLEWARE ====================
+
+def route_name(scope: Dict) -> str:
+    """Plantilla de la ruta (`/capsule/download-video/{date}`) para no abrir una ruta por URL"""
+    from starlette.routing import Match
+
+    app = scope.get("app")
+    for route in getattr(app, "routes", ()):
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", scope["path"])
+    return "(sin ruta)"
+
+
+class ProfilingMiddleware:
+    """
+    Middleware ASGI: abre el span raíz de cada petición (`GET /ruta`) y,
+    si la petición lo pide con `X-Profile: 1` o `?profile=1` y trae un
+    `X-Admin-Token` válido, la perfila con `profiler` y devuelve el id del
+    perfil en `X-Profile-Id`.
+
+    Es ASGI puro (no `BaseHTTPMiddleware`) para que el span cubra también
+    el cuerpo de las respuestas en streaming.
+    """
+
+    def __init__(self, app, profiler: SamplingProfiler, admin_token: str = ""):
+        self.app = app
+        self.profiler = profiler
+        self.admin_token = admin_token
+
+    def _wants_profile(self, scope: Dict) -> bool:
+        if not self.admin_token:
+            return False
+        headers = dict(scope.get("headers") or ())
+        query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+        if headers.get(b"x-profile") != b"1" and query.get("profile") != ["1"]:
+            return False
+        # Bytes crudos: compare_digest no acepta str con caracteres no ASCII
+        return hmac.compare_digest(headers.get(b"x-admin-token", b""), self.admin_token.encode("utf-8"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        label = f"{scope['method']} {route_name(scope)}"
+        session = self.profiler.start(label) if self._wants_profile(scope) else None
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (b"x-profile-id", session.id.encode())]
+            await send(message)
+
+        try:
+            with spans.span(label):
+                await self.app(scope, receive, send_with_id if session else send)
+        finally:
+            if session is not None:
+                self.profiler.stop(session)
@@ -0,0 +1,351 @@
+from typing import Dict, List, Optional
+import threading
+import logging
+
+from app.models.capsule import CapsuleData, DayEvent
+from app.utils.helpers import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LANGUAGE = "es"
+
+
+def base_language(language: Optional[str]) -> str:
+    """Código base del idioma: "en-US", "en_GB" y "EN" -> "en" """
+    return (language or DEFAULT_LANGUAGE).replace("_", "-").split("-")[0].strip().lower() or DEFAULT_LANGUAGE
+
+
+class PromptTemplate:
+    """
+    Plantilla de prompt precompilada para un idioma.
+
+    Todo el texto constante (instrucciones del sistema y formato de salida)
+    vive en `system`, que Ollama coloca al inicio del prompt. Así el prefijo
+    es idéntico entre peticiones y llama.cpp puede reutilizar su caché KV;
+    solo la parte variable (`prompt`) se evalúa en cada llamada.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        language: str,
+        system: str,
+        header: str,
+        labels: Dict[str, str]
+    ):
+        self.name = name
+        self.language = language
+        self.system = system.strip()
+        self.header = header
+        self.labels = labels
+        self.key = f"{name}:{language}"
+        self.system_tokens = estimate_tokens(self.system)
+
+    def format_event(self, event: DayEvent) -> str:
+        """Formatea un evento en una línea estable (mismo evento, mismo texto)"""
+        na = self.labels["na"]
+        return (
+            f"- {event.time}: {event.description} "
+            f"({self.labels['location']}: {event.location if event.location else na}, "
+            f"{self.labels['intensity']}: "
+            f"{event.emotional_intensity if event.emotional_intensity else na}/10)"
+        )
+
+    def format_events(self, events: List[DayEvent]) -> str:
+        return "\n".join(self.format_event(e) for e in events)
+
+    def render(
+        self,
+        capsule: CapsuleData,
+        focus_areas: Optional[List[str]] = None,
+        events_text: Optional[str] = None,
+        events_label: Optional[str] = None
+    ) -> Dict[str, str]:
+        """
+        Construye los campos `system` y `prompt` para /api/generate.
+
+        Args:
+            capsule: Datos de la cápsula
+            focus_areas: Áreas de enfoque opcionales
+            events_text: Texto de eventos ya formateado (por defecto, todos)
+            events_label: Encabezado alternativo para la sección de eventos
+
+        Returns:
+            Dict con las claves `system` y `prompt`
+        """
+        if events_text is None:
+            events_text = self.format_events(capsule.events)
+
+        focus_text = ""
+        if focus_areas:
+            focus_text = f"\n\n{self.labels['focus']}:\n" + "\n".join(
+                [f"- {area}" for area in focus_areas]
+            )
+
+        prompt = f"""{self.header}
+
+{self.labels['date']}: {capsule.date}
+
+{events_label or self.labels['events']}:
+{events_text}
+
+{self.labels['mood']}:
+{capsule.mood_notes}
+
+{self.labels['memories']}:
+{', '.join(capsule.key_memories)}
+{focus_text}"""
+
+        return {"system": self.system, "prompt": prompt}
+
+    def render_chunk(self, date: str, window: str, events_text: str) -> Dict[str, str]:
+        """Prompt de una franja horaria para el paso map de la reconstrucción jerárquica"""
+        prompt = f"""{self.labels['date']}: {date}
+{self.labels['window']}: {window}
+
+{self.labels['events']}:
+{events_text}"""
+        return {"system": self.system, "prompt": prompt}
+
+    def render_continuation(self, events_text: str) -> Dict[str, str]:
+        """
+        Prompt de continuación con solo los eventos nuevos.
+
+        Se envía junto al `context` de la respuesta anterior, que ya contiene
+        el prefijo del sistema, así que `system` va vacío.
+        """
+        prompt = f"""{self.labels['new_events']}:
+{events_text}
+
+{self.labels['continue']}"""
+        return {"system": "", "prompt": prompt}
+
+    def append_related(self, rendered: Dict[str, str], related_text: str) -> Dict[str, str]:
+        """Añade al prompt el contexto compacto de días relacionados"""
+        if not related_text:
+            return rendered
+        prompt = f"""{rendered['prompt']}
+
+{self.labels['related']}:
+{related_text}"""
+        return {**rendered, "prompt": prompt}
+
+    def render_repair(self, raw: str, error: str) -> Dict[str, str]:
+        """Prompt de corrección de un JSON que no cumple el esquema"""
+        prompt = f"""{self.labels['error']}:
+{error[:1000]}
+
+JSON:
+{raw}"""
+        return {"system": self.system, "prompt": prompt}
+
+
+# ==================== PLANTILLAS ====================
+
+_RECONSTRUCT_SYSTEM = {
+    "es": """Eres un experto en análisis psicológico y narrativa.
+Tu tarea es reconstruir una narrativa coherente de un día específico basándote en eventos,
+emociones y memorias fragmentadas.
+
+INSTRUCCIONES:
+1. Analiza patrones y conexiones entre eventos
+2. Identifica el flujo emocional del día
+3. Encuentra momentos pivotes
+4. Proporciona insights profundos
+5. Responde en español
+
+Sé empático pero analítico.
+
+Para cada día recibido, reconstruye y analiza el día. Proporciona:
+1. Narrativa coherente
+2. Patrones identificados
+3. Momentos pivotes
+4. Reflexión emocional
+5. Conclusión""",
+    "en": """You are an expert in psychological analysis and narrative.
+Your task is to reconstruct a coherent narrative of a specific day based on events,
+emotions and fragmented memories.
+
+INSTRUCTIONS:
+1. Analyze patterns and connections between events
+2. Identify the emotional flow of the day
+3. Find pivotal moments
+4. Provide deep insights
+5. Answer in English
+
+Be empathetic but analytical.
+
+For every day you receive, reconstruct and analyze it. Provide:
+1. Coherent narrative
+2. Identified patterns
+3. Pivotal moments
+4. Emotional reflection
+5. Conclusion""",
+}
+
+_SIMPLE_SYSTEM = {
+    "es": "Analiza brevemente el día que se te proporciona. "
+          "Proporciona un resumen de 3-4 párrafos.",
+    "en": "Briefly analyze the day you are given. "
+          "Provide a 3-4 paragraph summary.",
+}
+
+_CHUNK_SYSTEM = {
+    "es": """Resume de forma fiel y concisa los eventos de una franja horaria de un día.
+Conserva horas, lugares y emociones relevantes; no inventes nada.
+Responde en español, en un solo párrafo de máximo 120 palabras.""",
+    "en": """Summarize faithfully and concisely the events of one time window of a day.
+Keep relevant times, places and emotions; do not invent anything.
+Answer in English, in a single paragraph of at most 120 words.""",
+}
+
+_REPAIR_SYSTEM = {
+    "es": """El JSON que recibirás no cumple el esquema requerido.
+Devuelve SOLO el JSON corregido, conservando el contenido original y su idioma.""",
+    "en": """The JSON you receive does not match the required schema.
+Return ONLY the corrected JSON, keeping the original content and its language.""",
+}
+
+_LABELS = {
+    "es": {
+        "header": "INFORMACIÓN DEL DÍA:",
+        "date": "Fecha",
+        "events": "EVENTOS",
+        "mood": "NOTAS DE HUMOR",
+        "memories": "MEMORIAS CLAVE",
+        "focus": "Áreas de enfoque",
+        "window": "FRANJA",
+        "partials": "RESÚMENES POR FRANJA HORARIA",
+        "new_events": "NUEVOS EVENTOS DEL MISMO DÍA",
+        "related": "DÍAS RELACIONADOS DEL PASADO (solo como contexto)",
+        "json": "Responde únicamente con un objeto JSON que cumpla el esquema indicado.",
+        "continue": "Actualiza la reconstrucción anterior incorporando estos eventos. "
+                    "Devuelve la reconstrucción completa actualizada con la misma estructura.",
+        "location": "Ubicación",
+        "intensity": "Intensidad",
+        "na": "N/A",
+        "error": "ERROR",
+    },
+    "en": {
+        "header": "DAY INFORMATION:",
+        "date": "Date",
+        "events": "EVENTS",
+        "mood": "MOOD NOTES",
+        "memories": "KEY MEMORIES",
+        "focus": "Focus areas",
+        "window": "WINDOW",
+        "partials": "SUMMARIES BY TIME WINDOW",
+        "new_events": "NEW EVENTS FROM THE SAME DAY",
+        "related": "RELATED PAST DAYS (context only)",
+        "json": "Answer only with a JSON object that matches the given schema.",
+        "continue": "Update the previous reconstruction to include these events. "
+                    "Return the complete updated reconstruction with the same structure.",
+        "location": "Location",
+        "intensity": "Intensity",
+        "na": "N/A",
+        "error": "ERROR",
+    },
+}
+
+
+def _compile_templates() -> Dict[str, PromptTemplate]:
+    """Precompila todas las plantillas al importar el módulo"""
+    templates = {}
+    for language, labels in _LABELS.items():
+        for name, systems in (
+            ("reconstruct", _RECONSTRUCT_SYSTEM),
+            ("simple", _SIMPLE_SYSTEM),
+            ("chunk", _CHUNK_SYSTEM),
+            ("repair", _REPAIR_SYSTEM),
+        ):
+            template = PromptTemplate(
+                name=name,
+                language=language,
+                system=systems[language],
+                header=labels["header"],
+                labels=labels
+            )
+            templates[template.key] = template
+    return templates
+
+
+TEMPLATES = _compile_templates()
+
+
+def get_template(name: str = "reconstruct", language: Optional[str] = None) -> PromptTemplate:
+    """
+    Obtiene una plantilla precompilada.
+
+    Idiomas no soportados caen en español, que es el idioma por defecto.
+    """
+    template = TEMPLATES.get(f"{name}:{base_language(language)}")
+    if template is None:
+        template = TEMPLATES[f"{name}:{DEFAULT_LANGUAGE}"]
+    return template
+
+
+# ==================== MEDICIÓN ====================
+
+class PromptEvalStats:
+    """
+    Acumula `prompt_eval_count`/`prompt_eval_duration` de Ollama por plantilla
+    para estimar cuánto tiempo de evaluación ahorra el prefijo cacheado.
+
+    La primera llamada (o la más lenta por token) se toma como referencia en
+    frío; el ahorro de cada llamada es el coste de los tokens que Ollama no
+    tuvo que evaluar al precio por token de referencia.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Dict] = {}
+
+    def record(self, template: PromptTemplate, rendered: Dict[str, str], result: Dict) -> Dict:
+        """Registra la métrica de una respuesta de Ollama y retorna el detalle"""
+        evaluated = int(result.get("prompt_eval_count") or 0)
+        duration_ns = int(result.get("prompt_eval_duration") or 0)
+        estimated = template.system_tokens + estimate_tokens(rendered["prompt"])
+
+        with self._lock:
+            stats = self._stats.setdefault(template.key, {
+                "requests": 0,
+                "evaluated_tokens": 0,
+                "prompt_eval_ms": 0.0,
+                "saved_ms": 0.0,
+                "cold_ns_per_token": 0.0,
+            })
+
+            ns_per_token = duration_ns / evaluated if evaluated else 0.0
+            if ns_per_token > stats["cold_ns_per_token"]:
+                stats["cold_ns_per_token"] = ns_per_token
+
+            cached_tokens = max(0, estimated - evaluated)
+            saved_ms = cached_tokens * stats["cold_ns_per_token"] / 1e6
+
+            stats["requests"] += 1
+            stats["evaluated_tokens"] += evaluated
+            stats["prompt_eval_ms"] += duration_ns / 1e6
+            stats["saved_ms"] += saved_ms
+
+        return {
+            "template": template.key,
+            "estimated_prompt_tokens": estimated,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_ms": round(duration_ns / 1e6, 2),
+            "cached_tokens_estimate": cached_tokens,
+            "saved_ms_estimate": round(saved_ms, 2),
+        }
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                key: {
+                    **value,
+                    "prompt_eval_ms": round(value["prompt_eval_ms"], 2),
+                    "saved_ms": round(value["saved_ms"], 2),
+                }
+                for key, value in self._stats.items()
+            }
+
+
+prompt_eval_stats = PromptEvalStats()
@@ -0,0 +1,234 @@
+from typing import Dict, Iterator, List, Optional, Tuple
+import re
+import threading
+import logging
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+_THINK_BLOCK = re.compile(r"<think>([\s\S]*?)(?:</think>|$)")
+
+
+def split_reasoning(text: str) -> Tuple[str, str]:
+    """
+    Separa el razonamiento `<think>...</think>` de la respuesta final.
+
+    Returns:
+        (razonamiento, respuesta) sin etiquetas y sin espacios sobrantes
+    """
+    if not text or THINK_OPEN not in text:
+        return "", (text or "").strip()
+    thinking = "\n".join(m.strip() for m in _THINK_BLOCK.findall(text))
+    answer = _THINK_BLOCK.sub("", text)
+    return thinking.strip(), answer.strip()
+
+
+class ThinkStreamParser:
+    """
+    Separa razonamiento y respuesta en un stream de tokens.
+
+    Las etiquetas pueden llegar partidas entre fragmentos ("<thi" + "nk>"),
+    así que se retiene el final de cada fragmento que pueda ser el inicio
+    de una etiqueta hasta que llegue el siguiente.
+    """
+
+    def __init__(self):
+        self.in_think = False
+        self.pending = ""
+        self.thinking = []
+        self.answer = []
+
+    def feed(self, chunk: str) -> Tuple[str, str]:
+        """
+        Procesa un fragmento.
+
+        Returns:
+            (delta de razonamiento, delta de respuesta)
+        """
+        text = self.pending + chunk
+        self.pending = ""
+        think_out, answer_out = [], []
+
+        while text:
+            tag = THINK_CLOSE if self.in_think else THINK_OPEN
+            index = text.find(tag)
+            if index >= 0:
+                (think_out if self.in_think else answer_out).append(text[:index])
+                text = text[index + len(tag):]
+                self.in_think = not self.in_think
+                continue
+
+            # Posible etiqueta partida al final del fragmento
+            keep = 0
+            for size in range(min(len(tag) - 1, len(text)), 0, -1):
+                if tag.startswith(text[-size:]):
+                    keep = size
+                    break
+            emit = text[:len(text) - keep]
+            self.pending = text[len(text) - keep:]
+            (think_out if self.in_think else answer_out).append(emit)
+            break
+
+        think_delta, answer_delta = "".join(think_out), "".join(answer_out)
+        self.thinking.append(think_delta)
+        self.answer.append(answer_delta)
+        return think_delta, answer_delta
+
+    def feed_thinking(self, text: str):
+        """Razonamiento que Ollama ya entrega separado (campo `thinking`)"""
+        self.thinking.append(text)
+
+    def flush(self) -> Tuple[str, str]:
+        """Emite lo retenido por una posible etiqueta partida que nunca se completó"""
+        tail, self.pending = self.pending, ""
+        if self.in_think:
+            self.thinking.append(tail)
+            return tail, ""
+        self.answer.append(tail)
+        return "", tail
+
+    def finish(self) -> Tuple[str, str]:
+        self.flush()
+        return "".join(self.thinking).strip(), "".join(self.answer).strip()
+
+
+class ReasoningGenerator:
+    """
+    Generación con modelos de razonamiento (deepseek-r1).
+
+    - `reasoning=False`: se pide a Ollama que no piense (`think: false`); si
+      la versión de Ollama lo ignora, el bloque `<think>` se descarta igual.
+      `think` solo se envía a los modelos de `think_models` (prefijos), ya
+      que Ollama lo rechaza en los modelos sin razonamiento.
+    - `reasoning=True`: el razonamiento se devuelve aparte (campo `thinking`
+      de Ollama o bloque `<think>` en la respuesta).
+    - `max_thinking_tokens`: el razonamiento se lee en streaming y, si supera
+      el presupuesto antes de empezar la respuesta, se corta la generación y
+      se repite sin razonamiento conservando la traza parcial. Si el stream
+      termina sin respuesta final por otro motivo, el error se propaga.
+    """
+
+    def __init__(self, gateway, model: str, think_param: bool = True,
+                 max_thinking_tokens: int = 0, think_models: Optional[List[str]] = None):
+        self.gateway = gateway
+        self.model = model
+        self.think_param = think_param
+        self.think_models = [m.lower() for m in (think_models or ["deepseek-r1"])]
+        self.max_thinking_tokens = max_thinking_tokens
+        self._lock = threading.Lock()
+        self.stats = {"with_reasoning": 0, "without_reasoning": 0, "capped": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def supports_think(self, model: str) -> bool:
+        name = (model or "").lower().rsplit("/", 1)[-1]
+        return any(name.startswith(prefix) for prefix in self.think_models)
+
+    def _with_think(self, payload: Dict, think: bool) -> Dict:
+        if self.think_param and self.supports_think(payload.get("model", self.model)):
+            return {**payload, "think": think}
+        return payload
+
+    def generate(
+        self,
+        payload: Dict,
+        reasoning: bool = True,
+        max_thinking_tokens: Optional[int] = None,
+        timeout: int = 900,
+        hedge: bool = False,
+        queue_deadline: Optional[float] = None
+    ) -> Dict:
+        """
+        Llama a /api/generate y separa el razonamiento de la respuesta.
+
+        Returns:
+            JSON de Ollama con `response` sin razonamiento y `thinking` aparte
+        """
+        if not reasoning:
+            self._count("without_reasoning")
+            result = self.gateway.generate(self._with_think(payload, False), timeout=timeout,
+                                           hedge=hedge, queue_deadline=queue_deadline)
+            _, answer = split_reasoning(result.get("response", ""))
+            return {**result, "response": answer, "thinking": ""}
+
+        self._count("with_reasoning")
+        budget = self.max_thinking_tokens if max_thinking_tokens is None else max_thinking_tokens
+        if budget and budget > 0:
+            return self._generate_capped(payload, budget, timeout, hedge, queue_deadline)
+
+        result = self.gateway.generate(self._with_think(payload, True), timeout=timeout,
+                                       hedge=hedge, queue_deadline=queue_deadline)
+        thinking, answer = split_reasoning(result.get("response", ""))
+        thinking = "\n".join(t for t in (result.get("thinking", "").strip(), thinking) if t)
+        return {**result, "response": answer, "thinking": thinking}
+
+    def stream(self, payload: Dict, reasoning: bool = True, timeout: int = 900) -> Iterator[Dict]:
+        """
+        /api/generate en streaming con el razonamiento separado.
+
+        Cada objeto trae en `response` solo el texto de la respuesta y en
+        `thinking` el del razonamiento (vacío si `reasoning=False`).
+        """
+        self._count("with_reasoning" if reasoning else "without_reasoning")
+        parser = ThinkStreamParser()
+        for data in self.gateway.stream(self._with_think(payload, reasoning), timeout):
+            think_delta, answer_delta = parser.feed(data.get("response", ""))
+            think_delta = data.get("thinking", "") + think_delta
+            if data.get("done"):
+                think_tail, answer_tail = parser.flush()
+                think_delta += think_tail
+                answer_delta += answer_tail
+            yield {
+                **data,
+                "response": answer_delta,
+                "thinking": think_delta if reasoning else "",
+            }
+
+    def _generate_capped(self, payload: Dict, budget: int, timeout: int, hedge: bool,
+                         queue_deadline: Optional[float]) -> Dict:
+        parser = ThinkStreamParser()
+        thinking_chars = 0
+        answered = False
+        capped = False
+        final: Dict = {}
+
+        stream = self.gateway.stream(self._with_think(payload, True), timeout, queue_deadline)
+        try:
+            for data in stream:
+                if data.get("thinking"):
+                    parser.feed_thinking(data["thinking"])
+                    thinking_chars += len(data["thinking"])
+                think_delta, answer_delta = parser.feed(data.get("response", ""))
+                thinking_chars += len(think_delta)
+                answered = answered or bool(answer_delta.strip())
+                if data.get("done"):
+                    final = data
+                    break
+                # Misma estimación que estimate_tokens (~4 caracteres por token)
+                if not answered and thinking_chars // 4 > budget:
+                    capped = True
+                    break
+        finally:
+            # Cerrar el stream corta la conexión y Ollama deja de generar
+            stream.close()
+
+        thinking, answer = parser.finish()
+        if final:
+            return {**final, "response": answer, "thinking": thinking}
+        if not capped:
+            # Conexión cortada o error del servidor antes de `done`: no es un recorte
+            raise requests.exceptions.ConnectionError("El stream de Ollama terminó sin respuesta final")
+
+        self._count("capped")
+        logger.info(f"[REASONING] Razonamiento recortado a ~{budget} tokens; respuesta sin pensar")
+        # Misma fecha límite de cola que la petición original
+        result = self.gateway.generate(self._with_think(payload, False), timeout=timeout,
+                                       hedge=hedge, queue_deadline=queue_deadline)
+        _, answer = split_reasoning(result.get("response", ""))
+        return {**result, "response": answer, "thinking": f"{thinking} […]", "thinking_capped": True}
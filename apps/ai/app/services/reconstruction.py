@@ -1,50 +1,229 @@
-from typing import Optional
-from datetime import datetime, timedelta
-import random
+from typing import Dict, List, Optional
+from datetime import datetime
 import logging
+import re
 
-from app.models.capsule import CapsuleReconstruction, ReconstructedEvent
+from app.models.capsule import CapsuleData, CapsuleReconstruction, DayEvent, ReconstructedEvent
+from app.services.prompts import base_language
 
 logger = logging.getLogger(__name__)
 
+_WORD = re.compile(r"\w+")
+
+
+def _words(text: Optional[str]) -> set:
+    """Palabras completas en minúsculas ("bar" no coincide con "barber")"""
+    return set(_WORD.findall((text or "").lower()))
+
+
+# Palabras clave por categoría (es/en) para clasificar eventos sin modelo
+_CATEGORY_KEYWORDS = {
+    "work": ["reunión", "trabajo", "oficina", "proyecto", "cliente", "llamada", "informe",
+             "meeting", "work", "office", "project", "client", "call", "report"],
+    "social": ["amigo", "amiga", "familia", "cena", "fiesta", "café", "boda", "cumpleaños",
+               "friend", "family", "dinner", "party", "coffee", "wedding", "birthday"],
+    "personal": ["ejercicio", "gimnasio", "correr", "meditación", "médico", "casa", "paseo",
+                 "exercise", "gym", "run", "meditation", "doctor", "home", "walk"],
+    "entertainment": ["película", "cine", "serie", "concierto", "juego", "música",
+                      "movie", "cinema", "series", "concert", "game", "music"],
+    "learning": ["curso", "clase", "lectura", "libro", "estudio", "podcast", "tutorial",
+                 "course", "class", "reading", "book", "study"],
+}
+
+# Estado de ánimo a partir de las notas del usuario
+_MOOD_KEYWORDS = [
+    ("happy", ["feliz", "alegre", "contento", "genial", "happy", "great", "excited"]),
+    ("calm", ["tranquilo", "calma", "reflexivo", "calm", "peaceful", "thoughtful"]),
+    ("productive", ["productivo", "motivado", "logré", "productive", "motivated"]),
+    ("tired", ["cansado", "agotado", "tired", "exhausted"]),
+    ("sad", ["triste", "nostalgia", "nostálgico", "sad", "nostalgic"]),
+    ("stressed", ["estrés", "estresado", "ansioso", "nervioso", "stressed", "anxious"]),
+]
+
+_PHRASES = {
+    "es": {
+        "summary": "El {date} registraste {count} momentos{span}. {mood_sentence}",
+        "span": " entre las {first} y las {last}",
+        "mood_sentence": "Tu estado de ánimo general fue {mood}.",
+        "highlight_event": "{description} a las {time}",
+        "balance": "Tu día combinó {parts}.",
+        "peak": "El momento de mayor intensidad fue «{description}» a las {time}.",
+        "place": "Pasaste buena parte del día en {location}.",
+        "memories": "Guardaste {count} recuerdos clave de este día.",
+        "and": " y ",
+        "no_mood": "sin notas de ánimo",
+        "moods": {
+            "happy": "Feliz y energético", "calm": "Reflexivo y tranquilo",
+            "productive": "Motivado y productivo", "tired": "Cansado pero satisfecho",
+            "sad": "Triste y nostálgico", "stressed": "Estresado e inquieto",
+        },
+        "categories": {
+            "work": "trabajo", "social": "momentos sociales", "personal": "tiempo personal",
+            "entertainment": "ocio", "learning": "aprendizaje",
+        },
+    },
+    "en": {
+        "summary": "On {date} you logged {count} moments{span}. {mood_sentence}",
+        "span": " between {first} and {last}",
+        "mood_sentence": "Your overall mood was {mood}.",
+        "highlight_event": "{description} at {time}",
+        "balance": "Your day combined {parts}.",
+        "peak": "The most intense moment was \"{description}\" at {time}.",
+        "place": "You spent much of the day at {location}.",
+        "memories": "You kept {count} key memories from this day.",
+        "and": " and ",
+        "no_mood": "without mood notes",
+        "moods": {
+            "happy": "Happy and energetic", "calm": "Calm and reflective",
+            "productive": "Motivated and productive", "tired": "Tired but satisfied",
+            "sad": "Sad and nostalgic", "stressed": "Stressed and restless",
+        },
+        "categories": {
+            "work": "work", "social": "social moments", "personal": "personal time",
+            "entertainment": "leisure", "learning": "learning",
+        },
+    },
+}
+
+
 class ReconstructionService:
     """
-    Servicio para reconstruir días del pasado usando IA.
-    
-    NOTA: Esta es una implementación de ejemplo/demo.
-    En producción, aquí integrarías con:
-    - OpenAI GPT para análisis de lenguaje natural
-    - APIs de redes sociales para obtener posts del día
-    - Google Calendar API para eventos
-    - APIs de clima histórico
-    - Fotos y ubicaciones del día
+    Reconstrucción determinista de un día, sin modelo de lenguaje.
+
+    Construye eventos, momentos destacados, estado de ánimo e insights solo
+    a partir de los datos enviados, en milisegundos y siempre con el mismo
+    resultado para la misma cápsula. Es el motor del modo degradado cuando
+    Ollama está saturado o caído. El clima no se inventa: queda en None.
     """
-    
-    def __init__(self):
-        self.moods = [
-            "Feliz y energético",
-            "Reflexivo y tranquilo",
-            "Motivado y productivo",
-            "Relajado y social",
-            "Nostálgico y pensativo"
-        ]
-        
-        self.weather_conditions = [
-            "Soleado ☀️",
-            "Nublado ☁️",
-            "Lluvioso 🌧️",
-            "Parcialmente nublado ⛅",
-            "Despejado 🌤️"
-        ]
-        
-        self.event_categories = {
-            "work": ["Reunión importante", "Proyecto completado", "Llamada de trabajo"],
-            "personal": ["Ejercicio matutino", "Lectura", "Meditación"],
-            "social": ["Café con amigos", "Cena familiar", "Videollamada"],
-            "entertainment": ["Película", "Serie", "Videojuegos"],
-            "learning": ["Curso online", "Tutorial", "Podcast educativo"]
+
+    # ==================== DESDE UNA CÁPSULA ====================
+
+    def reconstruct_capsule(self, capsule: CapsuleData, language: Optional[str] = "es") -> CapsuleReconstruction:
+        """
+        Reconstruye el día a partir de los eventos y notas de la cápsula.
+
+        Args:
+            capsule: Datos de la cápsula
+            language: Idioma del texto (es/en)
+
+        Returns:
+            CapsuleReconstruction: Reconstrucción sin IA
+        """
+        phrases = _PHRASES.get(base_language(language), _PHRASES["es"])
+        ordered = sorted(capsule.events, key=lambda e: self._minutes(e.time))
+        events = [self._to_event(e) for e in ordered]
+        mood = self._mood(capsule.mood_notes, phrases)
+
+        return CapsuleReconstruction(
+            summary=self._summary(capsule.date, events, mood, phrases),
+            highlights=self._highlights(capsule, ordered, phrases),
+            mood=mood,
+            weather=None,
+            events=events,
+            ai_insights=" ".join(self._insights(capsule, ordered, events, phrases))
+        )
+
+    @staticmethod
+    def _minutes(time: str) -> int:
+        try:
+            hours, minutes = time.strip().split(":")[:2]
+            return int(hours) * 60 + int(minutes)
+        except ValueError:
+            return 24 * 60
+
+    @staticmethod
+    def _category(description: str) -> str:
+        text = _words(description)
+        scores = {
+            category: sum(1 for word in words if word in text)
+            for category, words in _CATEGORY_KEYWORDS.items()
         }
-    
+        best = max(scores, key=scores.get)
+        return best if scores[best] > 0 else "personal"
+
+    @staticmethod
+    def _importance(event: DayEvent) -> int:
+        # emotional_intensity viene en escala 1-10
+        if event.emotional_intensity is None:
+            return 3
+        return min(5, max(1, round(event.emotional_intensity / 2)))
+
+    def _to_event(self, event: DayEvent) -> ReconstructedEvent:
+        description = event.description
+        if event.location:
+            description = f"{description} ({event.location})"
+        return ReconstructedEvent(
+            time=event.time,
+            description=description,
+            category=self._category(event.description),
+            importance=self._importance(event)
+        )
+
+    @staticmethod
+    def _mood(notes: str, phrases: Dict) -> str:
+        text = _words(notes)
+        for mood, words in _MOOD_KEYWORDS:
+            if any(word in text for word in words):
+                return phrases["moods"][mood]
+        return notes.strip() if notes and notes.strip() else phrases["no_mood"]
+
+    @staticmethod
+    def _summary(date: str, events: List[ReconstructedEvent], mood: str, phrases: Dict) -> str:
+        span = ""
+        if events:
+            span = phrases["span"].format(first=events[0].time, last=events[-1].time)
+        return phrases["summary"].format(
+            date=date,
+            count=len(events),
+            span=span,
+            mood_sentence=phrases["mood_sentence"].format(mood=mood.lower())
+        )
+
+    def _highlights(self, capsule: CapsuleData, ordered: List[DayEvent], phrases: Dict) -> List[str]:
+        highlights = [m for m in capsule.key_memories if m.strip()][:3]
+        # Eventos más intensos; a igualdad, el más temprano
+        intense = sorted(ordered, key=lambda e: -(e.emotional_intensity or 0))
+        for event in intense:
+            if len(highlights) >= 5:
+                break
+            highlights.append(phrases["highlight_event"].format(
+                description=event.description, time=event.time
+            ))
+        return highlights
+
+    def _insights(self, capsule: CapsuleData, ordered: List[DayEvent],
+                  events: List[ReconstructedEvent], phrases: Dict) -> List[str]:
+        insights = []
+
+        counts: Dict[str, int] = {}
+        for event in events:
+            counts[event.category] = counts.get(event.category, 0) + 1
+        if counts:
+            top = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:3]
+            parts = [f"{phrases['categories'][category]} ({count})" for category, count in top]
+            joined = ", ".join(parts[:-1]) + phrases["and"] + parts[-1] if len(parts) > 1 else parts[0]
+            insights.append(phrases["balance"].format(parts=joined))
+
+        rated = [e for e in ordered if e.emotional_intensity is not None]
+        if rated:
+            peak = max(rated, key=lambda e: e.emotional_intensity)
+            insights.append(phrases["peak"].format(description=peak.description, time=peak.time))
+
+        locations: Dict[str, int] = {}
+        for event in ordered:
+            if event.location:
+                locations[event.location] = locations.get(event.location, 0) + 1
+        if locations:
+            place = max(sorted(locations), key=locations.get)
+            insights.append(phrases["place"].format(location=place))
+
+        if capsule.key_memories:
+            insights.append(phrases["memories"].format(count=len(capsule.key_memories)))
+
+        return insights
+
+    # ==================== DESDE UN TÍTULO ====================
+
     async def reconstruct_day(
         self,
         date: str,
@@ -52,128 +231,35 @@ class ReconstructionService:
         description: Optional[str] = None
     ) -> CapsuleReconstruction:
         """
-        Reconstruir un día del pasado.
-        
+        Reconstruir un día del pasado solo con título y descripción.
+
         Args:
             date: Fecha en formato YYYY-MM-DD
             title: Título de la cápsula
             description: Descripción opcional
-            
+
         Returns:
             CapsuleReconstruction: Reconstrucción completa del día
         """
         logger.info(f"Starting reconstruction for {date}: {title}")
-        
+
         # Validar fecha
         try:
             target_date = datetime.strptime(date, "%Y-%m-%d")
         except ValueError:
             raise ValueError("Formato de fecha inválido. Usa YYYY-MM-DD")
-        
+
         # Verificar que no sea una fecha futura
         if target_date > datetime.now():
             raise ValueError("No se puede reconstruir una fecha futura")
-        
-        # Generar reconstrucción
-        # NOTA: Aquí es donde integrarías con GPT, APIs, etc.
-        events = self._generate_events(target_date, description)
-        highlights = self._generate_highlights(events, title)
-        mood = random.choice(self.moods)
-        weather = random.choice(self.weather_conditions)
-        summary = self._generate_summary(date, title, mood, len(events))
-        ai_insights = self._generate_insights(events, mood)
-        
-        reconstruction = CapsuleReconstruction(
-            summary=summary,
-            highlights=highlights,
-            mood=mood,
-            weather=weather,
-            events=events,
-            ai_insights=ai_insights
+
+        capsule = CapsuleData(
+            date=date,
+            events=[DayEvent(time="09:00", description=f"{title}: {description}" if description else title)],
+            mood_notes=description or "",
+            key_memories=[title]
         )
-        
+        reconstruction = self.reconstruct_capsule(capsule)
+
         logger.info(f"Successfully reconstructed day: {date}")
         return reconstruction
-    
-    def _generate_events(
-        self,
-        date: datetime,
-        description: Optional[str]
-    ) -> list[ReconstructedEvent]:
-        """Generar eventos del día (DEMO - reemplazar con IA real)"""
-        events = []
-        
-        # Generar 4-8 eventos del día
-        num_events = random.randint(4, 8)
-        start_hour = 8
-        
-        for i in range(num_events):
-            hour = start_hour + (i * 2)
-            minute = random.choice([0, 15, 30, 45])
-            time = f"{hour:02d}:{minute:02d}"
-            
-            category = random.choice(list(self.event_categories.keys()))
-            event_desc = random.choice(self.event_categories[category])
-            
-            # Si hay descripción, incorporarla en el primer evento
-            if i == 0 and description:
-                event_desc = f"{event_desc}: {description}"
-            
-            events.append(ReconstructedEvent(
-                time=time,
-                description=event_desc,
-                category=category,
-                importance=random.randint(2, 5)
-            ))
-        
-        return events
-    
-    def _generate_highlights(
-        self,
-        events: list[ReconstructedEvent],
-        title: str
-    ) -> list[str]:
-        """Generar momentos destacados"""
-        # Tomar los eventos más importantes
-        important_events = sorted(events, key=lambda e: e.importance, reverse=True)[:3]
-        
-        highlights = [f"{title} - Un día memorable"]
-        highlights.extend([
-            f"{event.description} a las {event.time}"
-            for event in important_events
-        ])
-        
-        return highlights
-    
-    def _generate_summary(
-        self,
-        date: str,
-        title: str,
-        mood: str,
-        num_events: int
-    ) -> str:
-        """Generar resumen del día"""
-        return (
-            f"El {date} fue un día especial marcado por '{title}'. "
-            f"Tu estado de ánimo general fue {mood.lower()}, "
-            f"y registramos {num_events} eventos significativos a lo largo del día. "
-            f"Fue un día lleno de actividades y momentos memorables."
-        )
-    
-    def _generate_insights(
-        self,
-        events: list[ReconstructedEvent],
-        mood: str
-    ) -> str:
-        """Generar insights de IA"""
-        work_events = len([e for e in events if e.category == "work"])
-        social_events = len([e for e in events if e.category == "social"])
-        
-        insights = [
-            f"Tu día estuvo equilibrado con {work_events} eventos de trabajo "
-            f"y {social_events} momentos sociales.",
-            f"El estado de ánimo '{mood}' sugiere que fue un día positivo y productivo.",
-            "Los eventos de mayor importancia ocurrieron durante las horas centrales del día."
-        ]
-        
-        return " ".join(insights)
@@ -0,0 +1,252 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Set, Tuple
+import math
+import re
+import threading
+import logging
+
+import numpy as np
+
+from app.models.capsule import CapsuleData
+from app.services.llm_gateway import LLMGateway
+from app.services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Palabras vacías frecuentes (es/en) que no aportan a la búsqueda
+_STOPWORDS = {
+    "para", "pero", "como", "este", "esta", "estos", "estas", "todo", "toda", "muy",
+    "with", "that", "this", "from", "have", "were", "what", "when", "there", "their",
+    "about", "después", "antes", "cuando", "donde", "sobre", "entre", "hasta", "desde",
+}
+
+
+def _terms(capsule: CapsuleData) -> Set[str]:
+    """Ubicaciones completas (`loc:`) y palabras de memorias y eventos"""
+    terms = {f"loc:{e.location.strip().lower()}" for e in capsule.events if e.location}
+    text = " ".join([*capsule.key_memories, *(e.description for e in capsule.events)])
+    terms.update(
+        w for w in _WORD.findall(text.lower())
+        if len(w) >= 4 and w not in _STOPWORDS and not w.isdigit()
+    )
+    return terms
+
+
+def _memory_text(capsule: CapsuleData) -> str:
+    return "\n".join([*capsule.key_memories, capsule.mood_notes or ""]).strip()
+
+
+class _Day:
+    """Resumen compacto de un día indexado"""
+
+    def __init__(self, scope: str, capsule: CapsuleData, terms: Set[str]):
+        self.scope = scope
+        self.date = capsule.date
+        self.memories = [m for m in capsule.key_memories if m.strip()]
+        self.locations = sorted({e.location for e in capsule.events if e.location})
+        self.terms = terms
+        self.slot: Optional[int] = None
+
+    def snippet(self, max_chars: int = 200) -> str:
+        places = f" [{', '.join(self.locations[:3])}]" if self.locations else ""
+        text = f"- {self.date}{places}: {'; '.join(self.memories)}"
+        return text if len(text) <= max_chars else text[:max_chars - 1] + "…"
+
+
+class RelatedDaysIndex:
+    """
+    Índice local de días pasados para "este día el año pasado" y días parecidos.
+
+    Combina un índice invertido (ubicaciones y palabras clave, ponderadas por
+    IDF) con un índice vectorial sobre los embeddings de las memorias clave.
+    Las inserciones son incrementales y las consultas no llaman al LLM salvo
+    para el embedding de la consulta; el resultado se entrega como fragmentos
+    compactos para el prompt en lugar del historial completo.
+
+    Con `use_embeddings=False` (el modelo de embeddings no cabe cargado
+    junto al principal) solo se usan las palabras clave: cada embedding
+    tras una reconstrucción costaría dos cambios de modelo en Ollama.
+    """
+
+    # Peso del componente vectorial frente al de palabras clave
+    VECTOR_WEIGHT = 0.5
+    # Resultados "este día en otro año" que se anteponen a los demás
+    ON_THIS_DAY_SLOTS = 1
+
+    def __init__(
+        self,
+        gateway: Optional[LLMGateway],
+        model: str,
+        max_days: int = 50000,
+        timeout: int = 10,
+        use_embeddings: bool = True
+    ):
+        self.gateway = gateway
+        self.model = model
+        self.use_embeddings = use_embeddings
+        self.max_days = max_days
+        self.timeout = timeout
+        self.vectors = VectorIndex(max_entries=max_days + 1)
+
+        self._lock = threading.Lock()
+        self._days: "OrderedDict[Tuple[str, str], _Day]" = OrderedDict()
+        self._postings: Dict[Tuple[str, str], Set[str]] = {}
+        self._by_month_day: Dict[Tuple[str, str], Set[str]] = {}
+        self._scope_days: Dict[str, int] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.embed_errors = 0
+
+    def __len__(self) -> int:
+        return len(self._days)
+
+    # ==================== INSERCIÓN ====================
+
+    def _embed(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        if self.gateway is None or not self.use_embeddings or not any(texts):
+            return [None] * len(texts)
+        try:
+            vectors = self.gateway.embed(self.model, [t or " " for t in texts], timeout=self.timeout)
+        except Exception as e:
+            with self._lock:
+                self.embed_errors += 1
+            logger.warning(f"[RELATED] Sin embeddings, solo palabras clave: {e}")
+            return [None] * len(texts)
+        return [np.asarray(v, dtype=np.float32) if t else None for v, t in zip(vectors, texts)]
+
+    def _unindex(self, day: _Day):
+        key = (day.scope, day.date)
+        for term in day.terms:
+            posting = self._postings.get((day.scope, term))
+            if posting is not None:
+                posting.discard(day.date)
+                if not posting:
+                    del self._postings[(day.scope, term)]
+        self._by_month_day.get((day.scope, day.date[5:10]), set()).discard(day.date)
+        if day.slot is not None:
+            self.vectors.remove(day.slot)
+        self._days.pop(key, None)
+        self._scope_days[day.scope] -= 1
+
+    def add_many(self, capsules: List[CapsuleData], user_id: Optional[str] = None,
+                 batch_size: int = 32) -> int:
+        """Indexa (o reemplaza) varios días; los embeddings se piden por lotes"""
+        scope = user_id or ""
+        for start in range(0, len(capsules), batch_size):
+            batch = capsules[start:start + batch_size]
+            vectors = self._embed([_memory_text(c) for c in batch])
+            for capsule, vector in zip(batch, vectors):
+                day = _Day(scope, capsule, _terms(capsule))
+                with self._lock:
+                    previous = self._days.get((scope, day.date))
+                    if previous is not None:
+                        self._unindex(previous)
+                    while len(self._days) >= self.max_days:
+                        self._unindex(next(iter(self._days.values())))
+                    if vector is not None:
+                        day.slot = self.vectors.add(vector, day, scope=scope)
+                    self._days[(scope, day.date)] = day
+                    self._scope_days[scope] = self._scope_days.get(scope, 0) + 1
+                    for term in day.terms:
+                        self._postings.setdefault((scope, term), set()).add(day.date)
+                    self._by_month_day.setdefault((scope, day.date[5:10]), set()).add(day.date)
+        return len(capsules)
+
+    def add(self, capsule: CapsuleData, user_id: Optional[str] = None):
+        self.add_many([capsule], user_id)
+
+    def add_async(self, capsule: CapsuleData, user_id: Optional[str] = None):
+        """Indexa en segundo plano para no sumar el embedding a la respuesta"""
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="related-index")
+        self._executor.submit(self.add, capsule, user_id)
+
+    # ==================== CONSULTA ====================
+
+    def query(self, capsule: CapsuleData, user_id: Optional[str] = None,
+              k: int = 5) -> List[Dict]:
+        """
+        Días más relacionados con la cápsula (excluido el propio día).
+
+        Returns:
+            Lista de {date, score, shared, on_this_day, snippet}
+        """
+        scope = user_id or ""
+        terms = _terms(capsule)
+        vector = self._embed([_memory_text(capsule)])[0]
+
+        vector_scores: Dict[str, float] = {}
+        if vector is not None:
+            for day, score in self.vectors.search(vector, scope=scope, k=k * 4):
+                vector_scores[day.date] = max(0.0, score)
+
+        with self._lock:
+            total = max(1, self._scope_days.get(scope, 0))
+            keyword_scores: Dict[str, float] = {}
+            shared: Dict[str, List[str]] = {}
+            weight_sum = 0.0
+            for term in terms:
+                posting = self._postings.get((scope, term))
+                if not posting:
+                    continue
+                idf = math.log(1 + total / len(posting))
+                weight_sum += idf
+                for date in posting:
+                    keyword_scores[date] = keyword_scores.get(date, 0.0) + idf
+                    shared.setdefault(date, []).append(term)
+            on_this_day = {
+                d for d in self._by_month_day.get((scope, capsule.date[5:10]), set())
+                if d != capsule.date
+            }
+
+            candidates = (set(keyword_scores) | set(vector_scores) | on_this_day) - {capsule.date}
+            results = []
+            for date in candidates:
+                day = self._days.get((scope, date))
+                if day is None:
+                    continue
+                keyword = keyword_scores.get(date, 0.0) / weight_sum if weight_sum else 0.0
+                if vector is not None:
+                    score = self.VECTOR_WEIGHT * vector_scores.get(date, 0.0) \
+                        + (1 - self.VECTOR_WEIGHT) * keyword
+                else:
+                    score = keyword
+                results.append({
+                    "date": date,
+                    "score": round(score, 4),
+                    "shared": sorted(shared.get(date, []))[:8],
+                    "on_this_day": date in on_this_day,
+                    "snippet": day.snippet(),
+                })
+
+        # El mismo día del año anterior más reciente va primero; el resto, por puntuación
+        this_day = sorted([r for r in results if r["on_this_day"]], key=lambda r: r["date"], reverse=True)
+        first = this_day[:self.ON_THIS_DAY_SLOTS]
+        # A igual puntuación, los días más recientes antes
+        others = sorted([r for r in results if r not in first], key=lambda r: r["date"], reverse=True)
+        others.sort(key=lambda r: -r["score"])
+        return (first + others)[:k]
+
+    @staticmethod
+    def snippets(results: List[Dict], max_chars: int = 800) -> str:
+        """Contexto compacto para el prompt, limitado a `max_chars`"""
+        lines, used = [], 0
+        for result in results:
+            if used + len(result["snippet"]) > max_chars:
+                break
+            lines.append(result["snippet"])
+            used += len(result["snippet"]) + 1
+        return "\n".join(lines)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "days": len(self._days),
+                "max_days": self.max_days,
+                "terms": len(self._postings),
+                "embeddings": self.use_embeddings and self.gateway is not None,
+                "embed_errors": self.embed_errors,
+                "vectors": self.vectors.stats(),
+            }
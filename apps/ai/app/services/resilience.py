@@ -0,0 +1,268 @@
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Deque, Dict, Iterator, Optional, Tuple
+import random
+import subprocess
+import threading
+import time
+import logging
+
+import requests
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpen(Exception):
+    """El backend está marcado como caído: se falla sin llamarlo"""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} no disponible temporalmente (circuito abierto)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_transient(error: BaseException) -> bool:
+    """Errores del backend (no de la petición): conexión, timeout, 5xx y 429"""
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError) and error.response is not None:
+        return error.response.status_code >= 500 or error.response.status_code == 429
+    return False
+
+
+class CircuitBreaker:
+    """
+    Circuito por backend con ventanas deslizantes de errores y latencia.
+
+    - closed: se registran resultado y duración de cada llamada en los
+      últimos `window` segundos. Con al menos `min_calls`, si la tasa de
+      fallos supera `error_rate` o la de llamadas lentas (> `slow_call`
+      segundos) supera `slow_rate`, el circuito se abre.
+    - open: las llamadas fallan al instante con `CircuitOpen` durante
+      `open_seconds`, sin ocupar workers esperando un timeout.
+    - half_open: se deja pasar una llamada de prueba; si va bien se cierra,
+      si falla vuelve a abrirse.
+
+    `failure` decide qué excepciones cuentan como fallo del backend; los
+    errores de la petición (4xx, respuesta inválida) no abren el circuito.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: float = 60.0,
+        min_calls: int = 5,
+        error_rate: float = 0.5,
+        slow_call: Optional[float] = None,
+        slow_rate: float = 0.8,
+        open_seconds: float = 30.0,
+        failure: Callable[[BaseException], bool] = is_transient
+    ):
+        self.name = name
+        self.window = window
+        self.min_calls = max(1, min_calls)
+        self.error_rate = error_rate
+        # 0 o None: solo los errores abren el circuito
+        self.slow_call = slow_call or None
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.failure = failure
+
+        self._lock = threading.Lock()
+        # (instante, fallo, duración)
+        self._calls: Deque[Tuple[float, bool, float]] = deque()
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self.opened = 0
+        self.rejected = 0
+        self.last_error: Optional[str] = None
+        self.last_change: Optional[float] = None
+
+    def _trim(self, now: float):
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _transition(self, state: str, reason: str = ""):
+        if state == self.state:
+            return
+        log = logger.warning if state == "open" else logger.info
+        log(f"[BREAKER] {self.name}: {self.state} -> {state}{f' ({reason})' if reason else ''}")
+        self.state = state
+        self.last_change = time.time()
+        if state == "open":
+            self.opened += 1
+            self._opened_at = time.monotonic()
+        elif state == "closed":
+            self._calls.clear()
+
+    @property
+    def rejecting(self) -> bool:
+        """Abierto y aún dentro de `open_seconds` (sin consumir la llamada de prueba)"""
+        return self.state == "open" and time.monotonic() < self._opened_at + self.open_seconds
+
+    def allow(self):
+        """Lanza `CircuitOpen` si no se puede llamar al backend ahora"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self._opened_at + self.open_seconds - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self._transition("half_open")
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+            self.rejected += 1
+            raise CircuitOpen(self.name, max(1.0, remaining))
+
+    def record(self, failed: bool, duration: float, error: Optional[BaseException] = None):
+        now = time.monotonic()
+        with self._lock:
+            if failed:
+                self.last_error = f"{type(error).__name__}: {error}" if error else "error"
+            if self.state == "half_open":
+                self._probe_in_flight = False
+                if failed:
+                    self._transition("open", "falló la llamada de prueba")
+                else:
+                    self._transition("closed")
+                return
+            if self.state == "open":
+                # Llamada que empezó antes de abrirse el circuito
+                return
+
+            self._calls.append((now, failed, duration))
+            self._trim(now)
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+            failures = sum(1 for _, f, _ in self._calls if f)
+            if failures / total >= self.error_rate:
+                self._transition("open", f"{failures}/{total} fallos")
+            elif self.slow_call is not None:
+                slow = sum(1 for _, _, d in self._calls if d > self.slow_call)
+                if slow / total >= self.slow_rate:
+                    self._transition("open", f"{slow}/{total} llamadas de más de {self.slow_call:g}s")
+
+    def release(self):
+        """Libera la llamada de prueba sin resultado (p. ej. cancelada por el cliente)"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    @contextmanager
+    def protect(self, check: bool = True) -> Iterator[None]:
+        """
+        `allow` + `record` alrededor de una llamada. Con `check=False` solo
+        mide (el `allow` ya se hizo antes, p. ej. antes de esperar en cola).
+        """
+        if check:
+            self.allow()
+        start = time.monotonic()
+        try:
+            yield
+        except BaseException as e:
+            if isinstance(e, Exception):
+                self.record(self.failure(e), time.monotonic() - start, e)
+            else:
+                self.release()
+            raise
+        self.record(False, time.monotonic() - start)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            self._trim(time.monotonic())
+            durations = sorted(d for _, _, d in self._calls)
+            failures = sum(1 for _, f, _ in self._calls if f)
+            retry_after = None
+            if self.state == "open":
+                retry_after = round(max(0.0, self._opened_at + self.open_seconds - time.monotonic()), 1)
+            return {
+                "state": self.state,
+                "calls": len(durations),
+                "error_rate": round(failures / len(durations), 3) if durations else None,
+                "p50_seconds": round(durations[len(durations) // 2], 3) if durations else None,
+                "p95_seconds": round(durations[int(len(durations) * 0.95)], 3) if durations else None,
+                "slow_call_seconds": self.slow_call,
+                "retry_after_seconds": retry_after,
+                "times_opened": self.opened,
+                "rejected": self.rejected,
+                "last_error": self.last_error,
+                "last_change": self.last_change,
+            }
+
+
+def retry_call(
+    fn: Callable[[float], object],
+    deadline: float,
+    attempts: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 8.0,
+    retry_on: Callable[[BaseException], bool] = is_transient,
+    label: str = "llamada"
+):
+    """
+    Reintenta una llamada idempotente con backoff exponencial y jitter
+    completo, sin pasarse del presupuesto total `deadline` (segundos).
+
+    `fn` recibe el tiempo que le queda del presupuesto, para usarlo como
+    timeout del intento. `CircuitOpen` no se reintenta.
+    """
+    end = time.monotonic() + deadline
+    for attempt in range(1, attempts + 1):
+        remaining = end - time.monotonic()
+        try:
+            return fn(remaining)
+        except CircuitOpen:
+            raise
+        except Exception as e:
+            if attempt == attempts or not retry_on(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+            # Sin margen para otro intento útil tras la espera
+            if end - time.monotonic() - delay < 1.0:
+                raise
+            logger.warning(f"[RETRY] {label}: intento {attempt}/{attempts} falló ({e}); reintento en {delay:.1f}s")
+            time.sleep(delay)
+
+
+class BreakerRegistry:
+    """Circuitos de los backends del servicio"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def register(self, name: str, **kwargs) -> CircuitBreaker:
+        options = {
+            "window": settings.breaker_window_seconds,
+            "min_calls": settings.breaker_min_calls,
+            "error_rate": settings.breaker_error_rate,
+            "slow_rate": settings.breaker_slow_rate,
+            "open_seconds": settings.breaker_open_seconds,
+            **kwargs,
+        }
+        self._breakers[name] = CircuitBreaker(name, **options)
+        return self._breakers[name]
+
+    def get(self, name: str) -> CircuitBreaker:
+        return self._breakers[name]
+
+    def open_names(self):
+        return [name for name, b in self._breakers.items() if b.state != "closed"]
+
+    def snapshot(self) -> Dict:
+        return {name: b.snapshot() for name, b in self._breakers.items()}
+
+
+def _piper_failure(error: BaseException) -> bool:
+    # RuntimeError = piper salió con error; OSError = binario ausente o roto
+    return isinstance(error, (RuntimeError, OSError, subprocess.TimeoutExpired))
+
+
+breakers = BreakerRegistry()
+ollama_breaker = breakers.register("ollama", slow_call=settings.ollama_slow_call_seconds)
+sd_breaker = breakers.register("stable_diffusion", slow_call=settings.sd_slow_call_seconds)
+piper_breaker = breakers.register(
+    "piper", slow_call=settings.piper_slow_call_seconds, failure=_piper_failure
+)
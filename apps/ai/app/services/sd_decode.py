@@ -0,0 +1,83 @@
+from pathlib import Path
+from typing import BinaryIO, Iterable
+import binascii
+import os
+import re
+import logging
+
+from app.services.lazy_modules import lazy_modules
+
+logger = logging.getLogger(__name__)
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+# Inicio de la primera imagen en la respuesta de txt2img
+_IMAGES_KEY = re.compile(rb'"images"\s*:\s*\[\s*"')
+# Lo que se retiene mientras se busca la clave (por si llega partida)
+_KEY_TAIL = 256
+
+
+def write_first_image(chunks: Iterable[bytes], out: BinaryIO) -> int:
+    """
+    Decodifica la primera imagen de una respuesta JSON de txt2img según llega.
+
+    No carga el JSON ni el base64 completos: busca `"images": ["` en el
+    stream y decodifica el base64 por bloques múltiplo de 4 directamente en
+    `out` hasta la comilla de cierre. El resto de la respuesta (parameters,
+    info) no se lee.
+
+    Returns:
+        Bytes escritos
+    """
+    pending = b""
+    carry = b""
+    written = 0
+    inside = False
+    for chunk in chunks:
+        if not inside:
+            pending += chunk
+            match = _IMAGES_KEY.search(pending)
+            if match is None:
+                pending = pending[-_KEY_TAIL:]
+                continue
+            inside = True
+            chunk = pending[match.end():]
+            pending = b""
+
+        end = chunk.find(b'"')
+        # El base64 no contiene '\'; así se descartan escapes como "\/"
+        data = carry + (chunk if end < 0 else chunk[:end]).replace(b"\\", b"")
+        usable = len(data) if end >= 0 else len(data) - len(data) % 4
+        if usable:
+            written += out.write(binascii.a2b_base64(data[:usable]))
+        carry = data[usable:]
+        if end >= 0:
+            return written
+
+    raise ValueError("No images in response")
+
+
+def save_streamed_image(chunks: Iterable[bytes], destination: Path) -> Path:
+    """
+    Guarda la primera imagen de la respuesta de txt2img como PNG.
+
+    Si SD ya la entrega en PNG (lo habitual) el archivo decodificado se usa
+    tal cual; solo otros formatos pasan por PIL para convertirse.
+    """
+    destination = Path(destination)
+    tmp = destination.with_suffix(".part")
+    try:
+        with open(tmp, "wb") as out:
+            write_first_image(chunks, out)
+        with open(tmp, "rb") as f:
+            header = f.read(len(PNG_SIGNATURE))
+        if header == PNG_SIGNATURE:
+            os.replace(tmp, destination)
+        else:
+            with lazy_modules.get("PIL").open(tmp) as img:
+                logger.info(f"[SD] Imagen en {img.format}, convirtiendo a PNG")
+                img.save(destination, format="PNG")
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return destination
@@ -0,0 +1,137 @@
+from typing import Dict, Optional, Tuple
+import json
+import re
+import threading
+import logging
+
+import numpy as np
+
+from app.models.capsule import CapsuleData, ReconstructionRequest, ReconstructionResponse
+from app.services.cache import hash_key
+from app.services.llm_gateway import LLMGateway
+from app.services.vector_index import VectorIndex
+
+logger = logging.getLogger(__name__)
+
+_SPACES = re.compile(r"\s+")
+
+
+class SemanticCache:
+    """
+    Caché de reconstrucciones por similitud semántica.
+
+    Los días de rutina cambian poco de una cápsula a otra y nunca aciertan en
+    la caché exacta. Aquí la cápsula normalizada (sin fecha) se convierte en
+    un embedding con Ollama y se busca la reconstrucción previa más parecida
+    del mismo ámbito (usuario + opciones que cambian el resultado). Por
+    encima de `threshold` se reutiliza, cambiando solo la fecha.
+    """
+
+    def __init__(
+        self,
+        gateway: LLMGateway,
+        model: str,
+        index: VectorIndex,
+        threshold: float = 0.95,
+        timeout: int = 10
+    ):
+        self.gateway = gateway
+        self.model = model
+        self.index = index
+        self.threshold = threshold
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "skipped": 0, "embed_errors": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def normalize(capsule: CapsuleData) -> str:
+        """Texto estable de la cápsula: sin fecha, eventos ordenados, espacios colapsados"""
+        def clean(text: Optional[str]) -> str:
+            return _SPACES.sub(" ", (text or "").lower()).strip()
+
+        lines = [
+            f"{e.time.strip()} {clean(e.description)}" + (f" @ {clean(e.location)}" if e.location else "")
+            for e in sorted(capsule.events, key=lambda e: e.time.strip())
+        ]
+        lines.append(f"mood: {clean(capsule.mood_notes)}")
+        lines.extend(f"memory: {clean(m)}" for m in capsule.key_memories)
+        return "\n".join(lines)
+
+    @staticmethod
+    def scope(request: ReconstructionRequest) -> str:
+        """Solo se comparan peticiones del mismo usuario y con las mismas opciones"""
+        return hash_key(
+            request.user_id or "",
+            request.language or "",
+            str(request.reasoning_enabled),
+            str(request.include_related),
+            json.dumps(request.focus_areas or [], ensure_ascii=False),
+            request.reconstruction_mode,
+            str(request.max_thinking_tokens)
+        )
+
+    @staticmethod
+    def applies(request: ReconstructionRequest) -> bool:
+        # Incremental depende del estado previo y la salida estructurada
+        # contiene los eventos exactos del día
+        return request.reconstruction_mode != "incremental" and not request.structured_output
+
+    def embed(self, capsule: CapsuleData) -> Optional[np.ndarray]:
+        try:
+            vectors = self.gateway.embed(self.model, [self.normalize(capsule)], timeout=self.timeout)
+        except Exception as e:
+            self._count("embed_errors")
+            logger.warning(f"[SEMANTIC] No se pudo calcular el embedding: {e}")
+            return None
+        return np.asarray(vectors[0], dtype=np.float32) if vectors else None
+
+    def lookup(self, request: ReconstructionRequest) -> Tuple[Optional[ReconstructionResponse], Optional[np.ndarray]]:
+        """
+        Busca una reconstrucción casi idéntica.
+
+        Returns:
+            (respuesta adaptada o None, embedding para guardar después)
+        """
+        if not self.applies(request):
+            self._count("skipped")
+            return None, None
+
+        vector = self.embed(request.capsule_data)
+        if vector is None:
+            return None, None
+
+        matches = self.index.search(vector, scope=self.scope(request), k=1, threshold=self.threshold)
+        if not matches:
+            self._count("misses")
+            return None, vector
+
+        source, similarity = matches[0]
+        self._count("hits")
+        logger.info(f"[SEMANTIC] {request.capsule_data.date} ≈ {source.date} ({similarity:.3f})")
+        return self.adapt(source, request.capsule_data.date, similarity), vector
+
+    @staticmethod
+    def adapt(source: ReconstructionResponse, date: str, similarity: float) -> ReconstructionResponse:
+        """Reutiliza la reconstrucción de otro día cambiando la fecha"""
+        return source.model_copy(update={
+            "date": date,
+            "reconstructed_narrative": source.reconstructed_narrative.replace(source.date, date),
+            "prompt_eval": None,
+            "reconstruction_id": None,
+            "semantic_match": {"source_date": source.date, "similarity": round(similarity, 4)},
+        })
+
+    def add(self, request: ReconstructionRequest, response: ReconstructionResponse,
+            vector: Optional[np.ndarray]):
+        if vector is None or response.degraded or not self.applies(request):
+            return
+        self.index.add(vector, response, scope=self.scope(request))
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            stats = dict(self.stats)
+        return {**stats, "threshold": self.threshold, "index": self.index.stats()}
@@ -0,0 +1,80 @@
+from typing import Any, Mapping, Optional
+import hashlib
+import json
+
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # opcional: sin orjson se usa json de la stdlib
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """JSON compacto en UTF-8 (acentos sin escapar), con orjson si está instalado"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def model_json(model: BaseModel) -> bytes:
+    """
+    JSON de un modelo sin pasar por `jsonable_encoder`.
+
+    Con orjson, `model_dump()` + orjson es bastante más rápido que
+    `model_dump_json` en textos largos (ver scripts/bench_serialization.py);
+    sin él se usa el serializador de pydantic-core.
+    """
+    if orjson is not None:
+        return orjson.dumps(model.model_dump(), option=orjson.OPT_SERIALIZE_NUMPY)
+    return model.model_dump_json().encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    Respuesta por defecto de la API: mismo contenido que `JSONResponse`
+    pero serializado con orjson (varias veces más rápido y sin espacios).
+    """
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def etag_for(body: bytes) -> str:
+    """
+    ETag débil: identifica el contenido, no los bytes enviados, así que
+    vale igual para la versión en gzip, en brotli o sin comprimir.
+    """
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def _matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Comparación débil: se ignora el prefijo W/
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def model_response(
+    model: BaseModel,
+    if_none_match: Optional[str] = None,
+    status_code: int = 200,
+    headers: Optional[Mapping[str, str]] = None
+) -> Response:
+    """
+    Serializa un modelo con `model_json` (sin la validación y el
+    `jsonable_encoder` de `response_model`) y añade su ETag.
+
+    Si `if_none_match` coincide con el ETag devuelve 304 sin cuerpo.
+    """
+    body = model_json(model)
+    etag = etag_for(body)
+    # El cliente puede guardarla pero debe revalidar antes de reutilizarla
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache", **(headers or {})}
+    if _matches(if_none_match, etag):
+        return Response(status_code=304, headers=cache_headers)
+    return Response(body, status_code=status_code, media_type="application/json", headers=cache_headers)
@@ -0,0 +1,211 @@
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import time
+
+from app.services.previews import PreviewBuilder
+
+# Este módulo se importa en los procesos de media_workers: solo PIL/imageio,
+# nada que arrastre la app (gateway, modelos, caches)
+
+SLIDE_STYLES = {
+    "title": {"fontsize": 80, "bg_color": (26, 26, 46), "text_color": (255, 255, 255)},
+    "section": {"fontsize": 35, "bg_color": (22, 33, 62), "text_color": (255, 255, 255)},
+    "insights": {"fontsize": 30, "bg_color": (15, 52, 96), "text_color": (255, 255, 0)},
+}
+
+
+def title_text(date: str) -> str:
+    return f"Tu Día: {date}"
+
+
+def insights_text(insights: List[str]) -> str:
+    insights_text = "\n".join([f"• {ins[:100]}" for ins in insights[:3]])
+    return f"Insights Clave:\n\n{insights_text}"
+
+
+def render_slide(kind: str, text: str):
+    """Slide 1280x720 con el estilo de su tipo (title, section, insights)"""
+    if kind == "section":
+        text = text[:250]  # Limitar caracteres
+    return create_simple_text_image(text, width=1280, height=720, **SLIDE_STYLES[kind])
+
+
+def create_simple_text_image(text, width=1280, height=720, fontsize=40,
+                             bg_color=(0, 0, 0), text_color=(255, 255, 255)):
+    """
+    Crea una imagen simple con texto centrado.
+    VERSIÓN ROBUSTA SIN ERRORES DE TUPLA
+    """
+    from PIL import Image, ImageDraw, ImageFont
+
+    # Crear imagen
+    img = Image.new('RGB', (width, height), bg_color)
+    draw = ImageDraw.Draw(img)
+
+    # Cargar fuente
+    try:
+        font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", fontsize)
+    except:
+        try:
+            font = ImageFont.truetype("C:\\Windows\\Fonts\\arial.ttf", fontsize)
+        except:
+            font = ImageFont.load_default()
+
+    # Dividir texto en líneas
+    words = text.split()
+    lines = []
+    current_line = []
+
+    for word in words:
+        test_line = " ".join(current_line + [word])
+        # Usar textbbox correctamente
+        bbox = draw.textbbox((0, 0), test_line, font=font)
+        text_width = bbox[2] - bbox[0]
+
+        if text_width < width - 100:
+            current_line.append(word)
+        else:
+            if current_line:
+                lines.append(" ".join(current_line))
+            current_line = [word]
+
+    if current_line:
+        lines.append(" ".join(current_line))
+
+    # Dibujar líneas centradas
+    line_height = fontsize + 10
+    total_height = len(lines) * line_height
+    y_start = (height - total_height) // 2
+
+    for i, line in enumerate(lines):
+        bbox = draw.textbbox((0, 0), line, font=font)
+        line_width = bbox[2] - bbox[0]
+        x = (width - line_width) // 2
+        y = y_start + i * line_height
+
+        draw.text((x, y), line, fill=text_color, font=font)
+
+    return img
+
+
+def _writer(output_path: str, fps: float, threads: int):
+    import imageio
+
+    params = ["-threads", str(threads)] if threads else None
+    return imageio.get_writer(output_path, fps=fps, ffmpeg_params=params)
+
+
+def render_slides_video(slides: List[Tuple[str, str, str]], output_video: str,
+                        fps: float = 0.2, threads: int = 0,
+                        previews_dir: Optional[str] = None) -> Dict:
+    """
+    Renderiza las slides a PNG y las codifica en un MP4 (en un worker).
+
+    Args:
+        slides: (tipo, texto, ruta del PNG) por slide, en orden
+        previews_dir: Si se indica, póster, miniaturas y sprite de las mismas slides
+
+    Returns:
+        {"slides": rutas de los PNG, "video_path": MP4 o None sin imageio,
+         "render_ms": tiempo de render de las slides, "encode_ms": tiempo del encoder,
+         "previews": índice de previews o None}
+    """
+    import numpy as np
+
+    frames = []
+    previews = PreviewBuilder(previews_dir) if previews_dir else None
+    start = time.perf_counter()
+    for kind, text, slide_path in slides:
+        img = render_slide(kind, text)
+        img.save(slide_path)
+        frames.append(np.asarray(img))
+        if previews is not None:
+            previews.add(img, 1 / fps)
+    render_ms = (time.perf_counter() - start) * 1000
+    result = {
+        "slides": [path for _, _, path in slides],
+        "video_path": None,
+        "render_ms": render_ms,
+        "previews": previews.finish() if previews is not None else None,
+    }
+
+    try:
+        writer = _writer(output_video, fps, threads)
+    except ImportError:
+        return result
+
+    start = time.perf_counter()
+    with writer:
+        for frame in frames:
+            writer.append_data(frame)
+    return {**result, "video_path": output_video, "encode_ms": (time.perf_counter() - start) * 1000}
+
+
+# Marca de fin del stream de slides (`None` = cancelado)
+STREAM_END = "__end__"
+
+
+def encode_slide_stream(queue, output_path: str, fps: float = 0.2,
+                        frames_per_slide: int = 1, threads: int = 0,
+                        previews_dir: Optional[str] = None) -> Dict:
+    """
+    Consume slides de `queue` según llegan y las escribe en el encoder (en un worker).
+
+    Cada elemento es (tipo, texto); `STREAM_END` cierra el video y `None`
+    lo aborta. Con `previews_dir` cada slide alimenta también las previews.
+    """
+    import numpy as np
+
+    writer = _writer(output_path, fps, threads)
+    previews = PreviewBuilder(previews_dir) if previews_dir else None
+    slides, render_ms = 0, 0.0
+    finished = False
+    try:
+        while True:
+            item = queue.get()
+            if item is None:
+                return {"slides": slides, "render_ms": render_ms, "aborted": True, "previews": None}
+            if item == STREAM_END:
+                break
+            start = time.perf_counter()
+            img = render_slide(*item)
+            frame = np.asarray(img)
+            for _ in range(frames_per_slide):
+                writer.append_data(frame)
+            if previews is not None:
+                previews.add(img, frames_per_slide / fps)
+            slides += 1
+            render_ms += (time.perf_counter() - start) * 1000
+        finished = True
+    finally:
+        writer.close()
+        if previews is not None and not finished:
+            previews.abort()
+    index = previews.finish() if previews is not None else None
+    return {"slides": slides, "render_ms": render_ms, "aborted": False, "previews": index}
+
+
+def previews_dir(output_dir: Path, date: str) -> str:
+    """Directorio de previews junto al MP4 de la fecha"""
+    return str(output_dir / f"rewindday_{date}_previews")
+
+
+def warm_up() -> float:
+    """
+    Importa PIL/imageio y carga la fuente en el worker (la primera slide
+    real no paga esos costes); retorna los ms empleados.
+    """
+    start = time.perf_counter()
+    import imageio  # noqa: F401
+
+    render_slide("title", title_text("warm-up"))
+    return (time.perf_counter() - start) * 1000
+
+
+def slide_paths(output_dir: Path, date: str, sections: int) -> List[str]:
+    """Rutas de los PNG: título, secciones e insights"""
+    return (
+        [str(output_dir / f"slide_0_{date}.png")]
+        + [str(output_dir / f"slide_{i+1}_{date}.png") for i in range(sections)]
+        + [str(output_dir / f"slide_final_{date}.png")]
+    )
@@ -0,0 +1,252 @@
+from typing import Dict, Iterator, List, Optional, Type, get_args
+import json
+import threading
+import logging
+
+from pydantic import BaseModel, ValidationError
+
+from app.services.llm_gateway import LLMGateway
+from app.services.prompts import get_template
+
+logger = logging.getLogger(__name__)
+
+
+def schema_for(model_cls: Type[BaseModel]) -> Dict:
+    """
+    Esquema JSON para el parámetro `format` de Ollama.
+
+    Los campos con `default_factory` (p. ej. `generated_at`) los rellena el
+    servidor, así que no se le piden al modelo.
+    """
+    schema = model_cls.model_json_schema()
+    server_side = [
+        name for name, field in model_cls.model_fields.items()
+        if field.default_factory is not None
+    ]
+    for name in server_side:
+        schema.get("properties", {}).pop(name, None)
+        if name in schema.get("required", []):
+            schema["required"].remove(name)
+    return schema
+
+
+class JsonArrayItemScanner:
+    """
+    Escáner incremental de JSON.
+
+    Recibe el texto por fragmentos (tal como llega del stream) y devuelve
+    cada objeto completo del array `field` del objeto raíz en cuanto se
+    cierra, sin esperar al final de la respuesta.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.length = 0
+        self.stack: List[str] = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.last_string = ""
+        self.array_key: Optional[str] = None
+        self.item_start: Optional[int] = None
+        self.last_item_end: Optional[int] = None
+        self._joined = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        items = []
+        offset = self.length
+        self.length += len(chunk)
+        self._joined += chunk
+
+        for i, char in enumerate(chunk):
+            pos = offset + i
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if len(self.stack) == 1:
+                        self.last_string = self._joined[self.string_start:pos]
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = pos + 1
+            elif char in "{[":
+                if char == "[" and self.stack == ["{"]:
+                    self.array_key = self.last_string
+                if (char == "{" and self.stack == ["{", "["]
+                        and self.array_key == self.field):
+                    self.item_start = pos
+                self.stack.append(char)
+            elif char in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if (char == "}" and self.item_start is not None
+                        and self.stack == ["{", "["]):
+                    items.append(self._joined[self.item_start:pos + 1])
+                    self.item_start = None
+                    self.last_item_end = pos + 1
+
+        return items
+
+    def closers(self) -> str:
+        """Texto que cierra un JSON truncado (string abierto, arrays y objetos)"""
+        tail = '"' if self.in_string else ""
+        return tail + "".join("}" if c == "{" else "]" for c in reversed(self.stack))
+
+
+class StructuredGenerator:
+    """
+    Generación estructurada con el parámetro `format` (esquema JSON) de Ollama.
+
+    Las respuestas se validan con los modelos Pydantic existentes. Si el
+    modelo tiene un campo lista (`list_field`), cada elemento se valida en
+    cuanto se completa en el stream y solo los que fallan se reparan con un
+    prompt de corrección; el resto de la generación no se repite.
+    """
+
+    def __init__(
+        self,
+        gateway: LLMGateway,
+        model: str,
+        timeout: int = 300,
+        max_repairs: int = 2
+    ):
+        self.gateway = gateway
+        self.model = model
+        self.timeout = timeout
+        self.max_repairs = max_repairs
+        self._lock = threading.Lock()
+        self.stats = {"generations": 0, "item_repairs": 0, "object_repairs": 0}
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _payload(self, model_cls, prompt, system, options) -> Dict:
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "format": schema_for(model_cls),
+            "options": options or {},
+        }
+        if system:
+            payload["system"] = system
+        return payload
+
+    def stream(self, payload: Dict) -> Iterator[str]:
+        """Fragmentos de texto de la respuesta en streaming"""
+        for data in self.gateway.stream(payload, self.timeout):
+            yield data.get("response", "")
+
+    def generate(
+        self,
+        model_cls: Type[BaseModel],
+        prompt: str,
+        system: Optional[str] = None,
+        options: Optional[Dict] = None,
+        list_field: Optional[str] = None,
+        language: Optional[str] = None
+    ) -> BaseModel:
+        """
+        Genera y valida una instancia de `model_cls`.
+
+        Los prompts de reparación usan la plantilla "repair" de `language`.
+
+        Raises:
+            ValueError: si la respuesta no se puede reparar
+        """
+        self._count("generations")
+        item_cls = None
+        if list_field:
+            item_cls = get_args(model_cls.model_fields[list_field].annotation)[0]
+
+        scanner = JsonArrayItemScanner(list_field or "")
+        valid_items: Dict[int, BaseModel] = {}
+        failed_items: Dict[int, tuple] = {}
+        parts = []
+
+        payload = self._payload(model_cls, prompt, system, options)
+        for chunk in self.stream(payload):
+            parts.append(chunk)
+            if not item_cls:
+                continue
+            for raw in scanner.feed(chunk):
+                index = len(valid_items) + len(failed_items)
+                try:
+                    valid_items[index] = item_cls.model_validate_json(raw)
+                except ValidationError as e:
+                    logger.warning(f"[STRUCTURED] Elemento {index} de '{list_field}' inválido")
+                    failed_items[index] = (raw, str(e))
+
+        text = "".join(parts)
+
+        if not failed_items:
+            try:
+                return model_cls.model_validate_json(text)
+            except ValidationError:
+                pass
+
+        # Recuperar lo válido y reparar solo lo que falla
+        data = self._lenient_load(text, scanner if item_cls else None)
+        if data is None:
+            self._count("object_repairs")
+            return self._repair(model_cls, text, "JSON inválido o incompleto", language)
+
+        if item_cls and (valid_items or failed_items):
+            for index, (raw, error) in sorted(failed_items.items()):
+                self._count("item_repairs")
+                valid_items[index] = self._repair(item_cls, raw, error, language)
+            data[list_field] = [valid_items[i].model_dump() for i in sorted(valid_items)]
+
+        try:
+            return model_cls.model_validate(data)
+        except ValidationError as e:
+            self._count("object_repairs")
+            repaired = self._repair(model_cls, json.dumps(data, ensure_ascii=False), str(e), language)
+            if not item_cls or not data.get(list_field):
+                return repaired
+            fixed = repaired.model_dump()
+            fixed[list_field] = data[list_field]
+            return model_cls.model_validate(fixed)
+
+    def _lenient_load(self, text: str, scanner: Optional[JsonArrayItemScanner]) -> Optional[Dict]:
+        """Intenta cargar el JSON, cerrando estructuras truncadas si hace falta"""
+        candidates = [text]
+        if scanner is not None:
+            candidates.append(text + scanner.closers())
+            # Cortar tras el último elemento completo si el resto quedó a medias
+            if scanner.last_item_end is not None:
+                candidates.append(text[:scanner.last_item_end] + "]}")
+        for candidate in candidates:
+            start = candidate.find("{")
+            if start < 0:
+                continue
+            try:
+                data = json.loads(candidate[start:])
+            except json.JSONDecodeError:
+                continue
+            if isinstance(data, dict):
+                return data
+        return None
+
+    def _repair(self, model_cls: Type[BaseModel], raw: str, error: str,
+                language: Optional[str] = None) -> BaseModel:
+        """Pide al modelo que corrija un fragmento concreto contra su esquema"""
+        template = get_template("repair", language)
+        last_error = error
+        for attempt in range(1, self.max_repairs + 1):
+            logger.info(f"[STRUCTURED] Reparando {model_cls.__name__} (intento {attempt})")
+            rendered = template.render_repair(raw, last_error)
+            payload = self._payload(model_cls, rendered["prompt"], rendered["system"], {"temperature": 0})
+            text = "".join(self.stream(payload))
+            try:
+                return model_cls.model_validate_json(text)
+            except ValidationError as e:
+                last_error = str(e)
+                raw = text
+
+        raise ValueError(f"No se pudo obtener un {model_cls.__name__} válido: {last_error[:200]}")
@@ -0,0 +1,161 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import threading
+import time
+
+import numpy as np
+
+
+class VectorIndex:
+    """
+    Índice vectorial en memoria respaldado por una matriz NumPy.
+
+    - Los vectores se guardan normalizados (float32), así que la similitud
+      coseno es un producto matricial.
+    - Cada entrada pertenece a un ámbito (p. ej. un usuario); las búsquedas
+      solo recorren las filas de su ámbito.
+    - Con `max_entries` lleno se expulsa la entrada usada hace más tiempo y
+      su fila se reutiliza.
+    - La matriz crece duplicándose; la dimensión se fija con el primer vector.
+    """
+
+    def __init__(self, max_entries: int = 10000, initial_capacity: int = 1024):
+        self.max_entries = max_entries
+        self.dim: Optional[int] = None
+        self._capacity = min(initial_capacity, max_entries)
+        self._vectors: Optional[np.ndarray] = None
+        # Las filas libres quedan en +inf para no ser nunca las más antiguas
+        self._last_used = np.full(self._capacity, np.inf)
+        self._values: List[Any] = [None] * self._capacity
+        self._slot_scope: List[Optional[str]] = [None] * self._capacity
+        self._scopes: Dict[str, set] = {}
+        self._scope_rows: Dict[str, np.ndarray] = {}
+        self._free: List[int] = []
+        self._size = 0
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def normalize(vector: Sequence[float]) -> np.ndarray:
+        array = np.asarray(vector, dtype=np.float32).ravel()
+        norm = np.linalg.norm(array)
+        return array / norm if norm > 0 else array
+
+    # ==================== ALMACENAMIENTO ====================
+
+    def _grow(self):
+        capacity = min(self._capacity * 2, self.max_entries)
+        vectors = np.zeros((capacity, self.dim), dtype=np.float32)
+        vectors[:self._capacity] = self._vectors
+        last_used = np.full(capacity, np.inf)
+        last_used[:self._capacity] = self._last_used
+        self._values.extend([None] * (capacity - self._capacity))
+        self._slot_scope.extend([None] * (capacity - self._capacity))
+        self._free.extend(range(capacity - 1, self._capacity - 1, -1))
+        self._vectors, self._last_used, self._capacity = vectors, last_used, capacity
+
+    def _evict_oldest(self):
+        self._remove(int(np.argmin(self._last_used)))
+        self.evictions += 1
+
+    def _remove(self, slot: int):
+        scope = self._slot_scope[slot]
+        rows = self._scopes.get(scope)
+        if rows is not None:
+            rows.discard(slot)
+            self._scope_rows.pop(scope, None)
+            if not rows:
+                del self._scopes[scope]
+        self._values[slot] = None
+        self._slot_scope[slot] = None
+        self._last_used[slot] = np.inf
+        self._free.append(slot)
+        self._size -= 1
+
+    def add(self, vector: Sequence[float], value: Any, scope: str = "") -> int:
+        """Inserta un vector con su valor asociado; retorna la fila usada"""
+        normalized = self.normalize(vector)
+        with self._lock:
+            if self._vectors is None:
+                self.dim = normalized.shape[0]
+                self._vectors = np.zeros((self._capacity, self.dim), dtype=np.float32)
+                self._free = list(range(self._capacity - 1, -1, -1))
+            elif normalized.shape[0] != self.dim:
+                raise ValueError(f"Dimensión {normalized.shape[0]} distinta de la del índice ({self.dim})")
+
+            if not self._free:
+                if self._capacity < self.max_entries:
+                    self._grow()
+                else:
+                    self._evict_oldest()
+            slot = self._free.pop()
+
+            self._vectors[slot] = normalized
+            self._values[slot] = value
+            self._slot_scope[slot] = scope
+            self._last_used[slot] = time.monotonic()
+            self._scopes.setdefault(scope, set()).add(slot)
+            self._scope_rows.pop(scope, None)
+            self._size += 1
+            return slot
+
+    def remove(self, slot: int):
+        """Elimina la entrada de una fila devuelta por `add`"""
+        with self._lock:
+            if self._slot_scope[slot] is not None:
+                self._remove(slot)
+
+    # ==================== BÚSQUEDA ====================
+
+    def _rows(self, scope: str) -> Optional[np.ndarray]:
+        rows = self._scope_rows.get(scope)
+        if rows is None and scope in self._scopes:
+            rows = np.fromiter(sorted(self._scopes[scope]), dtype=np.int64)
+            self._scope_rows[scope] = rows
+        return rows
+
+    def search(self, vector: Sequence[float], scope: str = "", k: int = 1,
+               threshold: float = -1.0) -> List[Tuple[Any, float]]:
+        """
+        Los `k` vectores más similares del ámbito con similitud >= `threshold`.
+
+        Returns:
+            Lista de (valor, similitud coseno) de mayor a menor similitud
+        """
+        query = self.normalize(vector)
+        with self._lock:
+            rows = self._rows(scope)
+            if rows is None or not len(rows) or query.shape[0] != self.dim:
+                return []
+            if len(rows) * 4 > self._capacity:
+                # Ámbito grande: producto sobre toda la matriz sin copiar filas
+                scores = (self._vectors @ query)[rows]
+            else:
+                scores = self._vectors[rows] @ query
+            k = min(k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+            top = top[np.argsort(-scores[top])]
+
+            results = []
+            now = time.monotonic()
+            for i in top:
+                score = float(scores[i])
+                if score < threshold:
+                    break
+                slot = int(rows[i])
+                self._last_used[slot] = now
+                results.append((self._values[slot], score))
+            return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": self._size,
+                "max_entries": self.max_entries,
+                "capacity": self._capacity,
+                "dim": self.dim,
+                "scopes": len(self._scopes),
+                "evictions": self.evictions,
+            }
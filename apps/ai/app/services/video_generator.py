@@ -1,24 +1,94 @@
 import json
 import asyncio
+import multiprocessing
+import os
 import requests
 import subprocess
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-import base64
-from typing import List, Dict, Optional
-from PIL import Image
-from io import BytesIO
+from typing import Callable, List, Dict, Optional, Tuple
 import logging
 
+from app.config import settings
+from app.models.capsule import VideoScript
+from app.services.cache import hash_key
+from app.services.image_cache import SDImageCache
+from app.services.lazy_modules import lazy_modules
+from app.services.llm_gateway import gateway
+from app.services.media_workers import apply_worker_limits, media_workers
+from app.services.previews import build_previews
+from app.services.profiling import spans
+from app.services.resilience import piper_breaker, retry_call, sd_breaker
+from app.services.sd_decode import save_streamed_image
+from app.services.structured import StructuredGenerator
+from app.utils.ffmpeg_runner import ffmpeg_runner
+
 logger = logging.getLogger(__name__)
 
+# Calidades de render: SD genera a menor resolución y con menos pasos, y el
+# escalado Lanczos hasta `output` se hace en CPU, en procesos aparte
+QUALITY_TIERS = {
+    "draft": {"width": 512, "height": 288, "steps": 8, "output": (1280, 720)},
+    "mobile": {"width": 1024, "height": 576, "steps": 14, "output": (1280, 720)},
+    "full": {"width": 1920, "height": 1080, "steps": 20, "output": None},
+}
+
+# Tamaño de lectura de la respuesta de txt2img
+SD_STREAM_CHUNK = 64 * 1024
+
+
+def concat_audio_files(audio_files: List[str], output_file: str):
+    """
+    Concatena múltiples archivos de audio (se ejecuta en un proceso worker)
+    """
+    AudioSegment = lazy_modules.get("pydub").AudioSegment
+    
+    combined = AudioSegment.empty()
+    
+    for audio_file in audio_files:
+        sound = AudioSegment.from_wav(audio_file)
+        combined += sound
+    
+    combined.export(output_file, format="wav")
+
+
+def upscale_image(path: str, size: Tuple[int, int]) -> str:
+    """Escala una imagen en su sitio con Lanczos (se ejecuta en un proceso worker)"""
+    Image = lazy_modules.get("PIL")
+    with Image.open(path) as img:
+        upscaled = img.convert("RGB").resize(size, Image.LANCZOS)
+    upscaled.save(path)
+    return path
+
+
 class VideoGenerator:
     def __init__(self, videos_dir: str = "videos"):
         self.videos_dir = Path(videos_dir)
         self.videos_dir.mkdir(exist_ok=True)
         
         # URLs de servicios locales
-        self.ollama_url = "http://localhost:11434/api/generate"
-        self.sd_url = "http://localhost:7860/api/txt2img"
+        self.sd_url = f"{settings.sd_api_url.rstrip('/')}/api/txt2img"
+        
+        # Imágenes de SD ya generadas (mismos parámetros y semilla)
+        self.image_cache = SDImageCache(
+            settings.sd_image_cache_dir,
+            max_bytes=settings.sd_image_cache_max_mb * 1024 * 1024
+        )
+        
+        # Escalado de las calidades reducidas y renders completos pendientes
+        self._upscale_pool: Optional[ProcessPoolExecutor] = None
+        self._musicgen = None
+        self.pending_upgrades: Dict[str, asyncio.Task] = {}
+        
+        # Estado por video (campos de VideoStatus)
+        self.jobs: Dict[str, Dict] = {}
+        
+        # Ollama va por el gateway compartido con la reconstrucción
+        self.script_generator = StructuredGenerator(
+            gateway=gateway,
+            model=settings.ollama_script_model,
+            timeout=300
+        )
     
     # ========================
     # PASO 1: GENERAR GUION
@@ -85,73 +155,90 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
 }}
 """
             
-            response = requests.post(
-                self.ollama_url,
-                json={
-                    'model': 'mistral',
-                    'prompt': prompt,
-                    'stream': False,
-                    'temperature': 0.7
-                },
-                timeout=300
-            )
-            
-            result = response.json()
-            text = result['response']
-            
-            # Extraer JSON
-            import re
-            json_match = re.search(r'\{[\s\S]*\}', text)
-            if json_match:
-                script = json.loads(json_match.group())
-                logger.info(f"✅ Guion generado: {len(script.get('scenes', []))} escenas")
-                return script
-            else:
-                logger.error("No se encontró JSON en la respuesta")
-                raise ValueError("No valid JSON in response")
+            # JSON Schema de VideoScript: cada escena se valida mientras llega
+            # y solo las inválidas se regeneran con un prompt de reparación
+            script = self.script_generator.generate(
+                VideoScript,
+                prompt,
+                options={'temperature': 0.7},
+                list_field='scenes'
+            ).model_dump()
+            
+            # Semilla fija por escena: re-renderizar el mismo guion (aunque
+            # cambie la narración) reutiliza las imágenes de la caché
+            for scene in script.get('scenes', []):
+                scene['seed'] = self.scene_seed(scene)
+            
+            logger.info(f"✅ Guion generado: {len(script.get('scenes', []))} escenas")
+            return script
                 
         except Exception as e:
             logger.error(f"Error generando guion: {e}")
             raise
     
+    @staticmethod
+    def scene_seed(scene: Dict) -> int:
+        """Semilla estable a partir del número y la descripción visual de la escena"""
+        digest = hash_key(str(scene.get('number', '')), scene.get('description', ''))
+        return int(digest[:8], 16) % (2 ** 31)
+    
     # ========================
     # PASO 2: GENERAR IMÁGENES
     # ========================
     
-    def generate_images_stable_diffusion(self, description: str, scene_num: int = 1) -> str:
+    def generate_images_stable_diffusion(self, description: str, scene_num: int = 1,
+                                         seed: int = -1, quality: str = "full",
+                                         prefix: str = "") -> str:
         """
         Genera una imagen usando Stable Diffusion
-        Retorna ruta de la imagen guardada
+        Retorna ruta de la imagen guardada, a la resolución de SD de `quality`
+        
+        Con semilla fija, si la caché tiene la misma imagen no se llama a SD.
         """
         try:
-            logger.info(f"🎨 Generando imagen para escena {scene_num}...")
+            tier = QUALITY_TIERS[quality]
+            suffix = "" if quality == "full" else f"_{quality}"
+            image_path = self.videos_dir / f"{prefix}scene_{scene_num}{suffix}.png"
             
             payload = {
                 "prompt": f"{description}, professional, cinematic, 4K, high quality, sharp focus",
                 "negative_prompt": "blurry, low quality, distorted, ugly, bad, deformed",
-                "steps": 20,
+                "steps": tier["steps"],
                 "sampler_name": "DPM++ 2M",
-                "width": 1920,
-                "height": 1080,
+                "width": tier["width"],
+                "height": tier["height"],
                 "cfg_scale": 7.5,
-                "seed": -1,
+                "seed": seed,
                 "batch_size": 1,
                 "n_iter": 1
             }
             
-            response = requests.post(self.sd_url, json=payload, timeout=600)
-            result = response.json()
-            
-            if 'images' not in result or not result['images']:
-                raise ValueError("No images in response")
+            if self.image_cache.get(payload, image_path):
+                logger.info(f"♻️ Imagen en caché para escena {scene_num}")
+                return str(image_path)
             
-            # Guardar imagen
-            img_base64 = result['images'][0]
-            img_data = base64.b64decode(img_base64)
-            img = Image.open(BytesIO(img_data))
+            logger.info(f"🎨 Generando imagen para escena {scene_num}...")
             
-            image_path = self.videos_dir / f"scene_{scene_num}.png"
-            img.save(image_path)
+            def txt2img(remaining: float):
+                # La respuesta se decodifica en streaming directo al archivo
+                with spans.span("sd.txt2img"), sd_breaker.protect(), \
+                        requests.post(self.sd_url, json=payload, timeout=remaining, stream=True) as response:
+                    if not response.ok:
+                        raise requests.HTTPError(
+                            f"SD error {response.status_code}: {response.text[:200]}", response=response
+                        )
+                    save_streamed_image(response.iter_content(chunk_size=SD_STREAM_CHUNK), image_path)
+            
+            # Misma semilla y parámetros: reintentar es idempotente
+            retry_call(
+                txt2img,
+                deadline=settings.sd_deadline_seconds,
+                attempts=settings.retry_max_attempts,
+                base_delay=settings.retry_base_delay,
+                max_delay=settings.retry_max_delay,
+                label=f"SD escena {scene_num}"
+            )
+            self.image_cache.put(payload, image_path)
             
             logger.info(f"✅ Imagen guardada: {image_path}")
             return str(image_path)
@@ -160,19 +247,65 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
             logger.error(f"Error generando imagen: {e}")
             raise
     
+    def _upscaler(self) -> ProcessPoolExecutor:
+        if self._upscale_pool is None:
+            self._upscale_pool = ProcessPoolExecutor(
+                max_workers=settings.sd_upscale_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=apply_worker_limits,
+                initargs=media_workers.limits
+            )
+        return self._upscale_pool
+    
+    def render_scene_images(self, scenes: List[Dict], quality: str = "full",
+                            prefix: str = "") -> Tuple[List[str], Dict]:
+        """
+        Genera las imágenes de todas las escenas en la calidad pedida.
+        
+        SD atiende las escenas de una en una; el escalado de cada imagen se
+        lanza en el pool de procesos en cuanto llega, solapado con la
+        siguiente llamada a SD.
+        
+        Returns:
+            (rutas de las imágenes, aciertos/fallos de caché de esta pasada)
+        """
+        output = QUALITY_TIERS[quality]["output"]
+        cache_before = self.image_cache.stats()
+        image_paths = []
+        upscales: List[Future] = []
+        for i, scene in enumerate(scenes, 1):
+            image = self.generate_images_stable_diffusion(
+                scene['description'],
+                scene_num=i,
+                seed=scene.get('seed', -1),
+                quality=quality,
+                prefix=prefix
+            )
+            image_paths.append(image)
+            if output:
+                upscales.append(self._upscaler().submit(upscale_image, image, output))
+        for upscale in upscales:
+            upscale.result()
+        cache_after = self.image_cache.stats()
+        return image_paths, {
+            "hits": cache_after["hits"] - cache_before["hits"],
+            "misses": cache_after["misses"] - cache_before["misses"],
+            "total": cache_after
+        }
+    
     # ========================
     # PASO 3: GENERAR NARRACIÓN
     # ========================
     
-    def generate_narration_piper(self, text: str, scene_num: int = 1) -> str:
+    def generate_narration_piper(self, text: str, scene_num: int = 1, prefix: str = "") -> str:
         """
         Genera narración usando Piper TTS
-        Retorna ruta del archivo de audio
+        Retorna ruta del archivo de audio (`prefix` por video, como las imágenes)
         """
         try:
             logger.info(f"🎤 Generando narración escena {scene_num}...")
             
-            output_file = self.videos_dir / f"narration_{scene_num}.wav"
+            output_file = self.videos_dir / f"{prefix}narration_{scene_num}.wav"
             
             # Comando piper
             cmd = [
@@ -182,19 +315,29 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
                 "--length-scale", "1.0"
             ]
             
-            process = subprocess.Popen(
-                cmd,
-                stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
+            def synthesize(remaining: float):
+                with spans.span("tts.piper"), piper_breaker.protect():
+                    process = subprocess.run(
+                        cmd,
+                        input=text,
+                        capture_output=True,
+                        text=True,
+                        timeout=remaining
+                    )
+                    if process.returncode != 0:
+                        raise RuntimeError(f"Piper error: {process.stderr}")
+            
+            # Un fallo puntual de piper (p. ej. modelo aún cargando) se reintenta
+            retry_call(
+                synthesize,
+                deadline=settings.piper_deadline_seconds,
+                attempts=settings.retry_max_attempts,
+                base_delay=settings.retry_base_delay,
+                max_delay=settings.retry_max_delay,
+                retry_on=lambda e: isinstance(e, RuntimeError),
+                label=f"piper escena {scene_num}"
             )
             
-            stdout, stderr = process.communicate(input=text)
-            
-            if process.returncode != 0:
-                raise RuntimeError(f"Piper error: {stderr}")
-            
             logger.info(f"✅ Narración guardada: {output_file}")
             return str(output_file)
             
@@ -206,16 +349,21 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
     # PASO 4: GENERAR MÚSICA
     # ========================
     
-    def generate_music_musicgen(self, mood: str, duration: int = 60) -> str:
+    def _musicgen_model(self):
+        """MusicGen se carga una vez por proceso (import y pesos tardan segundos)"""
+        if self._musicgen is None:
+            self._musicgen = lazy_modules.get("audiocraft").MusicGen.get_model('medium')
+        return self._musicgen
+    
+    def generate_music_musicgen(self, mood: str, duration: int = 60, prefix: str = "") -> str:
         """
         Genera música usando MusicGen
-        Retorna ruta del archivo de audio
+        Retorna ruta del archivo de audio (`prefix` por video)
         """
         try:
             logger.info(f"🎵 Generando música ({mood}, {duration}s)...")
             
-            from audiocraft.models import MusicGen
-            import torchaudio
+            torchaudio = lazy_modules.get("torchaudio")
             
             # Mapear mood a descripción
             mood_map = {
@@ -230,7 +378,7 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
             description = mood_map.get(mood, "cinematic orchestral music")
             
             # Generar
-            model = MusicGen.get_model('medium')
+            model = self._musicgen_model()
             model.set_generation_params(
                 duration=duration,
                 use_sampling=True,
@@ -241,7 +389,7 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
             wav = model.generate([description], progress=False)
             
             # Guardar
-            output_file = self.videos_dir / "background_music.wav"
+            output_file = self.videos_dir / f"{prefix}background_music.wav"
             torchaudio.save(str(output_file), wav[0].cpu(), sample_rate=16000)
             
             logger.info(f"✅ Música guardada: {output_file}")
@@ -255,32 +403,30 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
     # PASO 5: COMPILAR VIDEO
     # ========================
     
-    def compile_video_ffmpeg(self, image_paths: List[str], narration_paths: List[str],
-                            music_file: str, scenes: List[Dict], 
-                            output_file: str) -> str:
+    async def compile_video_ffmpeg(self, image_paths: List[str], narration_paths: List[str],
+                                   music_file: str, scenes: List[Dict], 
+                                   output_file: str, job_id: Optional[str] = None,
+                                   on_progress: Optional[Callable[[float], None]] = None,
+                                   prefix: str = "") -> str:
         """
         Compila todo en video final usando FFmpeg
+        
+        Los archivos intermedios llevan `prefix` para que dos videos en
+        curso no se pisen la lista de concat ni la narración concatenada.
         """
         try:
             logger.info("🎬 Compilando video con FFmpeg...")
             
-            import os
-            
             # Crear archivo concat para FFmpeg
-            concat_file = self.videos_dir / "concat_list.txt"
-            with open(concat_file, 'w') as f:
-                for image, scene in zip(image_paths, scenes):
-                    duration = scene['duration']
-                    f.write(f"file '{os.path.abspath(image)}'\n")
-                    f.write(f"duration {duration}\n")
-            
-            # Concatenar narración
-            narration_concat = self.videos_dir / "narration_concat.wav"
-            self._concat_audio_files(narration_paths, str(narration_concat))
-            
-            # Comando FFmpeg
-            cmd = [
-                "ffmpeg",
+            concat_file = self.videos_dir / f"{prefix}concat_list.txt"
+            self._write_concat_list(image_paths, scenes, concat_file)
+            
+            # Concatenar narración (pydub, en un worker de medios)
+            narration_concat = self.videos_dir / f"{prefix}narration_concat.wav"
+            await media_workers.run_async(concat_audio_files, narration_paths, str(narration_concat))
+            
+            # Argumentos de FFmpeg
+            args = [
                 "-f", "concat",
                 "-safe", "0",
                 "-i", str(concat_file),
@@ -298,7 +444,12 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
                 "-y"
             ]
             
-            subprocess.run(cmd, check=True, capture_output=True)
+            await ffmpeg_runner.run(
+                args,
+                duration=sum(s['duration'] for s in scenes),
+                job_id=job_id,
+                on_progress=on_progress
+            )
             
             logger.info(f"✅ Video compilado: {output_file}")
             return output_file
@@ -307,73 +458,160 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
             logger.error(f"Error compilando video: {e}")
             raise
     
-    def _concat_audio_files(self, audio_files: List[str], output_file: str):
+    @staticmethod
+    def _write_concat_list(image_paths: List[str], scenes: List[Dict], concat_file: Path):
+        with open(concat_file, 'w') as f:
+            for image, scene in zip(image_paths, scenes):
+                duration = scene['duration']
+                f.write(f"file '{os.path.abspath(image)}'\n")
+                f.write(f"duration {duration}\n")
+    
+    async def replace_video_images(self, image_paths: List[str], scenes: List[Dict],
+                                   video_file: str, concat_file: Path,
+                                   job_id: Optional[str] = None) -> str:
         """
-        Concatena múltiples archivos de audio
+        Re-codifica la pista de video con otras imágenes conservando el audio
+        del archivo existente, y lo reemplaza de forma atómica.
         """
-        from pydub import AudioSegment
-        
-        combined = AudioSegment.empty()
-        
-        for audio_file in audio_files:
-            sound = AudioSegment.from_wav(audio_file)
-            combined += sound
-        
-        combined.export(output_file, format="wav")
+        self._write_concat_list(image_paths, scenes, concat_file)
+        tmp_file = f"{video_file}.tmp.mp4"
+        args = [
+            "-f", "concat",
+            "-safe", "0",
+            "-i", str(concat_file),
+            "-i", str(video_file),
+            "-map", "0:v",
+            "-map", "1:a",
+            "-c:v", "libx264",
+            "-crf", "23",
+            "-preset", "medium",
+            "-c:a", "copy",
+            tmp_file,
+            "-y"
+        ]
+        try:
+            await ffmpeg_runner.run(args, duration=sum(s['duration'] for s in scenes), job_id=job_id)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+        os.replace(tmp_file, video_file)
+        return video_file
     
     # ========================
     # PIPELINE COMPLETO
     # ========================
     
+    def _set_status(self, video_id: str, status: str, progress: float, message: str):
+        # Se conservan los campos del trabajo (título, calidad)
+        self.jobs[video_id] = {
+            **self.jobs.get(video_id, {}),
+            "id": video_id,
+            "status": status,
+            "progress": int(progress),
+            "message": message
+        }
+    
+    def get_status(self, video_id: str) -> Optional[Dict]:
+        """
+        Estado de la generación con los campos de `VideoStatus`, más la
+        calidad pedida y si el render completo de un borrador sigue en curso
+        """
+        job = self.jobs.get(video_id)
+        if job is None:
+            return None
+        return {**job, "upgrade_pending": video_id in self.pending_upgrades}
+    
+    def enqueue(self, video_id: str, title: str, quality: str):
+        """Registra un trabajo aún sin empezar, para que su estado ya exista"""
+        self.jobs[video_id] = {"title": title, "quality": quality}
+        self._set_status(video_id, "queued", 0, "En cola")
+    
+    def video_path(self, video_id: str) -> Path:
+        return self.videos_dir / f"{video_id}.mp4"
+    
     async def generate_full_video(self, video_id: str, context: str, 
-                                  title: str = "Video") -> Dict:
+                                  title: str = "Video", quality: str = "full") -> Dict:
         """
         Genera video completo en 5 pasos
         Retorna diccionario con rutas y metadata
+        
+        Con `quality` draft/mobile el video se entrega con imágenes de baja
+        resolución escaladas, y en segundo plano se renderizan las imágenes
+        completas que reemplazan al borrador en el mismo archivo.
+        
+        El progreso (`get_status`) se reparte por pasos; la compilación
+        (70-100 %) avanza con el progreso real de FFmpeg. Los pasos
+        bloqueantes (Ollama, SD, Piper, MusicGen) corren en hilos para no
+        parar el event loop.
         """
+        self.jobs[video_id] = {**self.jobs.get(video_id, {}), "title": title, "quality": quality}
         try:
             logger.info(f"🎬 Iniciando generación de video {video_id}...")
             
-            output_file = self.videos_dir / f"{video_id}.mp4"
+            output_file = self.video_path(video_id)
+            # Archivos intermedios por video: los pasos corren en hilos y dos
+            # trabajos pueden estar en curso a la vez
+            prefix = f"{video_id}_"
             
             # PASO 1: Guion
-            script = self.generate_script_with_ollama(context)
+            self._set_status(video_id, "generating", 0, "Generando guion")
+            script = await asyncio.to_thread(self.generate_script_with_ollama, context)
             
             # PASO 2: Imágenes
-            image_paths = []
-            for i, scene in enumerate(script['scenes'], 1):
-                image = self.generate_images_stable_diffusion(
-                    scene['description'],
-                    scene_num=i
-                )
-                image_paths.append(image)
+            self._set_status(video_id, "generating", 10, "Generando imágenes")
+            # El escalado reescribe cada imagen en su sitio
+            image_paths, image_cache = await asyncio.to_thread(
+                self.render_scene_images, script['scenes'], quality, prefix
+            )
             
             # PASO 3: Narración
+            self._set_status(video_id, "generating", 50, "Generando narración")
             narration_paths = []
             for i, scene in enumerate(script['scenes'], 1):
-                narration = self.generate_narration_piper(
+                narration = await asyncio.to_thread(
+                    self.generate_narration_piper,
                     scene['narration'],
-                    scene_num=i
+                    scene_num=i,
+                    prefix=prefix
                 )
                 narration_paths.append(narration)
             
             # PASO 4: Música
+            self._set_status(video_id, "generating", 60, "Generando música")
             total_duration = sum(s['duration'] for s in script['scenes'])
             moods = [s.get('mood', 'epic') for s in script['scenes']]
             main_mood = max(set(moods), key=moods.count)  # Mood más común
             
-            music = self.generate_music_musicgen(main_mood, total_duration)
+            music = await asyncio.to_thread(
+                self.generate_music_musicgen, main_mood, total_duration, prefix
+            )
             
             # PASO 5: Compilar
-            video = self.compile_video_ffmpeg(
+            self._set_status(video_id, "generating", 70, "Compilando video")
+            video = await self.compile_video_ffmpeg(
                 image_paths=image_paths,
                 narration_paths=narration_paths,
                 music_file=music,
                 scenes=script['scenes'],
-                output_file=str(output_file)
+                output_file=str(output_file),
+                job_id=f"{video_id}-compile",
+                prefix=prefix,
+                on_progress=lambda pct: self._set_status(
+                    video_id, "generating", 70 + 0.3 * pct, "Compilando video"
+                )
             )
             
-            logger.info(f"✅ Video generado exitosamente: {video}")
+            logger.info(f"✅ Video generado exitosamente: {video} ({quality})")
+            previews = await self.build_previews(video_id, image_paths, script['scenes'])
+            
+            upgrade_pending = quality != "full"
+            if upgrade_pending:
+                self._schedule_upgrade(video_id, script, str(output_file))
+            self._set_status(
+                video_id, "completed", 100,
+                "Borrador listo, renderizando calidad completa" if upgrade_pending else "Video listo"
+            )
             
             return {
                 "id": video_id,
@@ -382,13 +620,73 @@ Retorna SOLO JSON sin markdown, con exactamente 5 escenas:
                 "status": "completed",
                 "script": script,
                 "image_count": len(image_paths),
-                "duration_seconds": total_duration
+                "duration_seconds": total_duration,
+                "quality": quality,
+                "upgrade_pending": upgrade_pending,
+                "image_cache": image_cache,
+                "previews_dir": str(self.previews_dir(video_id)) if previews else None,
+                "previews": previews
             }
             
         except Exception as e:
             logger.error(f"❌ Error en generación: {e}")
+            self._set_status(video_id, "failed", 0, str(e))
             return {
                 "id": video_id,
                 "status": "failed",
                 "error": str(e)
             }
+    
+    def previews_dir(self, video_id: str) -> Path:
+        return self.videos_dir / f"{video_id}_previews"
+    
+    async def build_previews(self, video_id: str, image_paths: List[str],
+                             scenes: List[Dict]) -> Optional[Dict]:
+        """
+        Póster, miniaturas y sprite desde las imágenes de las escenas (sin
+        decodificar el MP4). Un fallo no invalida el video ya generado.
+        """
+        try:
+            return await media_workers.run_async(
+                build_previews, image_paths, [s['duration'] for s in scenes],
+                str(self.previews_dir(video_id))
+            )
+        except Exception as e:
+            logger.warning(f"Previews no generadas para {video_id}: {e}")
+            return None
+    
+    def _schedule_upgrade(self, video_id: str, script: Dict, video_file: str):
+        """Lanza el render completo del borrador sin esperar a que termine"""
+        task = asyncio.create_task(self.upgrade_to_full(video_id, script, video_file))
+        self.pending_upgrades[video_id] = task
+        
+        def _done(t: asyncio.Task):
+            self.pending_upgrades.pop(video_id, None)
+            if not t.cancelled() and t.exception() is not None:
+                logger.error(f"Error en el render completo de {video_id}: {t.exception()}")
+        
+        task.add_done_callback(_done)
+    
+    async def upgrade_to_full(self, video_id: str, script: Dict, video_file: str) -> str:
+        """
+        Reemplaza las imágenes del borrador por las de calidad completa.
+        
+        Reutiliza el guion (y por tanto las semillas) y el audio ya mezclado
+        del borrador; solo se vuelven a generar las imágenes y la pista de video.
+        """
+        logger.info(f"🎬 Render completo de {video_id}...")
+        prefix = f"{video_id}_"
+        image_paths, _ = await asyncio.to_thread(
+            self.render_scene_images, script['scenes'], "full", prefix
+        )
+        await self.replace_video_images(
+            image_paths,
+            script['scenes'],
+            video_file,
+            self.videos_dir / f"{prefix}concat_full.txt",
+            job_id=f"{video_id}-upgrade"
+        )
+        await self.build_previews(video_id, image_paths, script['scenes'])
+        self._set_status(video_id, "completed", 100, "Video listo")
+        logger.info(f"✅ Borrador de {video_id} reemplazado por la calidad completa")
+        return video_file
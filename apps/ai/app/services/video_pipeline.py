@@ -0,0 +1,200 @@
+from concurrent.futures import Future
+from queue import Queue
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+import threading
+import time
+import logging
+
+import numpy as np
+
+from app.services.previews import PreviewBuilder
+from app.services.slides import STREAM_END, encode_slide_stream
+
+if TYPE_CHECKING:
+    from app.services.media_workers import MediaWorkers
+
+logger = logging.getLogger(__name__)
+
+
+class SectionSplitter:
+    """
+    Detecta secciones de la narrativa en el stream de tokens.
+
+    Equivale a `narrative.split("###")` quedándose con las secciones no
+    vacías, pero entrega cada sección en cuanto llega el delimitador que la
+    cierra. Un delimitador partido entre fragmentos ("#" + "##") se retiene
+    hasta el siguiente fragmento.
+    """
+
+    def __init__(self, delimiter: str = "###", max_sections: int = 5):
+        self.delimiter = delimiter
+        self.max_sections = max_sections
+        self.buffer = ""
+        self.emitted = 0
+
+    def _take(self, sections: List[str]) -> List[str]:
+        taken = []
+        for section in sections:
+            section = section.strip()
+            if section and self.emitted < self.max_sections:
+                taken.append(section)
+                self.emitted += 1
+        return taken
+
+    def feed(self, chunk: str) -> List[str]:
+        """Secciones completas tras añadir `chunk`"""
+        self.buffer += chunk
+        parts = self.buffer.split(self.delimiter)
+        self.buffer = parts.pop()
+        return self._take(parts)
+
+    def finish(self) -> List[str]:
+        """La última sección (sin delimitador de cierre)"""
+        tail, self.buffer = self.buffer, ""
+        return self._take([tail])
+
+
+class PipelinedSlideVideo:
+    """
+    Encoder de video abierto durante toda la generación.
+
+    Las slides se encolan según se completan y se renderizan y escriben en
+    el writer de imageio mientras el stream del LLM sigue llegando. Al
+    terminar solo queda renderizar las slides finales y cerrar el archivo.
+
+    Con `workers` el render y el encoder corren en un proceso de
+    `MediaWorkers` (cola compartida); sin ellos, en un hilo con `render`.
+    Con `previews_dir` las mismas slides generan póster, miniaturas y sprite.
+
+    El worker se ocupa en `start`, no al crear el objeto: lo añadido antes
+    espera en la cola. Así la espera del LLM hasta la primera sección no
+    retiene un worker que otras codificaciones necesitan; `finish` arranca
+    el pipeline si nadie lo hizo.
+    """
+
+    _DONE = object()
+
+    def __init__(
+        self,
+        output_path: str,
+        render: Optional[Callable[[str, str], "object"]] = None,
+        fps: float = 0.2,
+        frames_per_slide: int = 1,
+        workers: Optional["MediaWorkers"] = None,
+        previews_dir: Optional[str] = None
+    ):
+        self.output_path = output_path
+        self.render = render
+        self.fps = fps
+        self.frames_per_slide = frames_per_slide
+        self.workers = workers
+        self.previews_dir = previews_dir
+        self.previews: Optional[Dict] = None
+        self.slides = 0
+        self.render_ms = 0.0
+        self._previews: Optional[PreviewBuilder] = None
+        self._queue: Optional["Queue"] = None
+        self._started = False
+        self._writer = None
+        self._thread: Optional[threading.Thread] = None
+        self._future: Optional[Future] = None
+        self._error: Optional[BaseException] = None
+
+    def _items(self) -> "Queue":
+        if self._queue is None:
+            self._queue = self.workers.queue() if self.workers is not None else Queue()
+        return self._queue
+
+    @property
+    def started(self) -> bool:
+        return self._started
+
+    def start(self):
+        """Ocupa el worker (o el hilo) y empieza a codificar; idempotente"""
+        if self._started:
+            return
+        self._started = True
+        self._items()
+        if self.workers is not None:
+            self._future = self.workers.submit(
+                encode_slide_stream, self._queue, self.output_path,
+                self.fps, self.frames_per_slide, self.workers.encode_threads, self.previews_dir
+            )
+            return
+
+        import imageio
+
+        self._writer = imageio.get_writer(self.output_path, fps=self.fps)
+        if self.previews_dir:
+            self._previews = PreviewBuilder(self.previews_dir)
+        self._thread = threading.Thread(target=self._run, name="video-pipeline", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is self._DONE:
+                return
+            if self._error is not None:
+                continue
+            kind, text = item
+            try:
+                start = time.perf_counter()
+                # Directo de PIL al encoder, sin pasar por PNG en disco
+                img = self.render(kind, text)
+                frame = np.asarray(img)
+                for _ in range(self.frames_per_slide):
+                    self._writer.append_data(frame)
+                if self._previews is not None:
+                    self._previews.add(img, self.frames_per_slide / self.fps)
+                self.slides += 1
+                self.render_ms += (time.perf_counter() - start) * 1000
+            except BaseException as e:
+                self._error = e
+
+    def add(self, kind: str, text: str):
+        self._items().put((kind, text))
+
+    def finish(self) -> int:
+        """Espera a que se escriban todas las slides y cierra el video"""
+        self.start()
+        if self._future is not None:
+            self._queue.put(STREAM_END)
+            result = self._future.result()
+            self.slides, self.render_ms = result["slides"], result["render_ms"]
+            self.previews = result["previews"]
+            return self.slides
+
+        self._queue.put(self._DONE)
+        self._thread.join()
+        self._writer.close()
+        if self._error is not None:
+            if self._previews is not None:
+                self._previews.abort()
+            raise self._error
+        if self._previews is not None:
+            self.previews = self._previews.finish()
+        return self.slides
+
+    def abort(self):
+        """Detiene el pipeline tras un error de generación"""
+        if not self._started:
+            return
+        if self._future is not None:
+            self._queue.put(None)
+            try:
+                self._future.result()
+            except Exception:
+                pass
+            return
+
+        self._queue.put(self._DONE)
+        if self._thread is not None:
+            self._thread.join()
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except Exception:
+                pass
+        if self._previews is not None:
+            self._previews.abort()
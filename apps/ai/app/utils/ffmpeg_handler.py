@@ -1,12 +1,20 @@
+import asyncio
 import subprocess
 import logging
 from pathlib import Path
 from typing import List
 
+from app.utils.ffmpeg_runner import ffmpeg_runner
+
 logger = logging.getLogger(__name__)
 
 class FFmpegHandler:
-    """Maneja todas las operaciones de FFmpeg"""
+    """
+    Maneja todas las operaciones de FFmpeg
+    
+    Las operaciones de codificación son asíncronas y pasan por `ffmpeg_runner`
+    (progreso, límites de tiempo, cancelación y concurrencia acotada).
+    """
     
     @staticmethod
     def check_ffmpeg_installed() -> bool:
@@ -39,16 +47,19 @@ class FFmpegHandler:
             return 0
     
     @staticmethod
-    def concat_videos(video_list: List[str], output_file: str):
+    async def concat_videos(video_list: List[str], output_file: str):
         """Concatena múltiples videos"""
-        concat_file = Path("concat_list.txt")
+        concat_file = Path(f"{output_file}.concat_list.txt")
         
         with open(concat_file, 'w') as f:
             for video in video_list:
                 f.write(f"file '{Path(video).absolute()}'\n")
         
-        cmd = [
-            "ffmpeg",
+        durations = await asyncio.gather(*(
+            asyncio.to_thread(FFmpegHandler.get_video_duration, video) for video in video_list
+        ))
+        
+        args = [
             "-f", "concat",
             "-safe", "0",
             "-i", str(concat_file),
@@ -57,14 +68,16 @@ class FFmpegHandler:
             "-y"
         ]
         
-        subprocess.run(cmd, check=True, capture_output=True)
-        concat_file.unlink()
+        try:
+            await ffmpeg_runner.run(args, duration=sum(durations))
+        finally:
+            concat_file.unlink()
     
     @staticmethod
-    def add_audio_to_video(video_file: str, audio_file: str, output_file: str):
+    async def add_audio_to_video(video_file: str, audio_file: str, output_file: str):
         """Añade audio a video"""
-        cmd = [
-            "ffmpeg",
+        duration = await asyncio.to_thread(FFmpegHandler.get_video_duration, video_file)
+        args = [
             "-i", video_file,
             "-i", audio_file,
             "-c:v", "copy",
@@ -75,13 +88,13 @@ class FFmpegHandler:
             "-y"
         ]
         
-        subprocess.run(cmd, check=True, capture_output=True)
+        await ffmpeg_runner.run(args, duration=duration)
     
     @staticmethod
-    def compress_video(input_file: str, output_file: str, crf: int = 23):
+    async def compress_video(input_file: str, output_file: str, crf: int = 23):
         """Comprime video para reducir tamaño"""
-        cmd = [
-            "ffmpeg",
+        duration = await asyncio.to_thread(FFmpegHandler.get_video_duration, input_file)
+        args = [
             "-i", input_file,
             "-c:v", "libx264",
             "-crf", str(crf),
@@ -92,4 +105,4 @@ class FFmpegHandler:
             "-y"
         ]
         
-        subprocess.run(cmd, check=True, capture_output=True)
\ No newline at end of file
+        await ffmpeg_runner.run(args, duration=duration)
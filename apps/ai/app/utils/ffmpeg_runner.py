@@ -0,0 +1,292 @@
+from collections import OrderedDict, deque
+from functools import partial
+from typing import Callable, Deque, Dict, List, Optional
+import asyncio
+import itertools
+import os
+import signal
+import time
+import logging
+
+from app.config import settings
+from app.services.media_workers import apply_worker_limits, parse_cpus
+from app.services.profiling import spans
+
+logger = logging.getLogger(__name__)
+
+
+class FFmpegError(RuntimeError):
+    """FFmpeg terminó con error; incluye las últimas líneas de stderr"""
+
+    def __init__(self, message: str, returncode: Optional[int] = None, stderr: str = ""):
+        super().__init__(f"{message}\n{stderr}" if stderr else message)
+        self.returncode = returncode
+        self.stderr = stderr
+
+
+class FFmpegTimeout(FFmpegError):
+    """Superado el tiempo total o sin reportar progreso durante `stall_timeout`"""
+
+
+class FFmpegJob:
+    """Estado de una ejecución de FFmpeg"""
+
+    def __init__(self, job_id: str, duration: Optional[float]):
+        self.id = job_id
+        self.duration = duration
+        self.status = "queued"  # queued, running, completed, failed, cancelled
+        self.progress = 0.0
+        self.out_time = 0.0
+        self.speed: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created = time.monotonic()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.last_advance = self.created
+        self.task: Optional[asyncio.Task] = None
+
+    def snapshot(self) -> Dict:
+        end = self.finished or time.monotonic()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": round(self.progress, 1),
+            "out_time": round(self.out_time, 2),
+            "speed": self.speed,
+            "error": self.error,
+            "queued_seconds": round((self.started or end) - self.created, 2),
+            "elapsed_seconds": round(end - self.started, 2) if self.started else 0.0,
+        }
+
+
+class FFmpegRunner:
+    """
+    Ejecuta FFmpeg como subproceso asíncrono.
+
+    - Lee `-progress pipe:1` y traduce `out_time` a porcentaje con la
+      duración esperada de la salida.
+    - stderr se consume en vivo y solo se guardan las últimas líneas.
+    - Límite de tiempo total y de estancamiento (sin bloques de progreso).
+    - Cancelar la tarea (o `cancel(job_id)`) mata el grupo de procesos.
+    - Un semáforo limita las codificaciones simultáneas para no saturar
+      los núcleos (libx264 ya usa todos los hilos disponibles).
+    """
+
+    # Cada cuánto se comprueban los límites de tiempo
+    POLL_INTERVAL = 0.5
+
+    def __init__(
+        self,
+        binary: str = "ffmpeg",
+        max_concurrent: int = 2,
+        timeout: float = 1800.0,
+        stall_timeout: float = 60.0,
+        stderr_lines: int = 40,
+        max_jobs: int = 200,
+        nice: int = 0,
+        cpus: Optional[List[int]] = None
+    ):
+        self.binary = binary
+        self.max_concurrent = max(1, max_concurrent)
+        self.timeout = timeout
+        self.stall_timeout = stall_timeout
+        self.stderr_lines = stderr_lines
+        self.max_jobs = max_jobs
+        self.nice = nice
+        self.cpus = cpus
+        self.jobs: "OrderedDict[str, FFmpegJob]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _slots(self) -> asyncio.Semaphore:
+        # El semáforo pertenece a un event loop; se recrea si cambia (scripts con asyncio.run)
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+            self._loop = loop
+        return self._semaphore
+
+    def _register(self, job_id: Optional[str], duration: Optional[float]) -> FFmpegJob:
+        job = FFmpegJob(job_id or f"ffmpeg-{next(self._ids)}", duration)
+        self.jobs[job.id] = job
+        self.jobs.move_to_end(job.id)
+        while len(self.jobs) > self.max_jobs:
+            oldest = next(iter(self.jobs.values()))
+            if oldest.status in ("queued", "running"):
+                break
+            self.jobs.popitem(last=False)
+        return job
+
+    async def run(
+        self,
+        args: List[str],
+        duration: Optional[float] = None,
+        job_id: Optional[str] = None,
+        timeout: Optional[float] = None,
+        stall_timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[float], None]] = None
+    ) -> FFmpegJob:
+        """
+        Ejecuta `ffmpeg <args>` y espera a que termine.
+
+        Args:
+            args: Argumentos de FFmpeg (sin el binario)
+            duration: Duración esperada de la salida en segundos (para el %)
+            on_progress: Se llama con el porcentaje cada vez que avanza
+
+        Raises:
+            FFmpegError, FFmpegTimeout, asyncio.CancelledError
+        """
+        job = self._register(job_id, duration)
+        job.task = asyncio.current_task()
+        timeout = timeout or self.timeout
+        stall_timeout = stall_timeout or self.stall_timeout
+        slots = self._slots()
+        try:
+            with spans.span("ffmpeg.queue"):
+                await slots.acquire()
+            try:
+                with spans.span("ffmpeg"):
+                    return await self._execute(job, args, timeout, stall_timeout, on_progress)
+            finally:
+                slots.release()
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            job.finished = time.monotonic()
+            raise
+
+    async def _execute(self, job: FFmpegJob, args: List[str], timeout: float,
+                       stall_timeout: float, on_progress) -> FFmpegJob:
+        job.status = "running"
+        job.started = job.last_advance = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            self.binary, "-hide_banner", "-nostats", "-progress", "pipe:1", *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            # Grupo de procesos propio para poder matar todo el árbol
+            start_new_session=True,
+            # Misma prioridad y afinidad que los workers de medios
+            preexec_fn=partial(apply_worker_limits, self.nice, self.cpus) if self.nice or self.cpus else None
+        )
+        stderr: Deque[str] = deque(maxlen=self.stderr_lines)
+        readers = asyncio.gather(
+            self._read_progress(proc.stdout, job, on_progress),
+            self._read_stderr(proc.stderr, stderr)
+        )
+        # Se cancelan si FFmpeg falla; su resultado no interesa
+        readers.add_done_callback(lambda f: f.cancelled() or f.exception())
+        wait = asyncio.ensure_future(proc.wait())
+        try:
+            while True:
+                done, _ = await asyncio.wait({wait}, timeout=self.POLL_INTERVAL)
+                if done:
+                    break
+                now = time.monotonic()
+                if now - job.started > timeout:
+                    raise FFmpegTimeout(f"FFmpeg superó {timeout:g}s", stderr="\n".join(stderr))
+                if now - job.last_advance > stall_timeout:
+                    raise FFmpegTimeout(
+                        f"FFmpeg sin reportar progreso durante {stall_timeout:g}s", stderr="\n".join(stderr)
+                    )
+            await readers
+        except BaseException as e:
+            await self._kill(proc)
+            readers.cancel()
+            wait.cancel()
+            job.finished = time.monotonic()
+            if not isinstance(e, asyncio.CancelledError):
+                job.status = "failed"
+                job.error = str(e).splitlines()[0]
+                logger.error(f"[FFMPEG] {job.id}: {job.error}")
+            raise
+
+        job.finished = time.monotonic()
+        if proc.returncode != 0:
+            job.status = "failed"
+            job.error = f"FFmpeg salió con código {proc.returncode}"
+            raise FFmpegError(job.error, returncode=proc.returncode, stderr="\n".join(stderr))
+
+        job.status = "completed"
+        job.progress = 100.0
+        if on_progress:
+            on_progress(job.progress)
+        logger.info(f"[FFMPEG] {job.id} completado en {job.finished - job.started:.1f}s")
+        return job
+
+    @staticmethod
+    async def _read_progress(stream: asyncio.StreamReader, job: FFmpegJob, on_progress):
+        """
+        Bloques clave=valor de `-progress`.
+        
+        FFmpeg solo emite bloques mientras procesa paquetes (una entrada
+        bloqueada no los produce), así que cada bloque cuenta como actividad
+        aunque `out_time` no avance (p. ej. durante el lookahead de x264).
+        """
+        async for raw in stream:
+            key, _, value = raw.decode(errors="replace").strip().partition("=")
+            if key == "progress":
+                job.last_advance = time.monotonic()
+            elif key in ("out_time_us", "out_time_ms"):
+                # out_time_ms también está en microsegundos (bug histórico de FFmpeg)
+                try:
+                    out_time = int(value) / 1_000_000
+                except ValueError:
+                    continue
+                if out_time > job.out_time:
+                    job.out_time = out_time
+                    if job.duration:
+                        job.progress = min(99.9, 100.0 * out_time / job.duration)
+                        if on_progress:
+                            on_progress(job.progress)
+            elif key == "speed":
+                job.speed = value
+
+    @staticmethod
+    async def _read_stderr(stream: asyncio.StreamReader, tail: Deque[str]):
+        async for raw in stream:
+            tail.append(raw.decode(errors="replace").rstrip())
+
+    @staticmethod
+    async def _kill(proc: asyncio.subprocess.Process):
+        if proc.returncode is not None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+        await proc.wait()
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancela un trabajo en cola o en ejecución"""
+        job = self.jobs.get(job_id)
+        if job is None or job.task is None or job.status not in ("queued", "running"):
+            return False
+        job.task.cancel()
+        return True
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        job = self.jobs.get(job_id)
+        return job.snapshot() if job else None
+
+    def stats(self) -> Dict:
+        by_status: Dict[str, int] = {}
+        for job in self.jobs.values():
+            by_status[job.status] = by_status.get(job.status, 0) + 1
+        return {
+            "max_concurrent": self.max_concurrent,
+            "timeout": self.timeout,
+            "stall_timeout": self.stall_timeout,
+            "jobs": by_status,
+            "active": [j.snapshot() for j in self.jobs.values() if j.status in ("queued", "running")],
+        }
+
+
+ffmpeg_runner = FFmpegRunner(
+    max_concurrent=settings.ffmpeg_max_concurrent,
+    timeout=settings.ffmpeg_timeout_seconds,
+    stall_timeout=settings.ffmpeg_stall_seconds,
+    nice=settings.media_worker_nice,
+    cpus=parse_cpus(settings.media_worker_cpus)
+)
@@ -32,3 +32,18 @@ def is_past_date(date_str: str) -> bool:
         return date < datetime.now()
     except ValueError:
         return False
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimación rápida de tokens sin cargar un tokenizer
+    
+    Args:
+        text: Texto a medir
+        
+    Returns:
+        int: Número aproximado de tokens (~4 caracteres por token)
+    """
+    if not text:
+        return 0
+    return max(1, len(text) // 4)
@@ -0,0 +1,111 @@
+"""
+Pico de memoria al guardar una imagen de la respuesta de txt2img.
+
+Genera una respuesta sintética de Stable Diffusion (PNG 1920x1080 en base64
+más `parameters` e `info`) y, en un proceso nuevo por modo, mide el pico de
+RSS por encima de la base tras las importaciones:
+
+- legacy: `response.json()` + `b64decode` + `BytesIO` + decode/encode de PIL
+- streaming: `save_streamed_image` leyendo la respuesta en bloques de 64 KB
+
+Uso:
+    python scripts/bench_sd_decode.py --width 1920 --height 1080
+"""
+from pathlib import Path
+import argparse
+import base64
+import io
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+CHUNK = 64 * 1024
+
+
+def make_response(path: Path, width: int, height: int):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.effect_noise((width, height), 40).convert("RGB").save(buffer, format="PNG")
+    body = {
+        "images": [base64.b64encode(buffer.getvalue()).decode()],
+        "parameters": {"steps": 20, "width": width, "height": height},
+        "info": json.dumps({"seed": 1234}),
+    }
+    path.write_text(json.dumps(body))
+
+
+def _status_kb(field: str) -> int:
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    raise KeyError(field)
+
+
+def reset_peak() -> int:
+    """Reinicia el pico de RSS (Linux) y retorna el RSS actual en KB"""
+    # ru_maxrss se hereda del proceso padre a través de exec; VmHWM no
+    with open("/proc/self/clear_refs", "w") as f:
+        f.write("5")
+    return _status_kb("VmRSS:")
+
+
+def peak_kb() -> int:
+    return _status_kb("VmHWM:")
+
+
+def run_mode(mode: str, response_path: Path, output: Path):
+    from PIL import Image
+    from app.services.sd_decode import save_streamed_image
+
+    base = reset_peak()
+    start = time.perf_counter()
+    if mode == "legacy":
+        # requests guarda el cuerpo completo en `response.content`
+        content = response_path.read_bytes()
+        result = json.loads(content)
+        img = Image.open(io.BytesIO(base64.b64decode(result["images"][0])))
+        img.save(output)
+    else:
+        with open(response_path, "rb") as f:
+            save_streamed_image(iter(lambda: f.read(CHUNK), b""), output)
+    elapsed = (time.perf_counter() - start) * 1000
+    print(json.dumps({"mode": mode, "peak_rss_mb": round((peak_kb() - base) / 1024, 1),
+                      "ms": round(elapsed, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de memoria del guardado de imágenes de SD")
+    parser.add_argument("--width", type=int, default=1920)
+    parser.add_argument("--height", type=int, default=1080)
+    parser.add_argument("--mode", choices=["legacy", "streaming"], help=argparse.SUPPRESS)
+    parser.add_argument("--response", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        if args.mode:
+            run_mode(args.mode, args.response, tmp / "scene.png")
+            return
+
+        response_path = tmp / "response.json"
+        make_response(response_path, args.width, args.height)
+        print(f"Respuesta: {response_path.stat().st_size / 1024 ** 2:.1f} MB "
+              f"({args.width}x{args.height})")
+        for mode in ("legacy", "streaming"):
+            # Un proceso por modo para que el pico de RSS no se contamine
+            out = subprocess.run(
+                [sys.executable, __file__, "--mode", mode, "--response", str(response_path)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(out)
+            print(f"  {mode:<10} pico RSS +{result['peak_rss_mb']} MB  {result['ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Latencia de búsqueda del índice vectorial de la caché semántica.
+
+Llena un `VectorIndex` con vectores aleatorios de la dimensión del modelo
+de embeddings y mide búsquedas en un ámbito grande (todas las entradas en
+un mismo usuario, el peor caso) y en ámbitos por usuario.
+
+Uso:
+    python scripts/bench_semantic_cache.py --entries 100000 --dim 768
+"""
+from pathlib import Path
+import argparse
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.vector_index import VectorIndex  # noqa: E402
+
+
+def measure(index: VectorIndex, queries: np.ndarray, scopes) -> dict:
+    timings = []
+    for query, scope in zip(queries, scopes):
+        start = time.perf_counter()
+        index.search(query, scope=scope, k=1, threshold=0.95)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings = np.array(timings)
+    return {
+        "p50_ms": round(float(np.percentile(timings, 50)), 3),
+        "p99_ms": round(float(np.percentile(timings, 99)), 3),
+        "max_ms": round(float(timings.max()), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del índice de la caché semántica")
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=768, help="nomic-embed-text = 768")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = rng.standard_normal((args.entries, args.dim), dtype=np.float32)
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+
+    for label, scope_of in [
+        ("un solo ámbito", lambda i: ""),
+        (f"{args.users} usuarios", lambda i: f"user-{i % args.users}"),
+    ]:
+        index = VectorIndex(max_entries=args.entries)
+        start = time.perf_counter()
+        for i, vector in enumerate(vectors):
+            index.add(vector, i, scope=scope_of(i))
+        insert_s = time.perf_counter() - start
+
+        scopes = [scope_of(i) for i in range(args.queries)]
+        result = measure(index, queries, scopes)
+        print(
+            f"[BENCH] {args.entries} entradas dim={args.dim} ({label}): "
+            f"inserción {insert_s / args.entries * 1e6:.1f} µs/entrada, búsqueda {result}"
+        )
+
+    # Índice lleno: cada inserción expulsa la entrada menos usada
+    start = time.perf_counter()
+    for vector in queries:
+        index.add(vector, None, scope="nuevo")
+    print(f"[BENCH] Inserción con expulsión: {(time.perf_counter() - start) / args.queries * 1000:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Coste de serializar una `ReconstructionResponse` y bytes enviados.
+
+Compara el camino por defecto de FastAPI (`jsonable_encoder` + `json`),
+orjson sobre `model_dump()` y `model_dump_json` de pydantic-core, y el
+tamaño de la respuesta sin comprimir, en gzip y en brotli (si está
+instalado) con los niveles que usa el middleware.
+
+Uso:
+    python scripts/bench_serialization.py --narrative-kb 30 --thinking-kb 20
+"""
+from pathlib import Path
+import argparse
+import json
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+
+from app.models.capsule import ReconstructionResponse  # noqa: E402
+from app.services.compression import _Encoder, brotli  # noqa: E402
+from app.services.serialization import model_json, orjson  # noqa: E402
+
+WORDS = (
+    "mañana café reunión caminé parque llamé mamá revisé correos almorcé "
+    "compañeros tarde música canción árbol lluvia ciudad noche película "
+    "decisión energía pensé corazón día después también así más está"
+).split()
+
+
+def spanish_text(kb: int, rng: random.Random) -> str:
+    words, size = [], 0
+    while size < kb * 1024:
+        word = rng.choice(WORDS)
+        words.append(word)
+        size += len(word.encode("utf-8")) + 1
+    return " ".join(words)
+
+
+def timed(fn, runs: int) -> float:
+    start = time.perf_counter()
+    for _ in range(runs):
+        fn()
+    return (time.perf_counter() - start) / runs * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de serialización y compresión")
+    parser.add_argument("--narrative-kb", type=int, default=30)
+    parser.add_argument("--thinking-kb", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    response = ReconstructionResponse(
+        reconstruction_id="f" * 32,
+        date="2024-05-17",
+        reconstructed_narrative=spanish_text(args.narrative_kb, rng),
+        thinking_process=spanish_text(args.thinking_kb, rng),
+        key_insights=[spanish_text(1, rng)[:200] for _ in range(5)],
+        confidence_score=0.87,
+        prompt_eval={"prompt_eval_count": 812, "prompt_eval_ms": 640.2},
+    )
+
+    def fastapi_default() -> bytes:
+        # serialize_response + JSONResponse.render
+        return json.dumps(
+            jsonable_encoder(response), ensure_ascii=False, allow_nan=False,
+            indent=None, separators=(",", ":")
+        ).encode("utf-8")
+
+    candidates = [("fastapi (jsonable_encoder + json)", fastapi_default)]
+    if orjson is not None:
+        candidates.append(("orjson(model_dump())", lambda: orjson.dumps(response.model_dump())))
+    candidates.append(("model_dump_json", lambda: response.model_dump_json().encode("utf-8")))
+
+    print(f"Serialización ({args.runs} repeticiones)")
+    baseline = None
+    for label, fn in candidates:
+        ms = timed(fn, args.runs)
+        baseline = baseline or ms
+        print(f"  {label:<36} {ms:7.3f} ms  x{baseline / ms:5.1f}")
+
+    body = model_json(response)
+    escaped = len(json.dumps(jsonable_encoder(response)).encode("utf-8"))
+    print("\nBytes en la red")
+    print(f"  {'json con ensure_ascii (escapes)':<36} {escaped:8d}")
+    print(f"  {'UTF-8 sin comprimir':<36} {len(body):8d}")
+
+    codings = [("gzip", 6)] + ([("br", 5)] if brotli is not None else [])
+    for coding, level in codings:
+        def compress():
+            encoder = _Encoder(coding, level, level)
+            return encoder.compress(body, flush=False) + encoder.finish()
+
+        data = compress()
+        ms = timed(compress, max(1, args.runs // 3))
+        print(f"  {coding + ' ' + str(level):<36} {len(data):8d}  ({len(data) / len(body):.1%}, {ms:.2f} ms)")
+    if brotli is None:
+        print("  br: no disponible (pip install Brotli)")
+
+
+if __name__ == "__main__":
+    main()
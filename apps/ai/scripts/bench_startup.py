@@ -0,0 +1,144 @@
+"""
+Arranque en frío: coste de importar `app.main` y tiempo hasta la primera
+petición servida.
+
+1. Ejecuta `python -X importtime -c "import app.main"` en un proceso nuevo
+   y lista los módulos con más tiempo acumulado (el total es el de
+   `app.main`). Sirve para detectar imports pesados que se cuelan en el
+   arranque en vez de pasar por `lazy_modules`.
+2. Lanza uvicorn y mide, desde el lanzamiento del proceso, cuándo `/livez`
+   responde 200 (primera petición servida) y cuándo termina el warm-up
+   (`warmup.done` en `/metrics/runtime`).
+
+Sale con código 1 si se supera algún presupuesto, para usarlo en CI.
+
+Uso:
+    python scripts/bench_startup.py --import-budget-ms 1200 --first-request-budget-ms 3000
+"""
+from pathlib import Path
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def import_times(module: str):
+    """(módulo, propio µs, acumulado µs) de cada import, en orden de aparición"""
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"No se pudo importar {module}:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:      1974 |     441048 |         fastapi.params"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get_json(url: str, timeout: float = 1.0):
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        return response.status, json.loads(response.read() or b"null")
+
+
+def measure_server(timeout: float):
+    """(ms hasta /livez 200, ms hasta warm-up completo o None, estado del warm-up)"""
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "PYTHONPATH": str(ROOT)}
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    first_request = warmed = None
+    warmup = {}
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                sys.exit(f"uvicorn terminó con código {server.returncode}")
+            try:
+                if first_request is None:
+                    status, _ = get_json(f"{base}/livez")
+                    if status == 200:
+                        first_request = (time.perf_counter() - start) * 1000
+                _, runtime = get_json(f"{base}/metrics/runtime")
+                warmup = runtime.get("warmup", {})
+                if warmup.get("done"):
+                    warmed = (time.perf_counter() - start) * 1000
+                    break
+            except (urllib.error.URLError, ConnectionError, TimeoutError):
+                pass
+            time.sleep(0.02)
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+    return first_request, warmed, warmup
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque en frío")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--import-budget-ms", type=float, default=1200)
+    parser.add_argument("--first-request-budget-ms", type=float, default=3000)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--skip-server", action="store_true", help="Solo el informe de imports")
+    args = parser.parse_args()
+
+    over_budget = []
+
+    rows = import_times(args.module)
+    total_ms = next(cum for name, _, cum in rows if name == args.module) / 1000
+    print(f"Imports de {args.module} (-X importtime, top {args.top} por tiempo acumulado)")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:args.top]:
+        print(f"  {name:<48} {cumulative_us / 1000:8.1f} ms  (propio {self_us / 1000:6.1f} ms)")
+    print(f"  {'TOTAL':<48} {total_ms:8.1f} ms  (presupuesto {args.import_budget_ms:g} ms)")
+    if total_ms > args.import_budget_ms:
+        over_budget.append("import")
+
+    if not args.skip_server:
+        first_request, warmed, warmup = measure_server(args.timeout)
+        print("\nArranque del servidor (desde el lanzamiento del proceso)")
+        if first_request is None:
+            print(f"  /livez no respondió en {args.timeout:g}s")
+            over_budget.append("first_request")
+        else:
+            print(f"  primera petición (/livez 200)  {first_request:8.1f} ms  (presupuesto {args.first_request_budget_ms:g} ms)")
+            if first_request > args.first_request_budget_ms:
+                over_budget.append("first_request")
+        if warmed is not None:
+            print(f"  warm-up completo               {warmed:8.1f} ms")
+            for step, result in warmup.get("steps", {}).items():
+                print(f"    {step:<28} {result.get('ms', '-')!s:>8} ms  {'ok' if result.get('ok') else result.get('error')}")
+        else:
+            print(f"  warm-up sin completar: {warmup or 'desactivado o sin datos'}")
+
+    if over_budget:
+        print(f"\nFuera de presupuesto: {', '.join(over_budget)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Comprueba la cobertura (hedging) del pool contra scripts/ollama_stub.py.
+
+Levanta dos stubs, el primero lento (`--slow-ports`), y hace una
+generación con cobertura a través del gateway: la petición de cobertura
+debe ir al otro puerto y ganar, la lenta debe cancelarse y el hueco del
+gateway solo se libera cuando la lenta ha terminado.
+
+Uso:
+    python scripts/check_hedging.py --ports 11545 11546
+"""
+from pathlib import Path
+import argparse
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.services.llm_gateway import LLMGateway  # noqa: E402
+from app.services.ollama_pool import OllamaPool  # noqa: E402
+
+
+def wait_until(condition, timeout: float) -> bool:
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Comprobación de la cobertura del pool de Ollama")
+    parser.add_argument("--ports", type=int, nargs=2, default=[11545, 11546])
+    parser.add_argument("--delay", type=float, default=0.3)
+    args = parser.parse_args()
+    slow, fast = args.ports
+
+    stub = subprocess.Popen([
+        sys.executable, str(Path(__file__).with_name("ollama_stub.py")),
+        "--ports", str(slow), str(fast), "--delay", str(args.delay), "--slow-ports", str(slow)
+    ], stdout=subprocess.DEVNULL)
+    try:
+        pool = OllamaPool([f"http://127.0.0.1:{slow}", f"http://127.0.0.1:{fast}"],
+                          eject_after=1000, hedge_after=args.delay * 1.5)
+        if not wait_until(lambda: (pool.probe_all() or pool.probed_healthy() == 2), 10):
+            sys.exit("Los stubs no responden")
+        gateway = LLMGateway(pool, max_concurrency=1)
+
+        # Sin modelo cargado en ningún nodo, el primario va al primero (el lento)
+        start = time.perf_counter()
+        result = gateway.generate({"model": "deepseek-r1:8b", "prompt": "hola"}, timeout=30, hedge=True)
+        elapsed = time.perf_counter() - start
+        status = pool.status()
+        winner = result["response"].split("]")[0].removeprefix("[stub:")
+
+        checks = [
+            (f"la respuesta viene del puerto rápido ({winner})", winner == str(fast)),
+            ("se lanzó una cobertura y ganó", status["hedged_requests"] == 1 and status["hedge_wins"] == 1),
+            (f"respuesta antes que el nodo lento ({elapsed:.2f}s)", elapsed < args.delay * 5),
+            ("el hueco del gateway sigue ocupado por la perdedora", gateway.stats()["in_flight"] == 1),
+            ("la perdedora termina y libera gateway y nodo", wait_until(
+                lambda: gateway.stats()["in_flight"] == 0
+                and all(n["outstanding"] == 0 for n in pool.status()["nodes"]), args.delay * 10
+            )),
+        ]
+        for label, ok in checks:
+            print(f"  [{'OK' if ok else 'FALLO'}] {label}")
+        if not all(ok for _, ok in checks):
+            sys.exit(1)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Servidores Ollama de prueba para el pool de nodos.
+
+Levanta un stub por puerto que responde /api/tags, /api/ps y /api/generate
+(con y sin streaming) con un retardo configurable.
+
+Uso:
+    python scripts/ollama_stub.py --ports 11435 11436 11437 --delay 0.5 --slow-ports 11435
+
+    OLLAMA_ENDPOINTS=http://localhost:11435,http://localhost:11436,http://localhost:11437 \\
+        uvicorn app.main:app --port 8000
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+import argparse
+import json
+import threading
+import time
+
+
+def make_handler(port: int, models, delay: float, slow_ports):
+    loaded = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _json(self, data, status=200):
+            body = json.dumps(data).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/api/tags":
+                self._json({"models": [{"name": m} for m in models]})
+            elif self.path == "/api/ps":
+                self._json({"models": [
+                    {"name": m, "model": m, "expires_at": expires}
+                    for m, expires in loaded.items()
+                ]})
+            else:
+                self._json({"error": "not found"}, 404)
+
+        def do_POST(self):
+            if self.path != "/api/generate":
+                self._json({"error": "not found"}, 404)
+                return
+
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            model = payload.get("model", "")
+            cold = model not in loaded
+            loaded.clear()
+            loaded[model] = (datetime.now() + timedelta(minutes=5)).isoformat()
+
+            wait = delay * (5 if port in slow_ports else 1) + (delay if cold else 0)
+            time.sleep(wait)
+
+            text = f"[stub:{port}] {model}\n- insight de prueba desde el puerto {port}"
+            final = {
+                "model": model,
+                "done": True,
+                "context": [1, 2, 3],
+                "load_duration": int((delay if cold else 0) * 1e9),
+                "prompt_eval_count": 100,
+                "prompt_eval_duration": 50_000_000,
+            }
+
+            if not payload.get("stream", True):
+                self._json({**final, "response": text})
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.end_headers()
+            for word in text.split(" "):
+                chunk = {"model": model, "response": word + " ", "done": False}
+                self.wfile.write((json.dumps(chunk) + "\n").encode("utf-8"))
+                self.wfile.flush()
+            self.wfile.write((json.dumps({**final, "response": ""}) + "\n").encode("utf-8"))
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stubs de Ollama para pruebas locales")
+    parser.add_argument("--ports", type=int, nargs="+", default=[11435, 11436])
+    parser.add_argument("--models", nargs="+", default=["deepseek-r1:8b", "mistral:latest"])
+    parser.add_argument("--delay", type=float, default=0.2, help="Segundos por generación")
+    parser.add_argument("--slow-ports", "--slow", dest="slow", type=int, nargs="*", default=[],
+                        help="Puertos 5x más lentos")
+    args = parser.parse_args()
+
+    servers = []
+    for port in args.ports:
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", port),
+            make_handler(port, args.models, args.delay, set(args.slow))
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        print(f"[STUB] Ollama de prueba en http://127.0.0.1:{port}")
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        for server in servers:
+            server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+from pathlib import Path
+import sys
+
+# Los tests importan `app.*` igual que uvicorn (raíz en apps/ai)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,91 @@
+import threading
+
+from app.models.capsule import CapsuleData, DayEvent, ReconstructionRequest
+from app.services.batch import iter_batch_reconstructions
+from app.services.cache import ReconstructionCache
+
+
+def capsule(date="2024-05-01", description="Reunión con el equipo"):
+    return CapsuleData(
+        date=date,
+        events=[DayEvent(time="09:00", description=description)],
+        mood_notes="tranquilo",
+        key_memories=["café"]
+    )
+
+
+def request(**overrides):
+    return ReconstructionRequest(capsule_data=overrides.pop("capsule_data", capsule()), **overrides)
+
+
+def test_make_key_is_stable():
+    assert ReconstructionCache.make_key(request()) == ReconstructionCache.make_key(request())
+
+
+def test_make_key_ignores_measurement_only_fields():
+    assert (ReconstructionCache.make_key(request(measure_prompt_eval=True))
+            == ReconstructionCache.make_key(request()))
+
+
+def test_make_key_changes_with_options_and_content():
+    base = ReconstructionCache.make_key(request())
+    assert ReconstructionCache.make_key(request(language="en")) != base
+    assert ReconstructionCache.make_key(request(reasoning_enabled=False)) != base
+    assert ReconstructionCache.make_key(request(capsule_data=capsule(description="Gimnasio"))) != base
+
+
+def test_lru_evicts_oldest():
+    cache = ReconstructionCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+
+def run_batch(requests, cache, reconstruct, max_concurrency=2):
+    return sorted(
+        iter_batch_reconstructions(requests, reconstruct, cache, max_concurrency=max_concurrency),
+        key=lambda item: item["index"]
+    )
+
+
+def test_batch_reconstructs_duplicates_once():
+    calls = []
+    lock = threading.Lock()
+
+    def reconstruct(req):
+        with lock:
+            calls.append(req.capsule_data.date)
+        return {"date": req.capsule_data.date}
+
+    days = [capsule("2024-05-01"), capsule("2024-05-02"), capsule("2024-05-01"), capsule("2024-05-01")]
+    items = run_batch((request(capsule_data=c) for c in days), ReconstructionCache(), reconstruct)
+
+    assert sorted(calls) == ["2024-05-01", "2024-05-02"]
+    assert [item["status"] for item in items] == ["ok"] * 4
+    assert [item["result"]["date"] for item in items] == [c.date for c in days]
+    # Solo la primera aparición de cada día cuenta como calculada
+    assert sum(not item["cached"] for item in items) == 2
+
+
+def test_batch_serves_cached_without_reconstructing():
+    cache = ReconstructionCache()
+    reqs = [request(capsule_data=capsule("2024-05-01")), request(capsule_data=capsule("2024-05-02"))]
+    run_batch(reqs, cache, lambda req: {"date": req.capsule_data.date})
+
+    def fail(req):
+        raise AssertionError("no debería llamar a Ollama")
+
+    items = run_batch(reqs, cache, fail)
+    assert all(item["status"] == "ok" and item["cached"] for item in items)
+
+
+def test_batch_error_reaches_every_duplicate():
+    def reconstruct(req):
+        raise RuntimeError("Ollama caído")
+
+    items = run_batch([request(), request()], ReconstructionCache(), reconstruct)
+    assert [item["status"] for item in items] == ["error", "error"]
+    assert all(item["error"] == "Ollama caído" for item in items)
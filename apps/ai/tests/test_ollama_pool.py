@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from app.services.ollama_pool import HedgeCancelled, OllamaPool
+
+MODEL = "deepseek-r1:8b"
+
+
+class Settled:
+    """Cuenta las llamadas a `on_settled`"""
+
+    def __init__(self):
+        self.calls = 0
+        self.event = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.calls += 1
+        self.event.set()
+
+
+def pool(**kwargs):
+    return OllamaPool(["http://a:11434", "http://b:11434"], **{"hedge_after": 0.05, **kwargs})
+
+
+def slow_then_fast(slow_url, delay=5.0):
+    """`fn(node, cancel)`: el nodo `slow_url` espera hasta que lo cancelen"""
+    cancelled = threading.Event()
+
+    def fn(node, cancel):
+        if node.url == slow_url:
+            if cancel.wait(delay):
+                cancelled.set()
+                raise HedgeCancelled()
+            return "lento"
+        return node.url
+
+    return fn, cancelled
+
+
+def test_hedge_wins_and_loser_is_cancelled():
+    p = pool()
+    settled = Settled()
+    primary = p.nodes[0].url
+    fn, cancelled = slow_then_fast(primary)
+
+    start = time.monotonic()
+    result = p.call_hedged(MODEL, fn, on_settled=settled)
+
+    assert result == p.nodes[1].url
+    assert time.monotonic() - start < 2
+    assert cancelled.wait(2)
+    assert settled.event.wait(2)
+    time.sleep(0.05)
+    assert settled.calls == 1
+    assert p.hedged == 1 and p.hedge_wins == 1
+    assert all(node.outstanding == 0 for node in p.nodes)
+
+
+def test_settled_waits_for_the_loser():
+    p = pool()
+    settled = Settled()
+    release = threading.Event()
+
+    def fn(node, cancel):
+        if node is p.nodes[0]:
+            # Ignora la cancelación un rato: el hueco no se libera antes
+            release.wait(2)
+            raise HedgeCancelled()
+        return "cobertura"
+
+    assert p.call_hedged(MODEL, fn, on_settled=settled) == "cobertura"
+    assert settled.calls == 0
+    release.set()
+    assert settled.event.wait(2)
+    time.sleep(0.05)
+    assert settled.calls == 1
+
+
+def test_fast_primary_does_not_hedge():
+    p = pool(hedge_after=1.0)
+    settled = Settled()
+    assert p.call_hedged(MODEL, lambda node, cancel: node.url, on_settled=settled) == p.nodes[0].url
+    assert settled.calls == 1
+    assert p.hedged == 0
+
+
+def test_without_hedging_settles_once_even_on_error():
+    p = pool(hedge_after=0)
+    settled = Settled()
+
+    def fn(node, cancel):
+        raise requests.exceptions.ConnectionError("caído")
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        p.call_hedged(MODEL, fn, on_settled=settled)
+    assert settled.calls == 1
+
+
+def test_error_of_both_attempts_is_raised_after_settling():
+    p = pool()
+    settled = Settled()
+
+    def fn(node, cancel):
+        if node is p.nodes[0]:
+            time.sleep(0.2)
+        raise requests.exceptions.ConnectionError(node.url)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        p.call_hedged(MODEL, fn, on_settled=settled)
+    assert settled.calls == 1
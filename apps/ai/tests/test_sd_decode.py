@@ -0,0 +1,67 @@
+import base64
+import io
+import json
+
+import pytest
+from PIL import Image
+
+from app.services.sd_decode import PNG_SIGNATURE, save_streamed_image, write_first_image
+
+
+def png_bytes(color=(200, 30, 30), fmt="PNG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def response(image: bytes, escape_slashes=False) -> bytes:
+    encoded = base64.b64encode(image).decode()
+    body = json.dumps({"images": [encoded, encoded], "parameters": {"seed": 1}, "info": "{}"})
+    if escape_slashes:
+        body = body.replace("/", "\\/")
+    # Claves previas con relleno para que la búsqueda tenga que avanzar
+    return b'{"padding": "' + b"x" * 600 + b'", ' + body[1:].encode()
+
+
+def chunked(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 5, 64, 100000])
+def test_write_first_image_decodes_across_chunk_boundaries(size):
+    image = png_bytes()
+    out = io.BytesIO()
+    written = write_first_image(chunked(response(image), size), out)
+    assert out.getvalue() == image
+    assert written == len(image)
+
+
+def test_write_first_image_drops_json_escapes():
+    # Base64 con '/' escapado como '\/' en el JSON
+    image = bytes(range(256)) * 4
+    assert b"/" in base64.b64encode(image)
+    out = io.BytesIO()
+    write_first_image(chunked(response(image, escape_slashes=True), 7), out)
+    assert out.getvalue() == image
+
+
+def test_write_first_image_without_images_raises():
+    with pytest.raises(ValueError):
+        write_first_image(chunked(b'{"error": "OOM", "images": []}', 4), io.BytesIO())
+
+
+def test_save_streamed_image_keeps_png(tmp_path):
+    image = png_bytes()
+    destination = save_streamed_image(chunked(response(image), 11), tmp_path / "scene.png")
+    assert destination.read_bytes() == image
+    assert list(tmp_path.iterdir()) == [destination]
+
+
+def test_save_streamed_image_converts_other_formats(tmp_path):
+    destination = save_streamed_image(
+        chunked(response(png_bytes(fmt="JPEG")), 13), tmp_path / "scene.png"
+    )
+    assert destination.read_bytes().startswith(PNG_SIGNATURE)
+    with Image.open(destination) as img:
+        assert img.size == (8, 8)
+    assert list(tmp_path.iterdir()) == [destination]
@@ -0,0 +1,49 @@
+import json
+
+import pytest
+
+from app.services.structured import JsonArrayItemScanner
+
+DOC = json.dumps({
+    "title": "Día {raro} [con] \"comillas\"",
+    "tags": [{"x": 1}],
+    "scenes": [
+        {"n": 1, "text": "llaves } y ] dentro", "sub": [{"deep": True}]},
+        {"n": 2, "text": "escape \\\" final"},
+    ],
+    "after": {"n": 3},
+}, ensure_ascii=False)
+
+
+def scan(text, size):
+    scanner = JsonArrayItemScanner("scenes")
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(scanner.feed(text[start:start + size]))
+    return scanner, items
+
+
+@pytest.mark.parametrize("size", [1, 2, 7, len(DOC)])
+def test_items_of_the_field_regardless_of_chunking(size):
+    _, items = scan(DOC, size)
+    assert [json.loads(item) for item in items] == json.loads(DOC)["scenes"]
+
+
+def test_items_are_emitted_as_soon_as_they_close():
+    scanner = JsonArrayItemScanner("scenes")
+    assert scanner.feed('{"scenes": [{"n": 1}') == ['{"n": 1}']
+    assert scanner.feed(', {"n": 2') == []
+    assert scanner.feed('}]}') == ['{"n": 2}']
+
+
+def test_other_arrays_are_ignored():
+    _, items = scan('{"tags": [{"n": 1}], "other": {"scenes": [{"n": 2}]}}', 3)
+    assert items == []
+
+
+def test_closers_complete_a_truncated_document():
+    text = '{"scenes": [{"n": 1}, {"n": 2, "text": "a medi'
+    scanner, items = scan(text, 5)
+    assert items == ['{"n": 1}']
+    assert json.loads(text + scanner.closers())["scenes"][1]["text"] == "a medi"
+    assert json.loads(text[:scanner.last_item_end] + "]}") == {"scenes": [{"n": 1}]}